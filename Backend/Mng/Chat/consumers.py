@@ -1,24 +1,70 @@
 import json
+import logging
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.contrib.auth.models import AnonymousUser
+from django.db.models import Q
+from django.utils import timezone
 
-from Users.models import Users
-from .utils import get_or_create_thread, are_connected
+from .utils import get_or_create_thread, are_connected, mark_thread_read, messages_since
+from Users.utils import get_user_cards
 from .models import Message, ChatThread
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from .send_queue import BoundedSendMixin
+from .write_behind import WriteBehindMixin, WriteBehindQueue, write_behind_enabled
+from groups.consumers import (
+    create_group_message, group_message_event, group_message_queue, new_write_behind_group_message,
+)
+from groups.models import GroupMember
 
+logger = logging.getLogger(__name__)
 
-def get_user_from_token(token):
-    print("🔑 Validating token...")
-    jwt_auth = JWTAuthentication()
-    validated_token = jwt_auth.get_validated_token(token)
-    user = jwt_auth.get_user(validated_token)
-    print(f"✅ Token valid for user: {user.id} ({user.phone_number})")
-    return user
+# Shared by every ChatConsumer in this process (only used with CHAT_WRITE_BEHIND)
+message_queue = WriteBehindQueue(Message, after_flush=Message.bump_threads)
 
 
-class ChatConsumer(AsyncJsonWebsocketConsumer):
+def message_event(message, sender_card):
+    """Channel layer event broadcast to chat_<thread_id> for a new message."""
+    return {
+        "type": "chat.message",
+        "payload": {
+            "id": message.id,
+            "thread": message.thread_id,
+            "text": message.text,
+            "created_at": message.created_at.isoformat(),
+            "sender": sender_card,
+        },
+    }
+
+
+def new_write_behind_message(message_id, thread_id, sender_id, text):
+    """Unsaved Message for message_queue (see Chat/write_behind.py)."""
+    return Message(
+        id=message_id,
+        thread_id=thread_id,
+        sender_id=sender_id,
+        text=text,
+        created_at=timezone.now(),
+    )
+
+
+def create_message(thread_id, sender_id, text, sender_card):
+    """Store a message and return its broadcast payload (thread and sender are already checked)."""
+    print(f"💾 Creating message in database:")
+    print(f"   Thread ID: {thread_id}")
+    print(f"   Sender ID: {sender_id}")
+    print(f"   Text: '{text}'")
+    
+    try:
+        message = Message.objects.create(thread_id=thread_id, sender_id=sender_id, text=text)
+        print(f"✅ Message created with ID: {message.id}")
+        
+        return message_event(message, sender_card)["payload"]
+    except Exception as e:
+        print(f"❌ Error creating message: {e}")
+        raise
+
+
+class ChatConsumer(BoundedSendMixin, WriteBehindMixin, AsyncJsonWebsocketConsumer):
     async def connect(self):
         print("\n" + "="*50)
         print("🚀 NEW WEBSOCKET CONNECTION ATTEMPT")
@@ -27,18 +73,15 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
         print("📍 URL Path:", self.scope.get("path"))
         print("📍 Query String:", self.scope.get("query_string"))
 
-        # Extract token
-        token = self.scope["query_string"].decode()
-        print("🔍 Raw token string:", token)
-
-        token = dict(q.split("=") for q in token.split("&") if "=" in q).get("token")
-        print("🔍 Parsed token:", token[:50] + "..." if token and len(token) > 50 else token)
+        query = self.scope["query_string"].decode()
+        params = dict(q.split("=") for q in query.split("&") if "=" in q)
 
-        # Authenticate user
-        self.user = await self._get_user_from_token(token)
+        # Authenticated once by JWTAuthMiddleware (Users/middleware.py)
+        self.user = self.scope["user"]
+        self.sender_card = self.scope["user_card"]
         print(f"👤 Authenticated user: {self.user}")
 
-        if not self.user:
+        if not self.user.is_authenticated:
             print("❌ Authentication failed - closing connection")
             await self.close(code=4001)
             return
@@ -79,6 +122,10 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
         print(f"🔗 User {self.user.id} connected to thread {self.thread_id}")
         print("="*50 + "\n")
 
+        # Reconnect: replay what the client missed before any live message
+        if "since" in params:
+            await self._resume(params["since"])
+
     async def disconnect(self, close_code):
         print(f"\n🔌 WebSocket DISCONNECT - Code: {close_code}")
         if hasattr(self, "room_group_name"):
@@ -89,6 +136,10 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
         print(f"\n📨 RECEIVED MESSAGE from user {self.user.id}:")
         print(f"   Content: {content}")
         
+        if content.get("action") == "read":
+            await self._handle_read(content.get("message_id"))
+            return
+
         if content.get("action") != "send":
             print("❌ Invalid action - ignoring")
             return
@@ -98,6 +149,10 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
             print("❌ Empty message - ignoring")
             return
 
+        if write_behind_enabled():
+            await self._send_write_behind(text)
+            return
+
         print(f"💬 Creating message: '{text}'")
         msg = await self._create_message(self.thread.id, self.user.id, text)
         print(f"✅ Message created with ID: {msg['id']}")
@@ -120,25 +175,63 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
         await self.channel_layer.group_send(self.room_group_name, broadcast_data)
         print("✅ Message broadcasted!")
 
+    async def _send_write_behind(self, text):
+        """Broadcast now, persist in the next batch, ack the sender once stored."""
+        message = new_write_behind_message(
+            await message_queue.reserve_id(), self.thread.id, self.user.id, text
+        )
+        await self.write_behind(
+            message_queue, message, self.room_group_name, message_event(message, self.sender_card)
+        )
+
+    async def _resume(self, since):
+        """
+        Send every message after `since` (capped, see messages_since), then
+        {"type": "resume", ...}. With has_more the client fetches the rest from
+        GET .../messages/?after_id=<after_id>.
+        """
+        payloads, has_more = await self._get_messages_since(since)
+        # Live events queued while we joined the room may repeat these
+        self.replayed_ids = {payload["id"] for payload in payloads}
+        for payload in payloads:
+            await self.send_json(payload)
+        await self.send_json({
+            "type": "resume",
+            "count": len(payloads),
+            "has_more": has_more,
+            "after_id": payloads[-1]["id"] if payloads else None,
+        })
+        logger.debug("Replayed %d messages since %s (has_more=%s)", len(payloads), since, has_more)
+
+    async def _handle_read(self, message_id):
+        """Advance this user's read watermark and tell the room about it."""
+        try:
+            last_read = await self._mark_read(message_id)
+        except ValueError as e:
+            await self.send_json({"type": "error", "error": str(e)})
+            return
+        await self.channel_layer.group_send(self.room_group_name, {
+            "type": "chat.read",
+            "payload": {
+                "type": "read",
+                "thread": self.thread.id,
+                "user_id": self.user.id,
+                "last_read_message_id": last_read,
+            },
+        })
+
+    async def chat_read(self, event):
+        await self.queue_json(event["payload"])
+
     async def chat_message(self, event):
         print(f"\n📤 SENDING MESSAGE to user {self.user.id}:")
         print(f"   Event: {event}")
-        await self.send_json(event["payload"])
+        if event["payload"]["id"] in getattr(self, "replayed_ids", ()):
+            return
+        await self.queue_json(event["payload"])
         print("✅ Message sent to WebSocket client!")
 
     # ---------- Database operations ----------
-    @database_sync_to_async
-    def _get_user_from_token(self, token):
-        if not token:
-            return None
-        try:
-            user = get_user_from_token(token)
-            print(f"🔍 Database lookup successful: User {user.id}")
-            return user
-        except Exception as e:
-            print(f"❌ Token validation error: {e}")
-            return None
-
     @database_sync_to_async
     def _get_thread(self, user, thread_id):
         try:
@@ -156,45 +249,180 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
             print(f"❌ Thread {thread_id} not found in database")
             return None
 
+    @database_sync_to_async
+    def _get_messages_since(self, since):
+        messages, has_more = messages_since(Message.objects.filter(thread=self.thread), since)
+        sender_cards = get_user_cards(msg.sender_id for msg in messages)
+        return [message_event(msg, sender_cards[msg.sender_id])["payload"] for msg in messages], has_more
+
+    @database_sync_to_async
+    def _mark_read(self, message_id):
+        # The thread was loaded at connect; its newest message id is stale
+        self.thread.refresh_from_db(fields=["last_message"])
+        return mark_thread_read(self.thread, self.user, message_id)
+
     @database_sync_to_async
     def _create_message(self, thread_id, sender_id, text):
-        print(f"💾 Creating message in database:")
-        print(f"   Thread ID: {thread_id}")
-        print(f"   Sender ID: {sender_id}")
-        print(f"   Text: '{text}'")
-        
-        try:
-            # Get thread and sender
-            thread = ChatThread.objects.get(pk=thread_id)
-            sender = Users.objects.get(pk=sender_id)
-            
-            # Create message
-            message = Message.objects.create(thread=thread, sender=sender, text=text)
-            print(f"✅ Message created with ID: {message.id}")
-            
-            # Get sender details
-            photo = None
-            if hasattr(sender, "photos") and sender.photos.exists():
-                first_photo = sender.photos.filter(is_private=False).first()
-                if first_photo:
-                    photo = first_photo.url
-
-            full_name = ""
-            if hasattr(sender, "profile") and sender.profile:
-                full_name = sender.profile.full_name
-
-            return {
-                "id": message.id,
-                "thread": thread.id,
-                "text": message.text,
-                "created_at": message.created_at.isoformat(),
-                "sender": {
-                    "id": sender.id,
-                    "username": sender.username,
-                    "full_name": full_name,
-                    "photo": photo,
+        return create_message(thread_id, sender_id, text, self.sender_card)
+
+
+class StreamConsumer(BoundedSendMixin, WriteBehindMixin, AsyncJsonWebsocketConsumer):
+    """
+    One socket per user for every thread and group they belong to (ws/stream/).
+
+    Outgoing frames: {"channel": "chat:<thread_id>" | "group:<group_id>", "data": {...}}
+    Incoming frames: {"action": "send", "channel": ..., "text": ...}
+                     {"action": "read", "channel": "chat:<thread_id>", "message_id": ...}
+                     {"action": "subscribe", "channel": ...}  (thread/group joined later)
+    """
+
+    async def connect(self):
+        self.user = self.scope["user"]
+        self.sender_card = self.scope["user_card"]
+        if not self.user.is_authenticated:
+            await self.close(code=4001)
+            return
+
+        self.thread_ids, self.group_ids = await self._get_subscriptions()
+        for thread_id in self.thread_ids:
+            await self.channel_layer.group_add(f"chat_{thread_id}", self.channel_name)
+        for group_id in self.group_ids:
+            await self.channel_layer.group_add(f"group_chat_{group_id}", self.channel_name)
+
+        await self.accept()
+        logger.debug("Stream for user %s: %d threads, %d groups", self.user.id, len(self.thread_ids), len(self.group_ids))
+
+    async def disconnect(self, close_code):
+        for thread_id in getattr(self, "thread_ids", ()):
+            await self.channel_layer.group_discard(f"chat_{thread_id}", self.channel_name)
+        for group_id in getattr(self, "group_ids", ()):
+            await self.channel_layer.group_discard(f"group_chat_{group_id}", self.channel_name)
+
+    async def receive_json(self, content, **kwargs):
+        kind, _, channel_id = (content.get("channel") or "").partition(":")
+        if kind not in ("chat", "group") or not channel_id.isdigit():
+            await self.send_json({"type": "error", "error": "Invalid channel"})
+            return
+        channel_id = int(channel_id)
+        action = content.get("action")
+
+        if action == "subscribe":
+            await self._subscribe(kind, channel_id)
+            return
+
+        subscribed = self.thread_ids if kind == "chat" else self.group_ids
+        if channel_id not in subscribed:
+            await self.send_json({"type": "error", "channel": content["channel"], "error": "Not subscribed"})
+            return
+
+        if action == "read" and kind == "chat":
+            try:
+                last_read = await self._mark_read(channel_id, content.get("message_id"))
+            except ValueError as e:
+                await self.send_json({"type": "error", "channel": content["channel"], "error": str(e)})
+                return
+            await self.channel_layer.group_send(f"chat_{channel_id}", {
+                "type": "chat.read",
+                "payload": {
+                    "type": "read",
+                    "thread": channel_id,
+                    "user_id": self.user.id,
+                    "last_read_message_id": last_read,
                 },
-            }
-        except Exception as e:
-            print(f"❌ Error creating message: {e}")
-            raise
\ No newline at end of file
+            })
+            return
+
+        if action != "send":
+            return
+        text = (content.get("text") or "").strip()
+        if not text:
+            return
+
+        if kind == "chat":
+            await self._send_chat(channel_id, text)
+        else:
+            await self._send_group(channel_id, text)
+
+    async def _send_chat(self, thread_id, text):
+        room = f"chat_{thread_id}"
+        if write_behind_enabled():
+            message = new_write_behind_message(
+                await message_queue.reserve_id(), thread_id, self.user.id, text
+            )
+            await self.write_behind(
+                message_queue, message, room, message_event(message, self.sender_card),
+                ack_extra={"channel": f"chat:{thread_id}"},
+            )
+            return
+        payload = await database_sync_to_async(create_message)(
+            thread_id, self.user.id, text, self.sender_card
+        )
+        await self.channel_layer.group_send(room, {"type": "chat.message", "payload": payload})
+
+    async def _send_group(self, group_id, text):
+        room = f"group_chat_{group_id}"
+        if write_behind_enabled():
+            message = new_write_behind_group_message(
+                await group_message_queue.reserve_id(), group_id, self.user.id, text
+            )
+            await self.write_behind(
+                group_message_queue, message, room, group_message_event(message, self.sender_card),
+                ack_extra={"channel": f"group:{group_id}"},
+            )
+            return
+        fields = await database_sync_to_async(create_group_message)(
+            group_id, self.user.id, text, self.sender_card
+        )
+        await self.channel_layer.group_send(room, {"type": "group_chat_message", **fields})
+
+    async def _subscribe(self, kind, channel_id):
+        subscribed = self.thread_ids if kind == "chat" else self.group_ids
+        if channel_id not in subscribed:
+            if not await self._can_access(kind, channel_id):
+                await self.send_json({"type": "error", "channel": f"{kind}:{channel_id}", "error": "Not authorized"})
+                return
+            subscribed.add(channel_id)
+            room = f"chat_{channel_id}" if kind == "chat" else f"group_chat_{channel_id}"
+            await self.channel_layer.group_add(room, self.channel_name)
+        await self.send_json({"type": "subscribed", "channel": f"{kind}:{channel_id}"})
+
+    # ---------- Channel layer events ----------
+    async def chat_message(self, event):
+        payload = event["payload"]
+        await self.queue_json({"channel": f"chat:{payload['thread']}", "data": payload})
+
+    async def chat_read(self, event):
+        payload = event["payload"]
+        await self.queue_json({"channel": f"chat:{payload['thread']}", "data": payload})
+
+    async def group_chat_message(self, event):
+        data = {key: event[key] for key in ("id", "group_id", "text", "created_at", "sender")}
+        await self.queue_json({"channel": f"group:{event['group_id']}", "data": data})
+
+    # ---------- Database operations ----------
+    @database_sync_to_async
+    def _get_subscriptions(self):
+        threads = set(
+            ChatThread.objects.filter(Q(user_low=self.user) | Q(user_high=self.user))
+            .values_list("id", flat=True)
+        )
+        groups = set(
+            GroupMember.objects.filter(user=self.user, group__is_active=True)
+            .values_list("group_id", flat=True)
+        )
+        return threads, groups
+
+    @database_sync_to_async
+    def _can_access(self, kind, channel_id):
+        if kind == "chat":
+            return ChatThread.objects.filter(
+                Q(user_low=self.user) | Q(user_high=self.user), pk=channel_id
+            ).exists()
+        return GroupMember.objects.filter(
+            user=self.user, group_id=channel_id, group__is_active=True
+        ).exists()
+
+    @database_sync_to_async
+    def _mark_read(self, thread_id, message_id):
+        thread = ChatThread.objects.get(pk=thread_id)
+        return mark_thread_read(thread, self.user, message_id)
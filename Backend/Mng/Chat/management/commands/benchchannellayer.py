@@ -0,0 +1,134 @@
+import asyncio
+import multiprocessing
+import os
+import tempfile
+import time
+
+from channels.layers import InMemoryChannelLayer
+from django.core.management.base import BaseCommand
+
+from Mng.channel_hub import ChannelHub, HubChannelLayer
+
+GROUP = "bench"
+PAYLOAD = {
+    "type": "chat.message",
+    "payload": {
+        "id": 1,
+        "thread": 1,
+        "text": "x" * 64,
+        "created_at": "2025-01-01T00:00:00+00:00",
+        "sender": {"id": 1, "username": "bench", "full_name": "Bench", "photo": None},
+    },
+}
+
+
+async def _drain(layer, channel, messages):
+    for _ in range(messages):
+        await layer.receive(channel)
+
+
+async def _join(layer, receivers):
+    channels = []
+    for _ in range(receivers):
+        channel = await layer.new_channel()
+        await layer.group_add(GROUP, channel)
+        channels.append(channel)
+    return channels
+
+
+async def _send(layer, messages):
+    for i in range(messages):
+        await layer.group_send(GROUP, PAYLOAD)
+        if i % 100 == 99:
+            await asyncio.sleep(0)  # let local receivers drain
+
+
+# Queues are sized to hold every message so nothing is dropped mid-run
+async def _bench_in_memory(messages, receivers):
+    layer = InMemoryChannelLayer(capacity=messages)
+    channels = await _join(layer, receivers)
+    drains = [asyncio.create_task(_drain(layer, c, messages)) for c in channels]
+    start = time.perf_counter()
+    await _send(layer, messages)
+    await asyncio.gather(*drains)
+    return time.perf_counter() - start
+
+
+def _hub_worker(path, receivers, messages, ready, done):
+    async def run():
+        layer = HubChannelLayer(path=path, capacity=messages)
+        channels = await _join(layer, receivers)
+        ready.set()
+        await asyncio.gather(*(_drain(layer, c, messages) for c in channels))
+        done.put(time.perf_counter())
+        await layer.close()
+
+    asyncio.run(run())
+
+
+def _run_hub(path):
+    asyncio.run(ChannelHub(path).serve())
+
+
+def _bench_hub(messages, receivers, processes):
+    path = os.path.join(tempfile.mkdtemp(), "hub.sock")
+    hub = multiprocessing.Process(target=_run_hub, args=(path,), daemon=True)
+    hub.start()
+    while not os.path.exists(path):
+        time.sleep(0.01)
+
+    done = multiprocessing.Queue()
+    workers = []
+    for i in range(processes):
+        ready = multiprocessing.Event()
+        share = receivers // processes + (1 if i < receivers % processes else 0)
+        worker = multiprocessing.Process(
+            target=_hub_worker,
+            args=(path, share, messages, ready, done),
+        )
+        worker.start()
+        ready.wait()
+        workers.append(worker)
+    # group_add frames are flushed but may still be queued in the hub
+    time.sleep(0.2)
+
+    async def send():
+        layer = HubChannelLayer(path=path)
+        start = time.perf_counter()
+        await _send(layer, messages)
+        await layer.close()
+        return start
+
+    start = asyncio.run(send())
+    finished = max(done.get() for _ in workers)
+    for worker in workers:
+        worker.join()
+    hub.terminate()
+    return finished - start
+
+
+class Command(BaseCommand):
+    help = "Compare group_send throughput of InMemoryChannelLayer and HubChannelLayer"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--messages", type=int, default=20000)
+        parser.add_argument("--receivers", type=int, default=8, help="group members in total")
+        parser.add_argument("--processes", type=int, default=2, help="worker processes for the hub run")
+
+    def handle(self, *args, **options):
+        messages = options["messages"]
+        receivers = options["receivers"]
+        processes = max(1, min(options["processes"], receivers))
+
+        results = [
+            ("in-memory (1 process)", asyncio.run(_bench_in_memory(messages, receivers))),
+            (f"hub ({processes} processes)", _bench_hub(messages, receivers, processes)),
+        ]
+
+        self.stdout.write(f"{messages} group_send x {receivers} receivers")
+        for name, elapsed in results:
+            self.stdout.write(
+                f"{name:<24} {elapsed:8.3f}s  "
+                f"{messages / elapsed:10.0f} sends/s  "
+                f"{messages * receivers / elapsed:10.0f} deliveries/s"
+            )
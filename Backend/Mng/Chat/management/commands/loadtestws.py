@@ -0,0 +1,234 @@
+import asyncio
+import contextlib
+import io
+import time
+import tracemalloc
+
+from channels.testing import WebsocketCommunicator
+from django.core.management.base import BaseCommand
+from rest_framework_simplejwt.tokens import AccessToken
+
+from Chat.models import ChatThread
+from Chat.send_queue import get_send_queue_stats
+from groups.models import Group, GroupMember
+from Users.models import Users
+
+PREFIX = "loadtest_"
+
+
+def _percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))]
+
+
+def _create_fixtures(users, threads, groups):
+    """Users, threads and groups for one run. Users are bulk-created with unusable passwords."""
+    Users.objects.filter(username__startswith=PREFIX).delete()
+    Users.objects.bulk_create([
+        Users(phone_number=f"+0{i:09d}", username=f"{PREFIX}{i}", password="!")
+        for i in range(users)
+    ])
+    members = list(Users.objects.filter(username__startswith=PREFIX).order_by("id"))
+
+    # Thread i is between members 2i and 2i+1 (wrapping around)
+    pairs = set()
+    for i in range(threads):
+        a, b = members[(2 * i) % users], members[(2 * i + 1) % users]
+        if a.id != b.id:
+            pairs.add((min(a.id, b.id), max(a.id, b.id)))
+    ChatThread.objects.bulk_create(
+        [ChatThread(user_low_id=low, user_high_id=high) for low, high in pairs],
+        ignore_conflicts=True,
+    )
+    thread_rooms = [
+        ("chat", thread.id, [thread.user_low_id, thread.user_high_id])
+        for thread in ChatThread.objects.filter(user_low__username__startswith=PREFIX)
+    ]
+
+    # Every member joins group i % groups
+    group_rooms = []
+    if groups:
+        Group.objects.bulk_create([
+            Group(name=f"{PREFIX}{g}", created_by=members[g % users]) for g in range(groups)
+        ])
+        created = list(Group.objects.filter(name__startswith=PREFIX).order_by("id"))
+        GroupMember.objects.bulk_create([
+            GroupMember(group=created[i % groups], user=member) for i, member in enumerate(members)
+        ])
+        for g, group in enumerate(created):
+            if members[g::groups]:
+                group_rooms.append(("group", group.id, [m.id for m in members[g::groups]]))
+
+    tokens = {member.id: str(AccessToken.for_user(member)) for member in members}
+    return thread_rooms + group_rooms, tokens
+
+
+def _delete_fixtures():
+    Group.objects.filter(name__startswith=PREFIX).delete()
+    Users.objects.filter(username__startswith=PREFIX).delete()
+
+
+class _Client:
+    """One WebSocket connection of one user to one room."""
+
+    def __init__(self, application, kind, room_id, user_id, token):
+        path = f"/ws/chat/{room_id}/" if kind == "chat" else f"/ws/group-chat/{room_id}/"
+        self.communicator = WebsocketCommunicator(application, f"{path}?token={token}")
+        self.user_id = user_id
+        self.expected = 0
+        self.latencies = []
+        self.seen = set()
+        self.last_delivery = 0.0
+        self.timed_out = False
+
+    async def connect(self):
+        start = time.perf_counter()
+        connected, _ = await self.communicator.connect(timeout=30)
+        if not connected:
+            raise RuntimeError(f"connection for user {self.user_id} was rejected")
+        return time.perf_counter() - start
+
+    async def send(self, count, interval):
+        for seq in range(count):
+            await self.communicator.send_json_to({
+                "action": "send",
+                "text": f"lt {time.perf_counter_ns()} {seq}",
+            })
+            await asyncio.sleep(interval)
+
+    async def read(self, deadline):
+        """Collect deliveries of benchmark messages until all arrived or the deadline."""
+        while len(self.latencies) < self.expected:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            try:
+                frame = await self.communicator.receive_json_from(timeout=remaining)
+            except asyncio.TimeoutError:
+                # The communicator cancels the application on timeout
+                self.timed_out = True
+                return
+            text = frame.get("text") or ""
+            if text.startswith("lt "):
+                now_ns = time.perf_counter_ns()
+                self.latencies.append((now_ns - int(text.split()[1])) / 1e6)
+                self.seen.add(text)
+                self.last_delivery = now_ns / 1e9
+
+    async def disconnect(self):
+        if not self.timed_out:
+            await self.communicator.disconnect()
+
+
+async def _run(application, rooms, tokens, options):
+    clients = []
+    for kind, room_id, user_ids in rooms:
+        room_clients = [
+            _Client(application, kind, room_id, user_id, tokens[user_id]) for user_id in user_ids
+        ]
+        # Everyone in the room, the sender included, receives every message
+        for client in room_clients:
+            client.expected = len(room_clients) * options["messages"]
+        clients.extend(room_clients)
+
+    # Connect phase: latency per handshake, traced memory per connection
+    semaphore = asyncio.Semaphore(options["concurrency"])
+
+    async def connect(client):
+        async with semaphore:
+            return await client.connect()
+
+    tracemalloc.start()
+    memory_before = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    connect_times = await asyncio.gather(*(connect(client) for client in clients))
+    connect_elapsed = time.perf_counter() - start
+    memory_per_connection = (tracemalloc.get_traced_memory()[0] - memory_before) / len(clients)
+    tracemalloc.stop()
+
+    # Message phase: every connection sends, every connection reads its room
+    deadline = time.monotonic() + options["timeout"]
+    readers = [asyncio.ensure_future(client.read(deadline)) for client in clients]
+    start = time.perf_counter()
+    await asyncio.gather(*(client.send(options["messages"], options["interval"]) for client in clients))
+    await asyncio.gather(*readers)
+    deliver_elapsed = max(client.last_delivery for client in clients) - start
+
+    await asyncio.gather(*(client.disconnect() for client in clients))
+
+    return {
+        "connections": len(clients),
+        "connect_times": connect_times,
+        "connect_elapsed": connect_elapsed,
+        "memory_per_connection": memory_per_connection,
+        "sent": len(clients) * options["messages"],
+        "stored": len(set().union(*(client.seen for client in clients))),
+        "deliver_elapsed": deliver_elapsed,
+        "expected": sum(client.expected for client in clients),
+        "latencies": [latency for client in clients for latency in client.latencies],
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test ChatConsumer and GroupChatConsumer in-process: N users over M threads and "
+        "G groups. Reports connect latency, message latency, throughput and memory per connection."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=20)
+        parser.add_argument("--threads", type=int, default=5, help="1:1 threads between pairs of users")
+        parser.add_argument("--groups", type=int, default=2, help="every user joins one group")
+        parser.add_argument("--messages", type=int, default=10, help="messages sent per connection")
+        parser.add_argument("--interval", type=float, default=0.2, help="seconds between a client's sends")
+        parser.add_argument("--concurrency", type=int, default=50, help="handshakes in flight")
+        parser.add_argument("--timeout", type=float, default=60, help="seconds to wait for deliveries")
+        parser.add_argument("--keep", action="store_true", help="keep the loadtest_* rows afterwards")
+        parser.add_argument("--verbose", action="store_true", help="show consumer debug output")
+
+    def handle(self, *args, **options):
+        from Mng.asgi import application
+
+        if options["users"] < 2:
+            self.stderr.write("Need at least 2 users")
+            return
+
+        rooms, tokens = _create_fixtures(options["users"], options["threads"], options["groups"])
+        try:
+            # The consumers print a lot per message; keep it out of the timings
+            output = contextlib.nullcontext() if options["verbose"] else contextlib.redirect_stdout(io.StringIO())
+            with output:
+                result = asyncio.run(_run(application, rooms, tokens, options))
+        finally:
+            if not options["keep"]:
+                _delete_fixtures()
+
+        connect_ms = [t * 1000 for t in result["connect_times"]]
+        latencies = result["latencies"]
+        delivered = len(latencies)
+        stats = get_send_queue_stats()
+
+        self.stdout.write(
+            f"{result['connections']} connections "
+            f"({options['users']} users, {len(rooms)} rooms), {options['messages']} messages each"
+        )
+        self.stdout.write(
+            f"connect     p50 {_percentile(connect_ms, 0.5):8.2f} ms  p99 {_percentile(connect_ms, 0.99):8.2f} ms  "
+            f"({result['connections'] / result['connect_elapsed']:.0f} connects/s)"
+        )
+        self.stdout.write(
+            f"latency     p50 {_percentile(latencies, 0.5):8.2f} ms  p99 {_percentile(latencies, 0.99):8.2f} ms"
+        )
+        elapsed = max(result["deliver_elapsed"], 1e-9)
+        self.stdout.write(
+            f"throughput  {result['stored'] / elapsed:8.0f} messages/s  "
+            f"{delivered / elapsed:8.0f} deliveries/s  (until the last delivery)"
+        )
+        self.stdout.write(
+            f"delivered   {result['stored']}/{result['sent']} messages, "
+            f"{delivered}/{result['expected']} deliveries"
+        )
+        self.stdout.write(f"memory      {result['memory_per_connection'] / 1024:8.1f} KiB traced per connection")
+        self.stdout.write(f"send queues dropped {stats['dropped']}, evicted {stats['evicted']}")
@@ -0,0 +1,25 @@
+import asyncio
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from Mng.channel_hub import ChannelHub
+
+
+class Command(BaseCommand):
+    help = "Run the local channel hub that HubChannelLayer workers connect to"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--socket",
+            default=getattr(settings, "CHANNEL_HUB_SOCKET", "") or "/tmp/mng-channels.sock",
+            help="Unix socket path to listen on",
+        )
+
+    def handle(self, *args, **options):
+        hub = ChannelHub(options["socket"])
+        self.stdout.write(f"Channel hub listening on {hub.path}")
+        try:
+            asyncio.run(hub.serve())
+        except KeyboardInterrupt:
+            pass
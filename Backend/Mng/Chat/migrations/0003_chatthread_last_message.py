@@ -0,0 +1,54 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:14
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_last_message(apps, schema_editor):
+    ChatThread = apps.get_model('Chat', 'ChatThread')
+    Message = apps.get_model('Chat', 'Message')
+    for thread in ChatThread.objects.iterator():
+        message = Message.objects.filter(thread_id=thread.id).order_by('-id').first()
+        if message is None:
+            continue
+        ChatThread.objects.filter(pk=thread.id).update(
+            last_message_id=message.id,
+            last_message_at=message.created_at,
+            last_message_preview=message.text[:100],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Chat', '0002_message_thread_id_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatthread',
+            name='last_message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='Chat.message'),
+        ),
+        migrations.AddField(
+            model_name='chatthread',
+            name='last_message_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='chatthread',
+            name='last_message_preview',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AddIndex(
+            model_name='chatthread',
+            index=models.Index(fields=['user_low', '-last_message_at'], name='Chat_chatth_user_lo_33b772_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chatthread',
+            index=models.Index(fields=['user_high', '-last_message_at'], name='Chat_chatth_user_hi_2b7d89_idx'),
+        ),
+        migrations.RunPython(backfill_last_message, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:23
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def cursors_from_is_read(apps, schema_editor):
+    """Each participant has read up to the newest is_read message sent to them."""
+    Message = apps.get_model('Chat', 'Message')
+    ReadCursor = apps.get_model('Chat', 'ReadCursor')
+    ChatThread = apps.get_model('Chat', 'ChatThread')
+    for thread in ChatThread.objects.iterator():
+        for user_id, other_id in ((thread.user_low_id, thread.user_high_id),
+                                  (thread.user_high_id, thread.user_low_id)):
+            last_read = (
+                Message.objects.filter(thread_id=thread.id, sender_id=other_id, is_read=True)
+                .aggregate(top=models.Max('id'))['top']
+            )
+            if last_read:
+                ReadCursor.objects.create(
+                    thread_id=thread.id, user_id=user_id, last_read_message_id=last_read
+                )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Chat', '0003_chatthread_last_message'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReadCursor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_read_message_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('thread', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='read_cursors', to='Chat.chatthread')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='read_cursors', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('thread', 'user')},
+            },
+        ),
+        migrations.RunPython(cursors_from_is_read, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='message',
+            name='is_read',
+        ),
+    ]
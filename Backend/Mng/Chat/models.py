@@ -1,7 +1,11 @@
 from django.db import models
+from django.db.models import Q
 from Users.models import Users
 
 
+PREVIEW_LENGTH = 100
+
+
 class ChatThread(models.Model):
     """
     One-to-one thread between two users.
@@ -11,10 +15,20 @@ class ChatThread(models.Model):
     user_high = models.ForeignKey(Users, on_delete=models.CASCADE, related_name="threads_high")
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Denormalized copy of the newest message, kept current by Message.save()
+    last_message = models.ForeignKey(
+        "Message", null=True, blank=True, on_delete=models.SET_NULL, related_name="+"
+    )
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    last_message_preview = models.CharField(max_length=PREVIEW_LENGTH, blank=True, default="")
+
     class Meta:
         unique_together = ("user_low", "user_high")
         indexes = [
             models.Index(fields=["user_low", "user_high"]),
+            # inbox: a user's threads by recent activity
+            models.Index(fields=["user_low", "-last_message_at"]),
+            models.Index(fields=["user_high", "-last_message_at"]),
         ]
 
     def participants(self):
@@ -26,19 +40,64 @@ class ChatThread(models.Model):
     def __str__(self):
         return f"Thread {self.pk}: {self.user_low_id} ↔ {self.user_high_id}"
 
+    @staticmethod
+    def bump_last_message(message):
+        """Point the thread at `message` unless it already has a newer one."""
+        ChatThread.objects.filter(
+            Q(last_message__isnull=True) | Q(last_message_id__lt=message.id),
+            pk=message.thread_id,
+        ).update(
+            last_message=message.id,
+            last_message_at=message.created_at,
+            last_message_preview=message.text[:PREVIEW_LENGTH],
+        )
+
 
 class Message(models.Model):
     thread = models.ForeignKey(ChatThread, related_name="messages", on_delete=models.CASCADE)
     sender = models.ForeignKey(Users, related_name="sent_messages", on_delete=models.CASCADE)
     text = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
-    is_read = models.BooleanField(default=False)
 
     class Meta:
         ordering = ["created_at"]
         indexes = [
             models.Index(fields=["thread", "-created_at"]),
+            models.Index(fields=["thread", "id"]),  # keyset pagination
         ]
 
+    @staticmethod
+    def bump_threads(messages):
+        """bump_last_message for rows written without save() (bulk_create)."""
+        latest = {}
+        for message in messages:
+            if message.thread_id not in latest or message.id > latest[message.thread_id].id:
+                latest[message.thread_id] = message
+        for message in latest.values():
+            ChatThread.bump_last_message(message)
+
+    def save(self, *args, **kwargs):
+        created = self._state.adding
+        super().save(*args, **kwargs)
+        if created:
+            ChatThread.bump_last_message(self)
+
     def __str__(self):
         return f"[{self.thread_id}] {self.sender_id}: {self.text[:30]}"
+
+
+class ReadCursor(models.Model):
+    """
+    Read watermark of one participant in a thread: every message with
+    id <= last_read_message_id counts as read by `user`.
+    """
+    thread = models.ForeignKey(ChatThread, related_name="read_cursors", on_delete=models.CASCADE)
+    user = models.ForeignKey(Users, related_name="read_cursors", on_delete=models.CASCADE)
+    last_read_message_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ("thread", "user")
+
+    def __str__(self):
+        return f"[{self.thread_id}] {self.user_id} read up to {self.last_read_message_id}"
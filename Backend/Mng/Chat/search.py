@@ -0,0 +1,118 @@
+"""
+Full-text search over Message and GroupMessage.
+
+PostgreSQL: GIN index on to_tsvector('simple', text), ranked with ts_rank.
+SQLite: external-content FTS5 table kept in sync by triggers, ranked with bm25.
+Any other backend falls back to an unranked icontains scan.
+
+The indexes are created by migrations (Chat 0005, groups 0002).
+
+ts_rank only looks at the row itself, so chat and group ranks compare
+directly. bm25 weighs terms by their frequency in its own FTS5 table, so on
+SQLite each source's ranks are scaled to its best match before the two
+lists are merged.
+"""
+
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+from groups.models import GroupMessage
+from Users.utils import get_user_cards
+from .models import Message
+
+SEARCH_PAGE_SIZE = 20
+MAX_SEARCH_PAGE_SIZE = 50
+MAX_SEARCH_OFFSET = 500
+
+
+def _fts_table(table):
+    return f"{table.lower()}_fts"
+
+
+def _fts5_query(query):
+    # Quote every term so user input can't use FTS5 syntax
+    return " ".join('"%s"' % term.replace('"', '""') for term in query.split())
+
+
+def _search(queryset, query):
+    """Filter queryset to rows matching query and annotate a `rank` (higher is better)."""
+    table = queryset.model._meta.db_table
+    if connection.vendor == "postgresql":
+        vector = f"to_tsvector('simple', \"{table}\".\"text\")"
+        tsquery = "websearch_to_tsquery('simple', %s)"
+        return queryset.filter(
+            RawSQL(f"{vector} @@ {tsquery}", [query], output_field=BooleanField())
+        ).annotate(rank=RawSQL(f"ts_rank({vector}, {tsquery})", [query], output_field=FloatField()))
+
+    if connection.vendor == "sqlite":
+        fts = _fts_table(table)
+        match = _fts5_query(query)
+        return queryset.filter(
+            RawSQL(f'"{table}"."id" IN (SELECT rowid FROM {fts} WHERE {fts} MATCH %s)', [match],
+                   output_field=BooleanField())
+        ).annotate(rank=RawSQL(
+            f'(SELECT -bm25({fts}) FROM {fts} WHERE {fts} MATCH %s AND rowid = "{table}"."id")',
+            [match], output_field=FloatField(),
+        ))
+
+    return queryset.filter(text__icontains=query).annotate(rank=Value(0.0, output_field=FloatField()))
+
+
+def _scale_ranks(rows):
+    """Ranks as a fraction of the best one (rows are best first), so tables with different statistics merge."""
+    best = rows[0]["rank"] if rows else 0
+    if best > 0:
+        for row in rows:
+            row["rank"] /= best
+
+
+def search_messages(user, query, limit=None, offset=0):
+    """
+    Ranked matches from the user's threads and groups.
+    Returns (results, has_more); each result is a dict ready for the response.
+    Results end at MAX_SEARCH_OFFSET: past it the page is empty, and the
+    page reaching it has has_more=False.
+    """
+    limit = min(limit or SEARCH_PAGE_SIZE, MAX_SEARCH_PAGE_SIZE)
+    offset = max(offset, 0)
+    if offset > MAX_SEARCH_OFFSET:
+        return [], False
+    window = offset + limit + 1
+
+    chat_rows = list(
+        _search(Message.objects.filter(Q(thread__user_low=user) | Q(thread__user_high=user)), query)
+        .order_by("-rank", "-id")
+        .values("id", "thread_id", "sender_id", "text", "created_at", "rank")[:window]
+    )
+    group_rows = list(
+        _search(GroupMessage.objects.filter(group__members__user=user, group__is_active=True), query)
+        .order_by("-rank", "-id")
+        .values("id", "group_id", "sender_id", "text", "created_at", "rank")[:window]
+    )
+
+    if connection.vendor == "sqlite":
+        _scale_ranks(chat_rows)
+        _scale_ranks(group_rows)
+    rows = [dict(row, kind="chat") for row in chat_rows] + [dict(row, kind="group") for row in group_rows]
+    rows.sort(key=lambda row: (row["rank"], row["created_at"]), reverse=True)
+    has_more = len(rows) > offset + limit and offset + limit <= MAX_SEARCH_OFFSET
+    rows = rows[offset:offset + limit]
+
+    sender_cards = get_user_cards(row["sender_id"] for row in rows)
+    results = []
+    for row in rows:
+        result = {
+            "kind": row["kind"],
+            "id": row["id"],
+            "text": row["text"],
+            "created_at": row["created_at"].isoformat(),
+            "rank": row["rank"],
+            "sender": sender_cards.get(row["sender_id"]),
+        }
+        if row["kind"] == "chat":
+            result["thread_id"] = row["thread_id"]
+        else:
+            result["group_id"] = row["group_id"]
+        results.append(result)
+    return results, has_more
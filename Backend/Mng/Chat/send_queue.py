@@ -0,0 +1,236 @@
+"""
+Bounded outbound queue per WebSocket connection.
+
+Channel layer handlers (chat_message, group_chat_message, ...) only append to
+the connection's queue; a per-connection task writes it to the socket. A slow
+client therefore backs up its own queue instead of the consumer, and through
+it the channel layer for everyone else in the room.
+
+- WS_SEND_QUEUE_HIGH_WATER: frames queued per connection before dropping
+- WS_SEND_QUEUE_DROP: "oldest" (default) or "newest" frame is dropped when full
+- WS_SLOW_CONSUMER_GRACE: seconds a connection may stay backed up (without
+  draining to half the mark) before it is closed with code 4008
+
+send_json() rarely blocks on daphne: frames go straight into the Twisted
+transport's write buffer, so a slow client backs up there rather than here.
+The queue therefore registers itself as a streaming producer on that
+transport (when the server's send callable exposes it): the transport pauses
+it while more than its bufferSize is unsent, and the queue stops draining
+until it is resumed. A send_json() that takes longer than SLOW_SEND_SECONDS
+also counts as backed up, for servers that block until the frame is written.
+A timer per connection runs the eviction check, so a socket that stopped
+reading is closed even if nothing new is queued for it.
+
+After a drop the client gets {"type": "overflow", "dropped": n} once the
+queue has room again, and should catch up with ?since= or the REST history.
+"""
+
+import asyncio
+import time
+from collections import deque
+
+from django.conf import settings
+from twisted.internet.interfaces import IPushProducer
+from zope.interface import implementer
+
+SLOW_CONSUMER_CLOSE_CODE = 4008
+SLOW_SEND_SECONDS = 1.0
+WATCH_MIN_SECONDS = 0.05
+
+# Process-wide counters, see get_send_queue_stats()
+_stats = {
+    "connections": 0,  # connections with a queue
+    "depth": 0,  # frames queued right now, all connections
+    "peak_depth": 0,  # deepest single queue seen
+    "dropped": 0,
+    "evicted": 0,
+}
+
+
+def get_send_queue_stats():
+    return dict(_stats)
+
+
+_warned = set()
+
+
+def _warn_once(key, message):
+    if key not in _warned:
+        _warned.add(key)
+        print(message)
+
+
+@implementer(IPushProducer)
+class _WriteBufferWatch:
+    """Paused and resumed by the transport as its write buffer fills and drains."""
+
+    def __init__(self):
+        self.writable = asyncio.Event()
+        self.writable.set()
+
+    @property
+    def paused(self):
+        return not self.writable.is_set()
+
+    def pauseProducing(self):
+        self.writable.clear()
+
+    def resumeProducing(self):
+        self.writable.set()
+
+    def stopProducing(self):
+        self.writable.set()  # connection lost; the consumer is disconnecting
+
+
+def _watch_transport(send):
+    """
+    (transport, watch) with a _WriteBufferWatch registered on the Twisted
+    transport behind daphne's send callable, or (None, None) when there is none.
+    """
+    protocol = next(iter(getattr(send, "args", ())), None)
+    transport = getattr(protocol, "transport", None)
+    if transport is None or not hasattr(transport, "registerProducer"):
+        _warn_once("no-transport", "⚠️ Server transport not reachable: slow sockets are only detected "
+                                   "by queue depth and slow sends")
+        return None, None
+    watch = _WriteBufferWatch()
+    try:
+        transport.registerProducer(watch, True)
+    except RuntimeError as e:  # another producer is registered
+        _warn_once("producer", f"⚠️ Can't watch the server write buffer ({e}): slow sockets are only "
+                               f"detected by queue depth and slow sends")
+        return None, None
+    return transport, watch
+
+
+class BoundedSendMixin:
+    """Use queue_json() instead of send_json() for fan-out frames."""
+
+    _send_queue = None
+    _evicted = False
+
+    def _init_send_queue(self):
+        self._send_queue = deque()
+        self._send_task = None
+        self._over_since = None
+        self._sending_since = None
+        self._dropped = 0
+        self.high_water = getattr(settings, "WS_SEND_QUEUE_HIGH_WATER", 200)
+        self.drop_newest = getattr(settings, "WS_SEND_QUEUE_DROP", "oldest") == "newest"
+        self.slow_grace = getattr(settings, "WS_SLOW_CONSUMER_GRACE", 10)
+        self._transport, self._write_watch = _watch_transport(getattr(self, "base_send", None))
+        self._watch_task = asyncio.ensure_future(self._watch_send_queue())
+        _stats["connections"] += 1
+
+    def _write_paused(self):
+        return self._write_watch is not None and self._write_watch.paused
+
+    def _backed_up(self):
+        """Queue full, server write buffer full, or a send_json() that has not returned."""
+        if len(self._send_queue) >= self.high_water:
+            return True
+        if self._sending_since is not None and time.monotonic() - self._sending_since > SLOW_SEND_SECONDS:
+            return True
+        return self._write_paused()
+
+    def _caught_up(self):
+        return (
+            len(self._send_queue) < self.high_water // 2
+            and self._sending_since is None
+            and not self._write_paused()
+        )
+
+    async def _watch_send_queue(self):
+        interval = min(max(self.slow_grace / 4, WATCH_MIN_SECONDS), 1.0)
+        while self._send_queue is not None:
+            await asyncio.sleep(interval)
+            if self._send_queue is None:
+                return
+            if self._backed_up():
+                now = time.monotonic()
+                if self._over_since is None:
+                    self._over_since = now
+                elif now - self._over_since > self.slow_grace:
+                    await self._evict()
+                    return
+            elif self._caught_up():
+                self._over_since = None
+
+    async def queue_json(self, content):
+        if self._evicted:
+            return
+        if self._send_queue is None:
+            self._init_send_queue()
+        queue = self._send_queue
+
+        if len(queue) >= self.high_water:
+            now = time.monotonic()
+            if self._over_since is None:
+                self._over_since = now
+            elif now - self._over_since > self.slow_grace:
+                await self._evict()
+                return
+
+            self._dropped += 1
+            _stats["dropped"] += 1
+            if self.drop_newest:
+                return
+            queue.popleft()
+            _stats["depth"] -= 1
+
+        queue.append(content)
+        _stats["depth"] += 1
+        _stats["peak_depth"] = max(_stats["peak_depth"], len(queue))
+
+        if self._send_task is None or self._send_task.done():
+            self._send_task = asyncio.ensure_future(self._drain_send_queue())
+
+    async def _drain_send_queue(self):
+        queue = self._send_queue
+        while queue:
+            # Leave frames here while the server's write buffer is full, so
+            # that they are dropped by our policy and counted
+            if self._write_paused():
+                await self._write_watch.writable.wait()
+                continue
+
+            content = queue.popleft()
+            _stats["depth"] -= 1
+            self._sending_since = time.monotonic()
+            try:
+                await self.send_json(content)
+            finally:
+                self._sending_since = None
+
+            # Only a connection that drains to half the marks counts as caught up
+            if self._caught_up():
+                self._over_since = None
+                if self._dropped:
+                    dropped, self._dropped = self._dropped, 0
+                    await self.send_json({"type": "overflow", "dropped": dropped})
+
+    async def _evict(self):
+        print(f"🐢 Closing slow consumer {self.channel_name}: "
+              f"{len(self._send_queue)} frames queued, server write buffer "
+              f"{'full' if self._write_paused() else 'draining'} for over {self.slow_grace}s")
+        _stats["evicted"] += 1
+        self._evicted = True
+        self._discard_send_queue()
+        await self.close(code=SLOW_CONSUMER_CLOSE_CODE)
+
+    def _discard_send_queue(self):
+        if self._send_queue is None:
+            return
+        current = asyncio.current_task()
+        for task in (self._send_task, self._watch_task):
+            if task is not None and task is not current:
+                task.cancel()
+        if self._write_watch is not None:
+            self._transport.unregisterProducer()
+        _stats["depth"] -= len(self._send_queue)
+        _stats["connections"] -= 1
+        self._send_queue = None
+
+    async def websocket_disconnect(self, message):
+        self._discard_send_queue()
+        await super().websocket_disconnect(message)
@@ -1,15 +1,52 @@
 from rest_framework import serializers
-from .models import ChatThread, Message
+from .models import ChatThread, Message, ReadCursor
 from UserData.serializers import SimpleUserSerializer  # you already have this
+from Users.utils import get_user_cards
+from .utils import is_read
+
+def _read_cursors(thread_ids):
+    """{thread_id: {user_id: last_read_message_id}} in one query."""
+    cursors = {thread_id: {} for thread_id in thread_ids}
+    rows = ReadCursor.objects.filter(thread_id__in=cursors.keys()).values_list(
+        "thread_id", "user_id", "last_read_message_id"
+    )
+    for thread_id, user_id, last_read in rows:
+        cursors[thread_id][user_id] = last_read
+    return cursors
+
+
+class MessageListSerializer(serializers.ListSerializer):
+    """Resolves sender cards and read cursors for the whole page up front."""
+
+    def to_representation(self, data):
+        messages = list(data.all() if hasattr(data, "all") else data)
+        self.child.context["sender_cards"] = get_user_cards(m.sender_id for m in messages)
+        self.child.context["read_cursors"] = _read_cursors({m.thread_id for m in messages})
+        return super().to_representation(messages)
+
 
 class MessageSerializer(serializers.ModelSerializer):
-    sender = SimpleUserSerializer(read_only=True)
+    sender = serializers.SerializerMethodField()
+    is_read = serializers.SerializerMethodField()
 
     class Meta:
+        list_serializer_class = MessageListSerializer
         model = Message
         fields = ["id", "thread", "sender", "text", "created_at", "is_read"]
         read_only_fields = ["id", "created_at", "is_read", "sender", "thread"]
 
+    def get_sender(self, obj):
+        cards = self.context.get("sender_cards")
+        if cards and obj.sender_id in cards:
+            return cards[obj.sender_id]
+        return get_user_cards([obj.sender_id]).get(obj.sender_id)
+
+    def get_is_read(self, obj):
+        cursors = self.context.get("read_cursors")
+        if cursors is None or obj.thread_id not in cursors:
+            cursors = _read_cursors([obj.thread_id])
+        return is_read(obj, cursors[obj.thread_id])
+
 
 class ChatThreadSerializer(serializers.ModelSerializer):
     user1 = serializers.SerializerMethodField()
@@ -27,5 +64,5 @@ class ChatThreadSerializer(serializers.ModelSerializer):
         return SimpleUserSerializer(obj.user_high).data
 
     def get_last_message(self, obj):
-        msg = obj.messages.order_by("-created_at").first()
+        msg = obj.last_message
         return MessageSerializer(msg).data if msg else None
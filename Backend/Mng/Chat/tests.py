@@ -1,3 +1,395 @@
-from django.test import TestCase
+import asyncio
+import io
+import os
+import tempfile
+from functools import partial
+from types import SimpleNamespace
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from channels.testing import WebsocketCommunicator
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from Mng.asgi import application
+from Mng.channel_hub import ChannelHub, HubChannelLayer
+from groups.models import Group, GroupMember, GroupMessage
+from Users.models import Users
+from .management.commands.loadtestws import PREFIX, _create_fixtures, _percentile
+from .models import ChatThread, Message
+from .search import search_messages
+from .send_queue import SLOW_CONSUMER_CLOSE_CODE, BoundedSendMixin
+from .utils import mark_thread_read, messages_since, page_messages, unread_count
+
+
+def make_user(n):
+    return Users.objects.create_user(phone_number=f"+1000000{n:04d}", username=f"user{n}", password="pw")
+
+
+def make_thread(a, b):
+    low, high = (a, b) if a.id < b.id else (b, a)
+    return ChatThread.objects.create(user_low=low, user_high=high)
+
+
+def token_for(user):
+    return str(RefreshToken.for_user(user).access_token)
+
+
+class HubChannelLayerTests(SimpleTestCase):
+    async def test_receiver_rejoins_groups_after_hub_restart(self):
+        path = os.path.join(tempfile.mkdtemp(), "hub.sock")
+        hub = ChannelHub(path)
+        serving = asyncio.create_task(hub.serve())
+        await asyncio.sleep(0.05)
+
+        receiver, sender = HubChannelLayer(path=path), HubChannelLayer(path=path)
+        channel = await receiver.new_channel()
+        await receiver.group_add("room", channel)
+        received = asyncio.create_task(receiver.receive(channel))
+        await asyncio.sleep(0.05)
+
+        # Restart the hub; the receiver only waits in receive() meanwhile
+        serving.cancel()
+        for writer in list(hub.clients.values()):
+            writer.close()
+        await asyncio.sleep(0.1)
+        restarted = ChannelHub(path)
+        serving = asyncio.create_task(restarted.serve())
+        for _ in range(50):
+            if restarted.groups.get("room"):
+                break
+            await asyncio.sleep(0.05)
+
+        self.assertEqual(restarted.groups["room"], {channel})
+        await sender.group_send("room", {"type": "chat.message", "text": "hi"})
+        message = await asyncio.wait_for(received, 2)
+        self.assertEqual(message["text"], "hi")
+
+        await receiver.close()
+        await sender.close()
+        serving.cancel()
+
+
+class ReadWatermarkTests(TestCase):
+    def setUp(self):
+        self.alice, self.bob = make_user(1), make_user(2)
+        self.thread = make_thread(self.alice, self.bob)
+        self.messages = [
+            Message.objects.create(thread=self.thread, sender=self.bob, text=f"m{i}") for i in range(3)
+        ]
+        self.thread.refresh_from_db()
+
+    def test_defaults_to_newest_and_never_moves_back(self):
+        self.assertEqual(unread_count(self.thread, self.alice), 3)
+        newest = self.messages[-1].id
+        self.assertEqual(mark_thread_read(self.thread, self.alice), newest)
+        self.assertEqual(mark_thread_read(self.thread, self.alice, self.messages[0].id), newest)
+        self.assertEqual(unread_count(self.thread, self.alice), 0)
+
+    def test_partial_read_and_cap_at_newest(self):
+        self.assertEqual(mark_thread_read(self.thread, self.alice, str(self.messages[0].id)), self.messages[0].id)
+        self.assertEqual(unread_count(self.thread, self.alice), 2)
+        self.assertEqual(mark_thread_read(self.thread, self.alice, 10 ** 9), self.messages[-1].id)
+
+    def test_own_messages_are_not_unread(self):
+        self.assertEqual(unread_count(self.thread, self.bob), 0)
+
+    def test_rejects_non_numeric_message_id(self):
+        for bad in ("abc", "", -1, 0, [1]):
+            with self.assertRaises(ValueError):
+                mark_thread_read(self.thread, self.alice, bad)
+
+    def test_view_returns_400_for_non_numeric_message_id(self):
+        client = APIClient()
+        client.force_authenticate(self.alice)
+        url = f"/api/chat/threads/{self.thread.id}/read/"
+        response = client.post(url, {"message_id": "abc"}, format="json")
+        self.assertEqual(response.status_code, 400)
+        response = client.post(url, {}, format="json")
+        self.assertEqual(response.data["last_read_message_id"], self.messages[-1].id)
+
+
+class ReadWatermarkConsumerTests(TransactionTestCase):
+    async def test_socket_gets_error_frame_for_non_numeric_message_id(self):
+        alice, bob = await Users.objects.acreate(phone_number="+10000001", username="alice"), \
+            await Users.objects.acreate(phone_number="+10000002", username="bob")
+        low, high = (alice, bob) if alice.id < bob.id else (bob, alice)
+        thread = await ChatThread.objects.acreate(user_low=low, user_high=high)
+
+        communicator = WebsocketCommunicator(application, f"/ws/chat/{thread.id}/?token={token_for(alice)}")
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        await communicator.receive_nothing(0.2)  # resume/history frames, if any
+
+        await communicator.send_json_to({"action": "read", "message_id": "abc"})
+        frame = await communicator.receive_json_from(timeout=2)
+        while frame.get("type") != "error":
+            frame = await communicator.receive_json_from(timeout=2)
+        self.assertIn("message_id", frame["error"])
+
+        # The consumer is still alive
+        await communicator.send_json_to({"action": "read"})
+        frame = await communicator.receive_json_from(timeout=2)
+        self.assertEqual(frame["type"], "read")
+        await communicator.disconnect()
+
+
+class SearchPagingTests(TestCase):
+    def setUp(self):
+        self.alice, self.bob = make_user(1), make_user(2)
+        thread = make_thread(self.alice, self.bob)
+        for i in range(12):
+            Message.objects.create(thread=thread, sender=self.bob, text=f"pizza number {i}")
+
+    def test_pages_follow_has_more_to_the_end(self):
+        seen, offset = [], 0
+        while True:
+            results, has_more = search_messages(self.alice, "pizza", limit=5, offset=offset)
+            seen += [r["id"] for r in results]
+            if not has_more:
+                break
+            offset += 5
+        self.assertEqual(len(seen), 12)
+        self.assertEqual(len(set(seen)), 12)
+
+    def test_offset_cap_ends_paging(self):
+        with mock.patch("Chat.search.MAX_SEARCH_OFFSET", 5):
+            results, has_more = search_messages(self.alice, "pizza", limit=5, offset=5)
+            self.assertEqual(len(results), 5)
+            self.assertFalse(has_more)
+            self.assertEqual(search_messages(self.alice, "pizza", limit=5, offset=10), ([], False))
+
+
+@skipUnless(connection.vendor == "sqlite", "bm25 ranks are only computed on SQLite")
+class SearchRankMergeTests(TestCase):
+    def setUp(self):
+        self.alice, self.bob = make_user(1), make_user(2)
+        thread = make_thread(self.alice, self.bob)
+        for i in range(12):
+            Message.objects.create(thread=thread, sender=self.bob, text=f"pizza number {i}")
+        group = Group.objects.create(name="g", created_by=self.bob)
+        GroupMember.objects.create(group=group, user=self.alice)
+        for i in range(20):
+            GroupMessage.objects.create(group=group, sender=self.bob, text=f"hello there {i}")
+        old = GroupMessage.objects.create(group=group, sender=self.bob, text="pizza tonight")
+        GroupMessage.objects.filter(id=old.id).update(created_at=timezone.now() - timedelta(days=1))
+
+    def test_ranks_from_the_two_tables_are_scaled_before_merging(self):
+        # Raw bm25 would put the rare group match far above every chat match
+        results, _ = search_messages(self.alice, "pizza", limit=20)
+        self.assertEqual([r["kind"] for r in results], ["chat"] * 12 + ["group"])
+        self.assertEqual({r["rank"] for r in results}, {1.0})
+
+
+class PageMessagesTests(TestCase):
+    def setUp(self):
+        self.alice, self.bob = make_user(1), make_user(2)
+        self.thread = make_thread(self.alice, self.bob)
+        self.ids = [
+            Message.objects.create(thread=self.thread, sender=self.bob, text=f"m{i}").id for i in range(7)
+        ]
+        self.messages = Message.objects.filter(thread=self.thread)
+
+    def ids_of(self, page):
+        rows, has_more = page
+        return [m.id for m in rows], has_more
+
+    def test_newest_page_oldest_first(self):
+        self.assertEqual(self.ids_of(page_messages(self.messages, limit=3)), (self.ids[4:], True))
+
+    def test_walking_back_with_before_id(self):
+        self.assertEqual(self.ids_of(page_messages(self.messages, before_id=self.ids[4], limit=3)), (self.ids[1:4], True))
+        self.assertEqual(self.ids_of(page_messages(self.messages, before_id=self.ids[1], limit=3)), (self.ids[:1], False))
+
+    def test_walking_forward_with_after_id(self):
+        self.assertEqual(self.ids_of(page_messages(self.messages, after_id=self.ids[0], limit=3)), (self.ids[1:4], True))
+        self.assertEqual(self.ids_of(page_messages(self.messages, after_id=self.ids[3], limit=3)), (self.ids[4:], False))
+        self.assertEqual(
+            self.ids_of(page_messages(self.messages, after_id=self.ids[0], before_id=self.ids[3])), (self.ids[1:3], False)
+        )
+
+    def test_bad_params_fall_back_to_defaults(self):
+        rows, has_more = page_messages(self.messages, before_id="x", after_id="-1", limit="lots")
+        self.assertEqual([m.id for m in rows], self.ids)
+        self.assertFalse(has_more)
+        with mock.patch("Chat.utils.MAX_MESSAGE_PAGE_SIZE", 2):
+            self.assertEqual(len(page_messages(self.messages, limit=100)[0]), 2)
+
+    def test_view_returns_cursors(self):
+        client = APIClient()
+        client.force_authenticate(self.alice)
+        url = f"/api/chat/threads/{self.thread.id}/messages/"
+        response = client.get(url, {"limit": 4})
+        self.assertEqual([m["id"] for m in response.data["results"]], self.ids[3:])
+        self.assertTrue(response.data["has_more"])
+        response = client.get(url, {"limit": 4, "before_id": response.data["before_id"]})
+        self.assertEqual([m["id"] for m in response.data["results"]], self.ids[:3])
+        self.assertFalse(response.data["has_more"])
+
+        client.force_authenticate(make_user(3))
+        self.assertEqual(client.get(url).status_code, 403)
+
+
+class MessagesSinceTests(TestCase):
+    def setUp(self):
+        self.alice, self.bob = make_user(1), make_user(2)
+        self.thread = make_thread(self.alice, self.bob)
+        self.ids = [
+            Message.objects.create(thread=self.thread, sender=self.bob, text=f"m{i}").id for i in range(5)
+        ]
+        self.messages = Message.objects.filter(thread=self.thread)
+
+    def test_returns_missed_messages_oldest_first(self):
+        rows, has_more = messages_since(self.messages, self.ids[1])
+        self.assertEqual([m.id for m in rows], self.ids[2:])
+        self.assertFalse(has_more)
+
+    def test_caps_replay_and_reports_more(self):
+        with self.settings(CHAT_RESUME_MAX_MESSAGES=2):
+            rows, has_more = messages_since(self.messages, self.ids[0])
+        self.assertEqual([m.id for m in rows], self.ids[1:3])
+        self.assertTrue(has_more)
+
+    def test_invalid_cursor_replays_from_the_start(self):
+        rows, _ = messages_since(self.messages, "garbage")
+        self.assertEqual([m.id for m in rows], self.ids)
+
+    def test_nothing_missed(self):
+        self.assertEqual(messages_since(self.messages, self.ids[-1]), ([], False))
+
+
+class FakeTransport:
+    """Like a Twisted transport: pauses its streaming producer while over bufferSize bytes are unsent."""
+
+    bufferSize = 1000
+
+    def __init__(self):
+        self.producer = None
+        self.unsent = 0
+
+    def registerProducer(self, producer, streaming):
+        if self.producer is not None:
+            raise RuntimeError("a producer is already registered")
+        self.producer = producer
+
+    def unregisterProducer(self):
+        self.producer = None
+
+    def write(self, size):
+        self.unsent += size
+        if self.producer is not None and self.unsent > self.bufferSize:
+            self.producer.pauseProducing()
+
+    def flush(self):
+        """The client read everything."""
+        self.unsent = 0
+        if self.producer is not None:
+            self.producer.resumeProducing()
+
+
+class FakeSocket(BoundedSendMixin):
+    """A consumer whose server buffers written bytes in a FakeTransport."""
+
+    channel_name = "test.socket"
+
+    def __init__(self, stuck=False, transport=None):
+        self.transport = transport or FakeTransport()
+        self.base_send = partial(self._server_send, SimpleNamespace(transport=self.transport))
+        self.stuck = stuck
+        self.sent = []
+        self.closed = None
+
+    async def _server_send(self, protocol, message):
+        pass
+
+    async def send_json(self, content):
+        if self.stuck:
+            await asyncio.Event().wait()
+        self.sent.append(content)
+        self.transport.write(100)
+
+    async def close(self, code=None):
+        self.closed = code
+
+
+@override_settings(WS_SEND_QUEUE_HIGH_WATER=10, WS_SLOW_CONSUMER_GRACE=0.2)
+class SendQueueTests(SimpleTestCase):
+    async def test_server_backlog_stops_draining_and_evicts_when_idle(self):
+        socket = FakeSocket()
+        for i in range(30):
+            await socket.queue_json({"n": i})
+            await asyncio.sleep(0)
+
+        # Just over bufferSize reaches the transport, the queue holds (and drops) the rest
+        self.assertEqual(len(socket.sent), 11)
+        self.assertEqual(len(socket._send_queue), 10)
+        self.assertEqual(socket._dropped, 9)
+        self.assertIsNone(socket.closed)
+
+        # Nothing else is queued; the timer alone closes the socket
+        await asyncio.sleep(0.6)
+        self.assertEqual(socket.closed, SLOW_CONSUMER_CLOSE_CODE)
+        self.assertIsNone(socket._send_queue)
+        self.assertIsNone(socket.transport.producer)
+
+    async def test_stuck_send_is_evicted(self):
+        socket = FakeSocket(stuck=True)
+        await socket.queue_json({"n": 0})
+        with mock.patch("Chat.send_queue.SLOW_SEND_SECONDS", 0.05):
+            await asyncio.sleep(0.6)
+        self.assertEqual(socket.closed, SLOW_CONSUMER_CLOSE_CODE)
+
+    async def test_reader_that_keeps_up_is_not_evicted(self):
+        socket = FakeSocket()
+        for i in range(50):
+            await socket.queue_json({"n": i})
+            await asyncio.sleep(0.01)
+            socket.transport.flush()
+        await asyncio.sleep(0.3)
+        self.assertEqual(len(socket.sent), 50)
+        self.assertIsNone(socket.closed)
+        socket._discard_send_queue()
+
+    async def test_unwatchable_transport_is_reported_once(self):
+        taken = FakeTransport()
+        taken.registerProducer(object(), True)
+        with mock.patch("Chat.send_queue._warned", set()), mock.patch("builtins.print") as printed:
+            for _ in range(2):
+                socket = FakeSocket(transport=taken)
+                await socket.queue_json({"n": 0})
+                await asyncio.sleep(0)
+                self.assertEqual(socket.sent, [{"n": 0}])
+                socket._discard_send_queue()
+        self.assertEqual(printed.call_count, 1)
+        self.assertIn("server write buffer", printed.call_args[0][0])
+
+
+class LoadTestCommandTests(TransactionTestCase):
+    def test_percentile(self):
+        self.assertEqual(_percentile([], 0.5), 0.0)
+        self.assertEqual(_percentile([3, 1, 2, 4], 0.5), 3)
+        self.assertEqual(_percentile([3, 1, 2, 4], 0.99), 4)
+
+    def test_fixtures_pair_users_and_fill_groups(self):
+        rooms, tokens = _create_fixtures(6, 3, 2)
+        self.assertEqual(len(tokens), 6)
+        chats = [members for kind, _, members in rooms if kind == "chat"]
+        groups = [members for kind, _, members in rooms if kind == "group"]
+        self.assertEqual(len(chats), 3)
+        self.assertTrue(all(len(members) == 2 for members in chats))
+        self.assertEqual(sorted(len(members) for members in groups), [3, 3])
+
+    def test_run_delivers_everything_and_cleans_up(self):
+        out = io.StringIO()
+        call_command(
+            "loadtestws", users=4, threads=2, groups=1, messages=2, interval=0.01, timeout=20, stdout=out,
+        )
+        report = out.getvalue()
+        # 2 threads of 2 and a group of 4: 8 connections, each room member gets every message
+        self.assertIn("8 connections", report)
+        self.assertIn("delivered   16/16 messages, 48/48 deliveries", report)
+        self.assertFalse(Users.objects.filter(username__startswith=PREFIX).exists())
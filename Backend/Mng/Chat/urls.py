@@ -4,7 +4,10 @@ from . import views
 urlpatterns = [
     # POST endpoints (send access_token in request body)
     path('threads/<int:thread_id>/messages/', views.get_thread_messages, name='thread_messages'),
+    path('threads/<int:thread_id>/read/', views.mark_read, name='thread_mark_read'),
+    path('threads/<int:thread_id>/unread/', views.get_unread_count, name='thread_unread_count'),
     path('threads/', views.get_user_threads, name='user_threads'),
+    path('search/', views.search, name='search_messages'),
     
     # Alternative GET endpoint using Authorization header
     # path('threads/header-auth/', views.get_user_threads_header_auth, name='user_threads_header'),
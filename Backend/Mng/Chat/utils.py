@@ -1,15 +1,120 @@
-from django.db.models import Q
-from UserData.models import Users, Connection
-from .models import ChatThread
+from django.conf import settings
+from UserData.graph import connection_graph
+from UserData.models import Users
+from .models import ChatThread, Message, ReadCursor
 
 def are_connected(u1: Users, u2: Users) -> bool:
-    return Connection.objects.filter(
-        Q(user=u1, connected_user=u2) | Q(user=u2, connected_user=u1)
-    ).exists()
+    return connection_graph.are_connected(u1.id, u2.id)
 
 
 def get_or_create_thread(user1, user2):
     """Ensure thread exists between two users"""
     low, high = (user1, user2) if user1.id < user2.id else (user2, user1)
     thread, _ = ChatThread.objects.get_or_create(user_low=low, user_high=high)
-    return thread
\ No newline at end of file
+    return thread
+
+MESSAGE_PAGE_SIZE = 50
+MAX_MESSAGE_PAGE_SIZE = 200
+
+
+def _positive_int(value):
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return None
+    return value if value > 0 else None
+
+
+def page_messages(queryset, before_id=None, after_id=None, limit=None):
+    """
+    Keyset page over a message queryset, walking the (thread, id) index.
+
+    - before_id: messages older than this id (default: the newest page)
+    - after_id:  messages newer than this id
+    Only limit + 1 rows are ever fetched, so the cost does not depend on the
+    thread length. Returns (rows oldest-first, has_more).
+    """
+    limit = min(_positive_int(limit) or MESSAGE_PAGE_SIZE, MAX_MESSAGE_PAGE_SIZE)
+    before_id = _positive_int(before_id)
+    after_id = _positive_int(after_id)
+
+    if after_id is not None:
+        queryset = queryset.filter(id__gt=after_id)
+        if before_id is not None:
+            queryset = queryset.filter(id__lt=before_id)
+        rows = list(queryset.order_by("id")[:limit + 1])
+        has_more = len(rows) > limit
+        return rows[:limit], has_more
+
+    if before_id is not None:
+        queryset = queryset.filter(id__lt=before_id)
+    rows = list(queryset.order_by("-id")[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    rows.reverse()
+    return rows, has_more
+
+
+def messages_since(queryset, since_id):
+    """
+    Messages a reconnecting socket missed: newer than since_id, oldest first,
+    at most CHAT_RESUME_MAX_MESSAGES. Uses the same id index as page_messages.
+    Returns (rows, has_more); with has_more the client pages the rest over
+    REST with after_id.
+    """
+    limit = getattr(settings, "CHAT_RESUME_MAX_MESSAGES", 100)
+    since_id = _positive_int(since_id) or 0
+    rows = list(queryset.filter(id__gt=since_id).order_by("id")[:limit + 1])
+    return rows[:limit], len(rows) > limit
+
+
+def get_read_cursors(thread):
+    """{user_id: last_read_message_id} for participants that have read anything."""
+    return dict(
+        ReadCursor.objects.filter(thread=thread).values_list("user_id", "last_read_message_id")
+    )
+
+
+def is_read(message, cursors):
+    """A message is read once a participant other than its sender has passed it."""
+    return any(
+        user_id != message.sender_id and last_read >= message.id
+        for user_id, last_read in cursors.items()
+    )
+
+
+def mark_thread_read(thread, user, message_id=None):
+    """
+    Move the user's read watermark forward to message_id (default: the newest
+    message). Never moves it back. Returns the watermark.
+    Raises ValueError when message_id is not a positive integer.
+    """
+    newest = thread.last_message_id or 0
+    if message_id is None:
+        message_id = newest
+    else:
+        parsed = _positive_int(message_id)
+        if parsed is None:
+            raise ValueError("message_id must be a positive integer")
+        message_id = min(parsed, newest)
+
+    # Common case: a single conditional UPDATE
+    if ReadCursor.objects.filter(
+        thread=thread, user=user, last_read_message_id__lt=message_id
+    ).update(last_read_message_id=message_id):
+        return message_id
+
+    cursor, created = ReadCursor.objects.get_or_create(
+        thread=thread, user=user, defaults={"last_read_message_id": message_id}
+    )
+    return cursor.last_read_message_id
+
+
+def unread_count(thread, user):
+    """Messages from the other participant past the user's watermark."""
+    last_read = (
+        ReadCursor.objects.filter(thread=thread, user=user)
+        .values_list("last_read_message_id", flat=True)
+        .first()
+    ) or 0
+    return Message.objects.filter(thread=thread, id__gt=last_read).exclude(sender=user).count()
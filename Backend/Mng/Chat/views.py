@@ -3,28 +3,27 @@ from rest_framework.response import Response
 from rest_framework import status
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from Users.auth import get_user_from_token
 
 from UserData.models import Users
+from Users.utils import get_user_card, get_user_cards, get_public_photos
 from .serializers import MessageSerializer
-from .utils import get_or_create_thread, are_connected
+from .utils import (
+    get_or_create_thread, are_connected, page_messages,
+    get_read_cursors, is_read, mark_thread_read, unread_count,
+)
 
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
-from .models import ChatThread, Message
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from .models import ChatThread, Message, ReadCursor
+from .search import search_messages
 
 
 
-def get_user_from_token(token):
-    
-    print("11111111111")
-    jwt_auth = JWTAuthentication()
-    validated_token = jwt_auth.get_validated_token(token)  # Validate and decode
-    user = jwt_auth.get_user(validated_token)  # Get user instance
-    return user
-
 
 @api_view(["POST"])
 def chat(request):
@@ -72,14 +71,7 @@ def chat(request):
                 "thread": thread.id,
                 "text": msg.text,
                 "created_at": msg.created_at.isoformat(),
-                "sender": {
-                    "id": sender.id,
-                    "username": sender.username,
-                    "full_name": getattr(sender.profile, "full_name", ""),
-                    "photo": (sender.photos.filter(is_private=False).first().url
-                              if hasattr(sender, "photos") and sender.photos.exists()
-                              else None),
-                },
+                "sender": get_user_card(sender),
             },
         },
     )
@@ -105,7 +97,12 @@ def thread_messages(request, thread_id):
 @api_view(['GET'])
 def get_thread_messages(request, thread_id):
     """
-    Get all messages for a specific thread
+    Get one page of messages for a specific thread.
+
+    Query params:
+      before_id - page of messages older than this id (default: newest page)
+      after_id  - page of messages newer than this id
+      limit     - page size (default 50, capped at 200)
     """
     print(f"\n📋 API: Getting messages for thread {thread_id}")
     print(f"👤 Requested by user: {request.user.id}")
@@ -129,45 +126,76 @@ def get_thread_messages(request, thread_id):
             status=status.HTTP_403_FORBIDDEN
         )
     
-    # Get messages
-    messages = Message.objects.filter(thread=thread).select_related('sender', 'sender__profile').order_by('created_at')
-    print(f"📨 Found {messages.count()} messages")
+    # Get one keyset page of messages
+    messages, has_more = page_messages(
+        Message.objects.filter(thread=thread),
+        before_id=request.GET.get("before_id"),
+        after_id=request.GET.get("after_id"),
+        limit=request.GET.get("limit"),
+    )
+    print(f"📨 Returning {len(messages)} messages")
     
+    # Resolve sender cards and read watermarks for the whole page at once
+    sender_cards = get_user_cards(msg.sender_id for msg in messages)
+    read_cursors = get_read_cursors(thread)
+
     # Serialize messages
     message_data = []
     for msg in messages:
-        # Get sender photo
-        photo = None
-        if hasattr(msg.sender, 'photos') and msg.sender.photos.exists():
-            first_photo = msg.sender.photos.filter(is_private=False).first()
-            if first_photo:
-                photo = first_photo.url
-        
-        # Get full name
-        full_name = ""
-        if hasattr(msg.sender, 'profile') and msg.sender.profile:
-            full_name = msg.sender.profile.full_name
-        
         message_data.append({
             "id": msg.id,
             "text": msg.text,
             "created_at": msg.created_at.isoformat(),
-            "is_read": msg.is_read,
-            "sender": {
-                "id": msg.sender.id,
-                "username": msg.sender.username,
-                "full_name": full_name,
-                "photo": photo,
-            }
+            "is_read": is_read(msg, read_cursors),
+            "sender": sender_cards[msg.sender_id],
         })
     
     return Response({
         "thread_id": thread_id,
         "message_count": len(message_data),
+        "has_more": has_more,
+        # Cursors for the next page in either direction
+        "before_id": message_data[0]["id"] if message_data else None,
+        "after_id": message_data[-1]["id"] if message_data else None,
         "results": message_data
     })
 
 
+@api_view(['POST'])
+def mark_read(request, thread_id):
+    """
+    Mark a thread as read for the current user.
+    Body (optional): { "message_id": 123 }  - defaults to the newest message
+    """
+    try:
+        thread = ChatThread.objects.get(pk=thread_id)
+    except ChatThread.DoesNotExist:
+        return Response({"error": "Thread not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    if not thread.has_user(request.user):
+        return Response({"error": "Not authorized"}, status=status.HTTP_403_FORBIDDEN)
+
+    try:
+        last_read = mark_thread_read(thread, request.user, request.data.get("message_id"))
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({"thread_id": thread.id, "last_read_message_id": last_read})
+
+
+@api_view(['GET'])
+def get_unread_count(request, thread_id):
+    """Number of messages from the other participant the current user has not read."""
+    try:
+        thread = ChatThread.objects.get(pk=thread_id)
+    except ChatThread.DoesNotExist:
+        return Response({"error": "Thread not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    if not thread.has_user(request.user):
+        return Response({"error": "Not authorized"}, status=status.HTTP_403_FORBIDDEN)
+
+    return Response({"thread_id": thread.id, "unread_count": unread_count(thread, request.user)})
+
+
 @api_view(['GET'])
 def get_user_threads(request):
     """
@@ -185,33 +213,45 @@ def get_user_threads(request):
 
     print(f"\n📋 API: Getting threads for user {user.id}")
     
-    # Get all threads where user is a participant
-    threads = ChatThread.objects.filter(
-        models.Q(user_low=user) | models.Q(user_high=user)
-    ).order_by('-created_at')
+    # Get all threads where user is a participant, most recent activity first.
+    # Everything except photos comes back in this one query.
+    threads = list(
+        ChatThread.objects.filter(Q(user_low=user) | Q(user_high=user))
+        .select_related(
+            'user_low__profile', 'user_high__profile', 'last_message__sender'
+        )
+        .order_by(F('last_message_at').desc(nulls_last=True), '-created_at')
+    )
+    
+    other_users = [
+        thread.user_high if thread.user_low_id == user.id else thread.user_low
+        for thread in threads
+    ]
+    photos = get_public_photos(u.id for u in other_users)
+    
+    # Unread counts for every thread in one grouped range count
+    last_read = ReadCursor.objects.filter(
+        thread=OuterRef('thread'), user=user
+    ).values('last_read_message_id')[:1]
+    unread = dict(
+        Message.objects.filter(thread__in=[t.id for t in threads])
+        .exclude(sender=user)
+        .filter(id__gt=Coalesce(Subquery(last_read), 0))
+        .values('thread')
+        .annotate(n=Count('id'))
+        .values_list('thread', 'n')
+    )
     
     thread_data = []
-    for thread in threads:
-        # Get other participant
-        other_user = thread.user_high if thread.user_low == user else thread.user_low
-        
-        # Get last message
-        last_message = thread.messages.order_by('-created_at').first()
+    for thread, other_user in zip(threads, other_users):
         last_message_data = None
-        if last_message:
+        if thread.last_message_id:
             last_message_data = {
-                "text": last_message.text,
-                "created_at": last_message.created_at.isoformat(),
-                "sender_username": last_message.sender.username
+                "text": thread.last_message_preview,
+                "created_at": thread.last_message_at.isoformat(),
+                "sender_username": thread.last_message.sender.username
             }
         
-        # Get other user photo
-        photo = None
-        if hasattr(other_user, 'photos') and other_user.photos.exists():
-            first_photo = other_user.photos.filter(is_private=False).first()
-            if first_photo:
-                photo = first_photo.url
-        
         # Get full name
         full_name = ""
         if hasattr(other_user, 'profile') and other_user.profile:
@@ -223,9 +263,10 @@ def get_user_threads(request):
                 "id": other_user.id,
                 "username": other_user.username,
                 "full_name": full_name,
-                "photo": photo,
+                "photo": photos.get(other_user.id),
             },
             "last_message": last_message_data,
+            "unread_count": unread.get(thread.id, 0),
             "created_at": thread.created_at.isoformat(),
         })
     
@@ -233,3 +274,29 @@ def get_user_threads(request):
     return Response({"results": thread_data})
 
 
+@api_view(['GET'])
+def search(request):
+    """
+    Full-text search over the current user's threads and groups.
+
+    Query params:
+      q      - search text
+      limit  - page size (default 20, capped at 50)
+      offset - results to skip (at most 500; further pages are empty)
+    """
+    query = (request.GET.get("q") or "").strip()
+    if not query:
+        return Response({"error": "Search text required"}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        limit = int(request.GET.get("limit") or 0)
+        offset = int(request.GET.get("offset") or 0)
+    except ValueError:
+        return Response({"error": "limit and offset must be integers"}, status=status.HTTP_400_BAD_REQUEST)
+
+    results, has_more = search_messages(request.user, query, limit=limit, offset=offset)
+    return Response({
+        "query": query,
+        "has_more": has_more,
+        "results": results,
+    })
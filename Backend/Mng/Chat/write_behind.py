@@ -0,0 +1,139 @@
+"""
+Opt-in write-behind persistence for WebSocket messages (CHAT_WRITE_BEHIND).
+
+Consumers reserve an id, broadcast right away and hand the unsaved row to a
+WriteBehindQueue. The queue writes rows with one bulk_create every
+CHAT_WRITE_BEHIND_INTERVAL seconds or every CHAT_WRITE_BEHIND_BATCH_SIZE
+rows, whichever comes first, and resolves a future per row once it is stored.
+
+Ids come from the table's sequence in blocks of CHAT_WRITE_BEHIND_ID_BLOCK,
+so they are unique but only roughly time-ordered across worker processes.
+On databases without sequences (SQLite in development) ids continue from the
+current max(id), which is only safe with a single worker process and no REST
+writes to the same table.
+
+The row's created_at is set again by auto_now_add when it is stored, so the
+ack carries the stored value.
+"""
+
+import asyncio
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Max
+
+
+def write_behind_enabled():
+    return getattr(settings, "CHAT_WRITE_BEHIND", False)
+
+
+def _reserve_ids(model, count):
+    if connection.vendor == "postgresql":
+        table = model._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT nextval(pg_get_serial_sequence(%s, 'id')) FROM generate_series(1, %s)",
+                [f'"{table}"', count],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    start = (model.objects.aggregate(top=Max("id"))["top"] or 0) + 1
+    return list(range(start, start + count))
+
+
+class WriteBehindQueue:
+    def __init__(self, model, after_flush=None):
+        self.model = model
+        self.after_flush = after_flush
+        self.batch_size = getattr(settings, "CHAT_WRITE_BEHIND_BATCH_SIZE", 100)
+        self.interval = getattr(settings, "CHAT_WRITE_BEHIND_INTERVAL", 0.005)
+        self.id_block = getattr(settings, "CHAT_WRITE_BEHIND_ID_BLOCK", 50)
+        self.pending = []
+        self._ids = []
+        self._high_id = 0
+        self._id_lock = None
+        self._full = None
+        self._task = None
+
+    async def reserve_id(self):
+        if self._id_lock is None:
+            self._id_lock = asyncio.Lock()
+        async with self._id_lock:
+            if not self._ids:
+                ids = await database_sync_to_async(_reserve_ids)(self.model, self.id_block)
+                # Non-sequence fallback: never hand out an id twice in this process
+                if ids[0] <= self._high_id:
+                    ids = list(range(self._high_id + 1, self._high_id + 1 + len(ids)))
+                self._high_id = ids[-1]
+                self._ids = ids
+            return self._ids.pop(0)
+
+    def add(self, obj):
+        """Queue an unsaved row (with its id set). Returns a future for the write."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((obj, future))
+
+        if self._task is None or self._task.done():
+            self._full = asyncio.Event()
+            self._task = loop.create_task(self._run())
+        if len(self.pending) >= self.batch_size:
+            self._full.set()
+        return future
+
+    async def _run(self):
+        while self.pending:
+            if len(self.pending) < self.batch_size:
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.interval)
+                except asyncio.TimeoutError:
+                    pass
+            self._full.clear()
+
+            batch = self.pending[:self.batch_size]
+            self.pending = self.pending[self.batch_size:]
+            try:
+                await database_sync_to_async(self._write)([obj for obj, _ in batch])
+            except Exception as e:
+                print(f"❌ Write-behind flush of {len(batch)} {self.model.__name__} rows failed: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            else:
+                for obj, future in batch:
+                    if not future.done():
+                        future.set_result(obj)
+
+    def _write(self, objs):
+        with transaction.atomic():
+            self.model.objects.bulk_create(objs)
+            if self.after_flush:
+                self.after_flush(objs)
+
+
+class WriteBehindMixin:
+    """Consumer side of write-behind: broadcast first, ack the sender once stored."""
+
+    async def write_behind(self, queue, message, room, event, ack_extra=None):
+        await self.channel_layer.group_send(room, event)
+
+        if not hasattr(self, "ack_tasks"):
+            self.ack_tasks = set()
+        task = asyncio.ensure_future(
+            self._ack_when_stored(queue.add(message), message.id, ack_extra or {})
+        )
+        self.ack_tasks.add(task)
+        task.add_done_callback(self.ack_tasks.discard)
+
+    async def _ack_when_stored(self, stored, message_id, ack_extra):
+        try:
+            message = await stored
+            ack = {"type": "ack", "id": message_id, "status": "stored",
+                   "created_at": message.created_at.isoformat()}
+        except Exception:
+            ack = {"type": "ack", "id": message_id, "status": "failed"}
+        try:
+            await self.send_json({**ack, **ack_extra})
+        except Exception as e:
+            print(f"❌ Could not ack message {message_id}: {e}")
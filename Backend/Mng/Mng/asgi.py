@@ -1,7 +1,6 @@
 import os
 import django
 from channels.routing import ProtocolTypeRouter, URLRouter
-from channels.auth import AuthMiddlewareStack
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "Mng.settings")
@@ -10,13 +9,15 @@ django.setup()
 # Import both routing files
 import Chat.routing
 import groups.routing
+from Users.middleware import JWTAuthMiddleware
 
 # Combine websocket URL patterns from both apps
 websocket_patterns = Chat.routing.websocket_urlpatterns + groups.routing.websocket_urlpatterns
 
 application = ProtocolTypeRouter({
     "http": get_asgi_application(),
-    "websocket": AuthMiddlewareStack(
+    # JWT from ?token= -> scope["user"] and scope["user_card"]
+    "websocket": JWTAuthMiddleware(
         URLRouter(websocket_patterns)
     ),
 })
\ No newline at end of file
@@ -0,0 +1,32 @@
+"""
+Caches that every worker process sees.
+
+The connection graph, friend suggestions and the interest name version are
+cached across requests and invalidated by the process that made the write.
+That only works in a cache all workers share. A process-local cache
+(LocMem) is only shared when a single process serves the site, which
+nothing here can tell, so it counts as shared only when its alias is listed
+in SHARED_CACHE_ALIASES. Otherwise it would leave every other worker
+serving stale data until its TTL ran out: shared_cache() then returns None
+and callers go to the database instead. Set CACHE_URL to a Redis server to
+keep the cached paths with several workers.
+"""
+
+from django.conf import settings
+from django.core.cache import caches
+
+PROCESS_LOCAL_BACKENDS = {
+    "django.core.cache.backends.locmem.LocMemCache",
+}
+
+
+def is_process_local(alias):
+    return settings.CACHES[alias]["BACKEND"] in PROCESS_LOCAL_BACKENDS
+
+
+def shared_cache(alias):
+    """caches[alias], or None when it is process-local and not listed in SHARED_CACHE_ALIASES."""
+    if is_process_local(alias) and alias not in getattr(settings, "SHARED_CACHE_ALIASES", ()):
+        print(f"⚠️ Cache {alias!r} is local to this process; reading from the database instead (set CACHE_URL)")
+        return None
+    return caches[alias]
@@ -0,0 +1,352 @@
+"""
+Channel layer that fans out across worker processes on one host.
+
+Every worker process keeps one connection to a small broker (the hub) listening
+on a Unix socket. Group membership lives in the hub; each worker only holds the
+queues for its own channels. A group_send is forwarded once per worker process
+that has members in the group, and the message body is passed through the hub
+as opaque bytes.
+
+Run the hub next to the ASGI workers:
+
+    python manage.py runchannelhub --socket /tmp/mng-channels.sock
+
+and point CHANNEL_LAYERS at HubChannelLayer with the same "path".
+
+Messages must be JSON serializable (everything the consumers send is).
+"""
+
+import asyncio
+import json
+import os
+import random
+import string
+import struct
+import time
+import uuid
+from collections import defaultdict
+
+from channels.exceptions import ChannelFull
+from channels.layers import BaseChannelLayer
+
+DEFAULT_SOCKET_PATH = "/tmp/mng-channels.sock"
+
+# A frame is: header length, body length, JSON header, body bytes
+_FRAME_HEAD = struct.Struct(">II")
+
+# Stop writing to a worker whose socket buffer is this far behind
+HUB_WRITE_HIGH_WATER = 8 * 1024 * 1024
+
+# Reconnect backoff after losing the hub (seconds, doubled per attempt)
+HUB_RECONNECT_MIN = 0.05
+HUB_RECONNECT_MAX = 5.0
+
+
+def _encode_frame(header, body=b""):
+    header = json.dumps(header, separators=(",", ":")).encode()
+    return _FRAME_HEAD.pack(len(header), len(body)) + header + body
+
+
+async def _read_frame(reader):
+    head = await reader.readexactly(_FRAME_HEAD.size)
+    header_len, body_len = _FRAME_HEAD.unpack(head)
+    header = json.loads(await reader.readexactly(header_len))
+    body = await reader.readexactly(body_len) if body_len else b""
+    return header, body
+
+
+def _client_name(channel):
+    """Routing key of a process-specific channel: everything before the '!'."""
+    return channel.split("!", 1)[0]
+
+
+class ChannelHub:
+    """
+    The broker. Holds group membership and routes frames between workers.
+
+    Worker protocol (header "op"):
+      hello         {"name"}              - this connection owns channels "<name>!*"
+      group_add     {"group", "channel"}
+      group_discard {"group", "channel"}
+      group_send    {"group"} + body
+      send          {"channel"} + body
+      flush         {}
+    The hub sends back only:
+      deliver       {"channels": [...]} + body
+    """
+
+    def __init__(self, path=DEFAULT_SOCKET_PATH):
+        self.path = path
+        self.groups = defaultdict(set)
+        self.clients = {}  # client name -> writer
+
+    async def serve(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        server = await asyncio.start_unix_server(self._handle, path=self.path)
+        async with server:
+            await server.serve_forever()
+
+    async def _handle(self, reader, writer):
+        names = set()
+        try:
+            while True:
+                header, body = await _read_frame(reader)
+                op = header["op"]
+                if op == "hello":
+                    names.add(header["name"])
+                    self.clients[header["name"]] = writer
+                elif op == "group_add":
+                    self.groups[header["group"]].add(header["channel"])
+                elif op == "group_discard":
+                    members = self.groups.get(header["group"])
+                    if members is not None:
+                        members.discard(header["channel"])
+                        if not members:
+                            del self.groups[header["group"]]
+                elif op == "group_send":
+                    self._fan_out(self.groups.get(header["group"], ()), body)
+                elif op == "send":
+                    self._fan_out((header["channel"],), body)
+                elif op == "flush":
+                    self.groups.clear()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._drop_client(names, writer)
+            writer.close()
+
+    def _fan_out(self, channels, body):
+        by_client = defaultdict(list)
+        for channel in channels:
+            by_client[_client_name(channel)].append(channel)
+
+        for name, client_channels in by_client.items():
+            writer = self.clients.get(name)
+            if writer is None or writer.is_closing():
+                continue
+            # A stuck worker must not make the hub buffer without bound
+            if writer.transport.get_write_buffer_size() > HUB_WRITE_HIGH_WATER:
+                continue
+            writer.write(_encode_frame({"op": "deliver", "channels": client_channels}, body))
+
+    def _drop_client(self, names, writer):
+        for name in names:
+            if self.clients.get(name) is writer:
+                del self.clients[name]
+        for group, members in list(self.groups.items()):
+            members.difference_update([c for c in members if _client_name(c) in names])
+            if not members:
+                del self.groups[group]
+
+
+class HubChannelLayer(BaseChannelLayer):
+    """
+    Channel layer client for ChannelHub.
+
+    Channel queues and expiry behave like InMemoryChannelLayer; groups are
+    shared by every process connected to the same hub socket. Memberships end
+    with group_discard or when the owning process disconnects from the hub
+    (group_expiry is accepted for config compatibility only).
+    """
+
+    extensions = ["groups", "flush"]
+
+    def __init__(
+        self,
+        path=DEFAULT_SOCKET_PATH,
+        expiry=60,
+        group_expiry=86400,
+        capacity=100,
+        channel_capacity=None,
+        **kwargs,
+    ):
+        super().__init__(
+            expiry=expiry,
+            capacity=capacity,
+            channel_capacity=channel_capacity,
+            **kwargs,
+        )
+        self.path = path
+        self.group_expiry = group_expiry
+        self.client_id = uuid.uuid4().hex
+        self.channels = {}
+        self.names = set()  # client names this process registered with the hub
+        self.memberships = set()  # (group, channel), replayed on reconnect
+        self._writer = None
+        self._loop = None
+        self._reader_task = None
+        self._connect_lock = None
+        self._closed = False
+
+    # ---------- Hub connection ----------
+
+    async def _hub(self):
+        """
+        Writer for the long-lived hub connection of this process.
+
+        The connection belongs to the event loop that opened it (the ASGI
+        server loop). Returns None when called from another live loop, e.g.
+        async_to_sync in a WSGI worker; callers then use a one-shot connection.
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is not None and self._loop is not loop and not self._loop.is_closed():
+            return None
+        if self._writer is not None and self._loop is loop and not self._writer.is_closing():
+            return self._writer
+
+        if self._loop is not loop:
+            # The previous loop is gone, and its connection with it
+            self._connect_lock = asyncio.Lock()
+            self._loop = loop
+            self._writer = None
+        async with self._connect_lock:
+            if self._writer is None or self._writer.is_closing():
+                reader, writer = await asyncio.open_unix_connection(self.path)
+                self._closed = False
+                # Re-register everything: the hub may have restarted
+                for name in self.names:
+                    writer.write(_encode_frame({"op": "hello", "name": name}))
+                for group, channel in self.memberships:
+                    writer.write(_encode_frame({"op": "group_add", "group": group, "channel": channel}))
+                await writer.drain()
+                self._writer = writer
+                self._reader_task = loop.create_task(self._read_loop(reader, writer))
+        return self._writer
+
+    async def _read_loop(self, reader, writer):
+        try:
+            while True:
+                header, body = await _read_frame(reader)
+                if header["op"] == "deliver":
+                    message = json.loads(body)
+                    for channel in header["channels"]:
+                        try:
+                            self._put_local(channel, message)
+                        except ChannelFull:
+                            pass  # same as group_send on a full channel: drop
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+            if self._writer is writer:
+                self._writer = None
+        # Lost the hub (e.g. it restarted). Reconnect right away rather than on
+        # the next send: a worker that only receives would otherwise never
+        # re-register its groups and silently stop getting fan-out.
+        await self._reconnect()
+
+    async def _reconnect(self):
+        delay = HUB_RECONNECT_MIN
+        while not self._closed:
+            try:
+                await self._hub()  # replays hello and group memberships
+                return
+            except OSError:
+                await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+                delay = min(delay * 2, HUB_RECONNECT_MAX)
+
+    async def _send_frame(self, header, body=b""):
+        writer = await self._hub()
+        if writer is not None:
+            writer.write(_encode_frame(header, body))
+            await writer.drain()
+            return
+
+        _, writer = await asyncio.open_unix_connection(self.path)
+        try:
+            writer.write(_encode_frame(header, body))
+            await writer.drain()
+        finally:
+            writer.close()
+            await writer.wait_closed()
+
+    # ---------- Local queues ----------
+
+    def _put_local(self, channel, message):
+        queue = self.channels.setdefault(
+            channel, asyncio.Queue(maxsize=self.get_capacity(channel))
+        )
+        try:
+            queue.put_nowait((time.time() + self.expiry, message))
+        except asyncio.QueueFull:
+            raise ChannelFull(channel)
+
+    def _clean_expired(self):
+        now = time.time()
+        for channel, queue in list(self.channels.items()):
+            while not queue.empty() and queue._queue[0][0] < now:
+                queue.get_nowait()
+                if queue.empty():
+                    self.channels.pop(channel, None)
+
+    # ---------- Channel layer API ----------
+
+    async def send(self, channel, message):
+        assert isinstance(message, dict), "message is not a dict"
+        self.require_valid_channel_name(channel)
+        assert "__asgi_channel__" not in message
+
+        if "!" not in channel or _client_name(channel) in self.names:
+            self._put_local(channel, json.loads(json.dumps(message)))
+            return
+        await self._send_frame({"op": "send", "channel": channel}, json.dumps(message).encode())
+
+    async def receive(self, channel):
+        self.require_valid_channel_name(channel)
+        self._clean_expired()
+        if "!" in channel:
+            # Make sure deliveries for this process are being read
+            await self._hub()
+
+        queue = self.channels.setdefault(
+            channel, asyncio.Queue(maxsize=self.get_capacity(channel))
+        )
+        try:
+            _, message = await queue.get()
+        finally:
+            if queue.empty():
+                self.channels.pop(channel, None)
+        return message
+
+    async def new_channel(self, prefix="specific."):
+        name = f"{prefix}{self.client_id}"
+        if name not in self.names:
+            self.names.add(name)
+            await self._send_frame({"op": "hello", "name": name})
+        return "%s!%s" % (
+            name,
+            "".join(random.choice(string.ascii_letters) for i in range(12)),
+        )
+
+    async def flush(self):
+        self.channels = {}
+        self.memberships = set()
+        await self._send_frame({"op": "flush"})
+
+    async def close(self):
+        self._closed = True
+        writer, self._writer = self._writer, None
+        if writer is not None:
+            # close() flushes what is still buffered before the socket goes
+            writer.close()
+            await writer.wait_closed()
+
+    # ---------- Groups extension ----------
+
+    async def group_add(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        self.memberships.add((group, channel))
+        await self._send_frame({"op": "group_add", "group": group, "channel": channel})
+
+    async def group_discard(self, group, channel):
+        self.require_valid_channel_name(channel)
+        self.require_valid_group_name(group)
+        self.memberships.discard((group, channel))
+        await self._send_frame({"op": "group_discard", "group": group, "channel": channel})
+
+    async def group_send(self, group, message):
+        assert isinstance(message, dict), "Message is not a dict"
+        self.require_valid_group_name(group)
+        await self._send_frame({"op": "group_send", "group": group}, json.dumps(message).encode())
@@ -12,7 +12,73 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 
 from pathlib import Path
 from datetime import timedelta
-from decouple import config
+from decouple import Csv, config
+
+# Cache shared by the worker processes (connection graph, suggestions,
+# interest name version, OTPs with OTP_STORE="cache"): a Redis URL such as
+# redis://127.0.0.1:6379/1. Unset, each process caches in its own memory,
+# which is only right for a single process.
+CACHE_URL = config("CACHE_URL", default="")
+
+# Process-local (in-memory) cache aliases to treat as shared anyway, because
+# a single process serves the site (runserver, tests, one daphne). Running
+# several workers without CACHE_URL, set it empty: the cached features then
+# read the database instead (see Mng/cache.py).
+SHARED_CACHE_ALIASES = config("SHARED_CACHE_ALIASES", default="default", cast=Csv())
+
+# Resolved access tokens are cached per process (see Users/auth.py)
+AUTH_TOKEN_CACHE_SIZE = config("AUTH_TOKEN_CACHE_SIZE", default=10000, cast=int)
+AUTH_TOKEN_CACHE_TTL = config("AUTH_TOKEN_CACHE_TTL", default=60, cast=float)  # seconds
+
+# Signup OTPs (see Users/otp.py): "database", "cache" or "memory"
+OTP_STORE = config("OTP_STORE", default="database")
+OTP_CACHE_ALIAS = config("OTP_CACHE_ALIAS", default="default")
+OTP_TTL = config("OTP_TTL", default=300, cast=int)  # seconds
+
+# Outbound SMS (see Users/sms.py): "fake" prints, "twilio" sends
+SMS_TRANSPORT = config("SMS_TRANSPORT", default="fake")
+SMS_FROM_NUMBER = config("SMS_FROM_NUMBER", default="+1 641 435 6293")
+SMS_CONCURRENCY = config("SMS_CONCURRENCY", default=4, cast=int)
+SMS_MAX_ATTEMPTS = config("SMS_MAX_ATTEMPTS", default=4, cast=int)
+SMS_RETRY_BACKOFF = config("SMS_RETRY_BACKOFF", default=0.5, cast=float)  # seconds, doubled per retry
+
+# Interest names for autocomplete (see Users/interests.py): writes bump a
+# version in this cache so every process reloads; use a shared cache across
+# worker processes
+INTEREST_NAMES_CACHE_ALIAS = config("INTEREST_NAMES_CACHE_ALIAS", default="default")
+# Without a shared cache the version is read from the database, at most this often
+INTEREST_NAMES_VERSION_TTL = config("INTEREST_NAMES_VERSION_TTL", default=2, cast=float)  # seconds
+
+# Interest-based profile recommendations (see UserData/recommend.py):
+# "index" (inverted index) or "bitset" (NumPy, see UserData/bitsets.py)
+RECOMMEND_ENGINE = config("RECOMMEND_ENGINE", default="index")
+RECOMMEND_MAX_CANDIDATES = config("RECOMMEND_MAX_CANDIDATES", default=10000, cast=int)
+RECOMMEND_INDEX_MAX_AGE = config("RECOMMEND_INDEX_MAX_AGE", default=600, cast=float)  # seconds
+# Directory for the bitset snapshot written by `manage.py buildinterestbitsets`
+RECOMMEND_BITSET_PATH = config("RECOMMEND_BITSET_PATH", default="")
+
+# Per-user connection/request sets (see UserData/graph.py); use a shared cache
+# across worker processes
+CONNECTION_GRAPH_CACHE_ALIAS = config("CONNECTION_GRAPH_CACHE_ALIAS", default="default")
+CONNECTION_GRAPH_TTL = config("CONNECTION_GRAPH_TTL", default=3600, cast=int)  # seconds
+
+# Friends-of-friends suggestions (see UserData/suggest.py): entries kept per
+# user, connections expanded per user, and the degree above which a
+# connection counts as a hub and is not expanded
+FOF_MAX_SUGGESTIONS = config("FOF_MAX_SUGGESTIONS", default=100, cast=int)
+FOF_MAX_NEIGHBORS = config("FOF_MAX_NEIGHBORS", default=500, cast=int)
+FOF_HUB_DEGREE = config("FOF_HUB_DEGREE", default=1000, cast=int)
+FOF_TTL = config("FOF_TTL", default=86400, cast=int)  # seconds
+# Entry lifetime when the cache is local to each of several processes
+FOF_LOCAL_TTL = config("FOF_LOCAL_TTL", default=60, cast=int)  # seconds
+
+# People search (see UserData/search.py) on databases without pg_trgm: the
+# in-memory name trie's candidates per query term and rebuild age
+USER_SEARCH_MAX_CANDIDATES = config("USER_SEARCH_MAX_CANDIDATES", default=1000, cast=int)
+USER_SEARCH_INDEX_MAX_AGE = config("USER_SEARCH_INDEX_MAX_AGE", default=600, cast=float)  # seconds
+
+# Threads that run password hashing for login/signup (see Users/passwords.py); 0 = one per CPU
+PASSWORD_HASH_WORKERS = config("PASSWORD_HASH_WORKERS", default=0, cast=int)
 
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=365*100),      # 1 day access token
@@ -69,15 +135,60 @@ MIDDLEWARE = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'Users.auth.CachedJWTAuthentication',
     )
 }
 
-CHANNEL_LAYERS = {
-    "default": {
-        "BACKEND": "channels.layers.InMemoryChannelLayer"
+# Set CHANNEL_HUB_SOCKET to fan out across ASGI worker processes through the
+# local hub (python manage.py runchannelhub). Unset: single-process in-memory layer.
+CHANNEL_HUB_SOCKET = config("CHANNEL_HUB_SOCKET", default="")
+
+if CHANNEL_HUB_SOCKET:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "Mng.channel_hub.HubChannelLayer",
+            "CONFIG": {"path": CHANNEL_HUB_SOCKET},
+        }
     }
-}
+else:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels.layers.InMemoryChannelLayer"
+        }
+    }
+
+if CACHE_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": CACHE_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+# Write-behind persistence for WebSocket messages (see Chat/write_behind.py):
+# broadcast first, bulk-insert every CHAT_WRITE_BEHIND_INTERVAL seconds or
+# CHAT_WRITE_BEHIND_BATCH_SIZE messages, then ack the sender.
+CHAT_WRITE_BEHIND = config("CHAT_WRITE_BEHIND", default=False, cast=bool)
+CHAT_WRITE_BEHIND_INTERVAL = config("CHAT_WRITE_BEHIND_INTERVAL", default=0.005, cast=float)
+CHAT_WRITE_BEHIND_BATCH_SIZE = config("CHAT_WRITE_BEHIND_BATCH_SIZE", default=100, cast=int)
+CHAT_WRITE_BEHIND_ID_BLOCK = config("CHAT_WRITE_BEHIND_ID_BLOCK", default=50, cast=int)
+
+# Reconnecting sockets may pass ?since=<message_id>; at most this many missed
+# messages are replayed, the rest is left to the paginated REST endpoints.
+CHAT_RESUME_MAX_MESSAGES = config("CHAT_RESUME_MAX_MESSAGES", default=100, cast=int)
+
+# Per-connection outbound queues (see Chat/send_queue.py): frames queued per
+# socket before dropping ("oldest" or "newest"), and how long a socket may
+# stay backed up before it is closed as a slow consumer.
+WS_SEND_QUEUE_HIGH_WATER = config("WS_SEND_QUEUE_HIGH_WATER", default=200, cast=int)
+WS_SEND_QUEUE_DROP = config("WS_SEND_QUEUE_DROP", default="oldest")
+WS_SLOW_CONSUMER_GRACE = config("WS_SLOW_CONSUMER_GRACE", default=10, cast=float)
 
 ROOT_URLCONF = 'Mng.urls'
 
@@ -38,6 +38,9 @@ urlpatterns = [
     path('addInterest',addInterest, name = 'addInterest'),
     path('removeInterest',removeInterest, name = 'removeInterest'),
     path('getProfiles',getProfiles, name = 'getProfiles'),
+    path('recommendProfiles',recommendProfiles, name = 'recommendProfiles'),
+    path('suggestProfiles',suggestProfiles, name = 'suggestProfiles'),
+    path('searchProfiles',searchProfiles, name = 'searchProfiles'),
     path('connect',connect, name = 'connect'),
     path('accept',accept, name = 'accept'),
     path("chat/<int:thread_id>/messages", thread_messages, name="thread_messages"),
@@ -46,5 +49,6 @@ urlpatterns = [
     path('groups/', include('groups.urls')),
     path('interests/', get_interests, name='get_interests'),
     path('interests/create/', create_interest, name='create_interest'),
+    path('interests/autocomplete/', autocomplete_interests, name='autocomplete_interests'),
     
 ]
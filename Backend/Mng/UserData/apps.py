@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class UserdataConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'UserData'
+
+    def ready(self):
+        # Connects the signals that keep the interest index, the connection
+        # graph cache, the friend suggestions and the name trie current
+        from . import graph, recommend, search, suggest  # noqa: F401
@@ -0,0 +1,253 @@
+"""
+Interest matching over packed bitsets (RECOMMEND_ENGINE = "bitset").
+
+Every user with a profile gets one row of uint64 words; bit c of a row is
+set when the user has the interest in column c (interest ids are mapped to
+dense columns, so the width is ceil(interests / 64) words whatever the ids
+are). A recommendation scores the whole population at once with vectorized
+popcount over the query's non-zero words:
+
+    jaccard = |a & b| / (|a| + |b| - |a & b|)
+
+At 1M users and a few hundred interests the matrix is tens of MB.
+
+`manage.py buildinterestbitsets` writes a snapshot to RECOMMEND_BITSET_PATH.
+Workers load a fresh enough snapshot (younger than RECOMMEND_INDEX_MAX_AGE)
+memory-mapped copy-on-write instead of querying the database, so processes
+on one host share the pages until they apply their own updates.
+
+A snapshot is one file (the three arrays back to back in .npy format)
+written aside and renamed into place, so a reader opens either the old
+snapshot or the new one, never a mix of the two.
+"""
+
+import os
+import time
+
+import numpy as np
+from django.conf import settings
+
+from Users.models import Interest, UserProfile
+from .recommend import BaseRecommender, ProfileInterest
+
+WORD_BITS = 64
+SCORE_LEVELS = 1024
+SNAPSHOT_FILE = "interest_bitsets.npy"
+
+
+def _write_arrays(path, arrays):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        for array in arrays:
+            np.lib.format.write_array(f, np.ascontiguousarray(array), allow_pickle=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _map_arrays(path, count):
+    """The `count` arrays written by _write_arrays, memory-mapped copy-on-write."""
+    arrays = []
+    with open(path, "rb") as f:
+        for _ in range(count):
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+            offset = f.tell()
+            size = int(np.prod(shape)) * dtype.itemsize
+            if size:
+                arrays.append(np.memmap(path, dtype=dtype, mode="c", offset=offset, shape=shape))
+            else:
+                arrays.append(np.zeros(shape, dtype))  # mmap can't map zero bytes
+            f.seek(offset + size)
+    return arrays
+
+
+class _State:
+    def __init__(self, user_ids, bits, interest_ids):
+        self.user_ids = user_ids  # sorted; row -> user id
+        self.bits = bits  # (rows, words) uint64
+        self.interest_ids = list(interest_ids)  # column -> interest id
+        self.columns = {interest_id: c for c, interest_id in enumerate(self.interest_ids)}
+        self.sizes = np.bitwise_count(bits).sum(axis=1, dtype=np.int32) if len(bits) else np.zeros(0, np.int32)
+
+
+class InterestBitsets(BaseRecommender):
+    def __init__(self, max_age=600, path=None):
+        super().__init__(max_age)
+        self.path = path if path is not None else getattr(settings, "RECOMMEND_BITSET_PATH", "")
+        self._state = _State(np.zeros(0, np.int64), np.zeros((0, 1), np.uint64), [])
+
+    # -- loading --------------------------------------------------------------
+
+    def _load(self):
+        if self.path and self._snapshot_age() < self.max_age:
+            try:
+                return self.load_snapshot(self.path)
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Interest bitset snapshot unreadable ({e}); loading from the database")
+        return self.load_from_db()
+
+    @staticmethod
+    def load_from_db():
+        user_ids = np.fromiter(
+            UserProfile.objects.order_by("user_id").values_list("user_id", flat=True).iterator(chunk_size=50000),
+            dtype=np.int64,
+        )
+        interest_ids = np.fromiter(Interest.objects.order_by("id").values_list("id", flat=True), dtype=np.int64)
+        words = max(1, -(-len(interest_ids) // WORD_BITS))
+        bits = np.zeros((len(user_ids), words), dtype=np.uint64)
+
+        pairs = ProfileInterest.objects.values_list("userprofile__user_id", "interest_id")
+        flat = np.fromiter(
+            (value for pair in pairs.iterator(chunk_size=50000) for value in pair), dtype=np.int64
+        ).reshape(-1, 2)
+        if len(flat):
+            rows = np.searchsorted(user_ids, flat[:, 0])
+            columns = np.searchsorted(interest_ids, flat[:, 1])
+            np.bitwise_or.at(
+                bits,
+                (rows, columns // WORD_BITS),
+                np.left_shift(np.uint64(1), (columns % WORD_BITS).astype(np.uint64)),
+            )
+        return _State(user_ids, bits, interest_ids.tolist())
+
+    def _snapshot_age(self):
+        try:
+            return time.time() - os.path.getmtime(os.path.join(self.path, SNAPSHOT_FILE))
+        except OSError:
+            return float("inf")
+
+    @staticmethod
+    def load_snapshot(path):
+        # "c": copy-on-write, so local updates never touch the file
+        user_ids, bits, interest_ids = _map_arrays(os.path.join(path, SNAPSHOT_FILE), 3)
+        return _State(user_ids, bits, interest_ids.tolist())
+
+    def save_snapshot(self, path):
+        os.makedirs(path, exist_ok=True)
+        with self._lock:
+            state = self._state
+            _write_arrays(
+                os.path.join(path, SNAPSHOT_FILE),
+                [state.user_ids, state.bits, np.asarray(state.interest_ids, dtype=np.int64)],
+            )
+
+    def _install(self, state):
+        self._state = state
+
+    # -- incremental updates ------------------------------------------------
+
+    def _row(self, user_id, create=False):
+        state = self._state
+        row = int(np.searchsorted(state.user_ids, user_id))
+        if row < len(state.user_ids) and state.user_ids[row] == user_id:
+            return row
+        if not create:
+            return None
+        # New users have the highest ids, so this is normally an append
+        state.user_ids = np.insert(state.user_ids, row, user_id)
+        state.bits = np.insert(state.bits, row, 0, axis=0)
+        state.sizes = np.insert(state.sizes, row, 0)
+        return row
+
+    def _column(self, interest_id):
+        state = self._state
+        column = state.columns.get(interest_id)
+        if column is None:
+            column = len(state.interest_ids)
+            state.interest_ids.append(interest_id)
+            state.columns[interest_id] = column
+            if column >= state.bits.shape[1] * WORD_BITS:
+                state.bits = np.hstack([state.bits, np.zeros((len(state.bits), 1), np.uint64)])
+        return column
+
+    def _set(self, user_id, interest_ids):
+        row = self._row(user_id, create=bool(interest_ids))
+        if row is None:
+            return
+        columns = [self._column(interest_id) for interest_id in interest_ids]
+        state = self._state
+        words = np.zeros(state.bits.shape[1], np.uint64)
+        for column in columns:
+            words[column // WORD_BITS] |= np.uint64(1 << (column % WORD_BITS))
+        state.bits[row] = words
+        state.sizes[row] = len(interest_ids)
+
+    def _decode(self, words):
+        state = self._state
+        return frozenset(
+            state.interest_ids[w * WORD_BITS + b]
+            for w in np.flatnonzero(words)
+            for b in range(WORD_BITS)
+            if int(words[w]) >> b & 1
+        )
+
+    def interests_of(self, user_id):
+        row = self._row(user_id)
+        return frozenset() if row is None else self._decode(self._state.bits[row])
+
+    def users_with(self, interest_id):
+        state = self._state
+        column = state.columns.get(interest_id)
+        if column is None:
+            return []
+        mask = np.uint64(1 << (column % WORD_BITS))
+        rows = np.flatnonzero(state.bits[:, column // WORD_BITS] & mask)
+        return state.user_ids[rows].tolist()
+
+    # -- queries ---------------------------------------------------------------
+
+    def scores(self, user_id):
+        """Jaccard similarity of user_id with every row (float32 array), or None."""
+        state = self._state
+        row = self._row(user_id)
+        if row is None:
+            return None
+        query = state.bits[row]
+        words = np.flatnonzero(query)
+        if not len(words):
+            return None
+        if len(words) == state.bits.shape[1]:
+            shared = np.bitwise_count(state.bits & query)
+        else:
+            shared = np.bitwise_count(state.bits[:, words] & query[words])
+        shared = shared.sum(axis=1, dtype=np.int32)
+        union = state.sizes + state.sizes[row] - shared
+        scores = shared.astype(np.float32) / np.maximum(union, 1)
+        scores[row] = 0
+        return scores
+
+    def recommend(self, user_id, k=20, exclude=()):
+        """Top k [(user_id, score, shared interest ids)], best first."""
+        self.ensure_built()
+        with self._lock:
+            state = self._state
+            scores = self.scores(user_id)
+            if scores is None:
+                return []
+            if exclude:
+                excluded = np.fromiter(exclude, dtype=np.int64)
+                rows = np.searchsorted(state.user_ids, excluded)
+                inside = rows < len(state.user_ids)
+                rows, excluded = rows[inside], excluded[inside]
+                scores[rows[state.user_ids[rows] == excluded]] = 0
+
+            k = min(k, int(np.count_nonzero(scores)))
+            if k <= 0:
+                return []
+            # Scores are ratios of small integers with lots of ties, which
+            # makes argpartition slow; bucket them instead and only sort the
+            # rows in the buckets that hold the top k
+            levels = (scores * SCORE_LEVELS).astype(np.int32)
+            from_top = np.cumsum(np.bincount(levels, minlength=SCORE_LEVELS + 1)[::-1])
+            cutoff = SCORE_LEVELS - int(np.searchsorted(from_top, k))
+            top = np.flatnonzero(levels >= cutoff)
+            top = top[np.argsort(-scores[top], kind="stable")[:k]]
+            query = state.bits[self._row(user_id)]
+            return [
+                (int(state.user_ids[r]), float(scores[r]), self._decode(state.bits[r] & query))
+                for r in top
+            ]
@@ -0,0 +1,185 @@
+"""
+Connection graph lookups without the database.
+
+For each user the cache holds (connected ids, ids with a pending request
+from them, ids with a pending request to them), loaded from Connection and
+ConnectionRequest in two queries on first use (for a whole batch of users
+at once with connections_many). are_connected() and the connection
+statuses on the discovery path are then set lookups on one cache entry.
+
+Writes are picked up through the post_save/post_delete receivers below: on
+commit both users get a new generation token, and entries are stored under
+the generation they were loaded in, so a reader that loaded before the
+commit can never overwrite the fresh state. QuerySet.update()/bulk writes
+send no signals: call connection_graph.invalidate(...) after them.
+
+Cached in CONNECTION_GRAPH_CACHE_ALIAS for CONNECTION_GRAPH_TTL seconds.
+That cache must be shared by all worker processes: when it is process-local
+and not declared shared (Mng/cache.py), every lookup reads the database
+instead.
+"""
+
+import uuid
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from Mng.cache import shared_cache
+from .models import Connection, ConnectionRequest
+
+
+class ConnectionGraph:
+    def __init__(self, alias=None, ttl=None):
+        self.cache = shared_cache(alias or getattr(settings, "CONNECTION_GRAPH_CACHE_ALIAS", "default"))
+        self.ttl = ttl or getattr(settings, "CONNECTION_GRAPH_TTL", 3600)
+
+    def _generations(self, user_ids):
+        keys = {user_id: f"graph:gen:{user_id}" for user_id in user_ids}
+        found = self.cache.get_many(keys.values())
+        missing = [user_id for user_id, key in keys.items() if key not in found]
+        for user_id in missing:
+            self.cache.add(keys[user_id], uuid.uuid4().hex, timeout=None)
+        if missing:
+            found.update(self.cache.get_many([keys[user_id] for user_id in missing]))
+        return {user_id: found.get(key) for user_id, key in keys.items()}
+
+    def _entries(self, user_ids):
+        """{user_id: entry} with one cache round trip for the whole batch (plus two queries for misses)."""
+        if self.cache is None:
+            return self._load(user_ids)
+        keys = {user_id: f"graph:{user_id}:{generation}" for user_id, generation in self._generations(user_ids).items()}
+        found = self.cache.get_many(keys.values())
+        entries = {user_id: found[key] for user_id, key in keys.items() if key in found}
+        missing = [user_id for user_id in keys if user_id not in entries]
+        if missing:
+            loaded = self._load(missing)
+            self.cache.set_many({keys[user_id]: entry for user_id, entry in loaded.items()}, timeout=self.ttl)
+            entries.update(loaded)
+        return entries
+
+    def _entry(self, user_id):
+        return self._entries([user_id])[user_id]
+
+    @staticmethod
+    def _load(user_ids):
+        connected = {user_id: set() for user_id in user_ids}
+        sent = {user_id: set() for user_id in user_ids}
+        received = {user_id: set() for user_id in user_ids}
+
+        rows = Connection.objects.filter(
+            Q(user_low_id__in=user_ids) | Q(user_high_id__in=user_ids)
+        ).values_list("user_low_id", "user_high_id")
+        for a, b in rows:
+            if a in connected:
+                connected[a].add(b)
+            if b in connected:
+                connected[b].add(a)
+
+        rows = ConnectionRequest.objects.filter(
+            Q(from_user_id__in=user_ids) | Q(to_user_id__in=user_ids), status="pending"
+        ).values_list("from_user_id", "to_user_id")
+        for from_id, to_id in rows:
+            if from_id in sent:
+                sent[from_id].add(to_id)
+            if to_id in received:
+                received[to_id].add(from_id)
+
+        return {
+            user_id: (frozenset(connected[user_id]), frozenset(sent[user_id]), frozenset(received[user_id]))
+            for user_id in user_ids
+        }
+
+    @staticmethod
+    def _load_degrees(user_ids):
+        degrees = dict.fromkeys(user_ids, 0)
+        # Grouped on each side's index: counts only, no adjacency rows
+        for side in ("user_low_id", "user_high_id"):
+            rows = (
+                Connection.objects.filter(**{f"{side}__in": user_ids})
+                .values(side).annotate(degree=Count("id")).values_list(side, "degree")
+            )
+            for user_id, degree in rows:
+                degrees[user_id] += degree
+        return degrees
+
+    def degrees(self, user_ids):
+        """{user_id: number of connections} for a batch of users, without loading their connections."""
+        if self.cache is None:
+            return self._load_degrees(user_ids)
+        keys = {user_id: f"graph:deg:{user_id}:{generation}" for user_id, generation in self._generations(user_ids).items()}
+        found = self.cache.get_many(keys.values())
+        degrees = {user_id: found[key] for user_id, key in keys.items() if key in found}
+        missing = [user_id for user_id in keys if user_id not in degrees]
+        if missing:
+            loaded = self._load_degrees(missing)
+            self.cache.set_many({keys[user_id]: degree for user_id, degree in loaded.items()}, timeout=self.ttl)
+            degrees.update(loaded)
+        return degrees
+
+    def invalidate(self, *user_ids):
+        if self.cache is None:
+            return
+        self.cache.set_many({f"graph:gen:{user_id}": uuid.uuid4().hex for user_id in user_ids}, timeout=None)
+
+    def connections(self, user_id):
+        return self._entry(user_id)[0]
+
+    def connections_many(self, user_ids):
+        """{user_id: connected ids} for a batch of users."""
+        return {user_id: entry[0] for user_id, entry in self._entries(user_ids).items()}
+
+    def sent(self, user_id):
+        """Users user_id has a pending request to."""
+        return self._entry(user_id)[1]
+
+    def received(self, user_id):
+        """Users with a pending request to user_id."""
+        return self._entry(user_id)[2]
+
+    def are_connected(self, user_id, other_id):
+        if self.cache is None:
+            return Connection.objects.between(user_id, other_id).exists()
+        return other_id in self.connections(user_id)
+
+    def statuses(self, user_id, other_ids):
+        """{other_id: "connected" | "pending" | "incoming" | "none"} as seen by user_id."""
+        connected, sent, received = self._entry(user_id)
+        statuses = {}
+        for other_id in other_ids:
+            if other_id in connected:
+                statuses[other_id] = "connected"
+            elif other_id in sent:
+                statuses[other_id] = "pending"
+            elif other_id in received:
+                statuses[other_id] = "incoming"
+            else:
+                statuses[other_id] = "none"
+        return statuses
+
+    def status(self, user_id, other_id):
+        return self.statuses(user_id, [other_id])[other_id]
+
+    def linked(self, user_id):
+        """Connected users and users with a pending request either way."""
+        connected, sent, received = self._entry(user_id)
+        return connected | sent | received
+
+
+connection_graph = ConnectionGraph()
+
+
+@receiver(post_save, sender=Connection)
+@receiver(post_delete, sender=Connection)
+def _connection_changed(sender, instance, **kwargs):
+    user_ids = (instance.user_low_id, instance.user_high_id)
+    transaction.on_commit(lambda: connection_graph.invalidate(*user_ids))
+
+
+@receiver(post_save, sender=ConnectionRequest)
+@receiver(post_delete, sender=ConnectionRequest)
+def _request_changed(sender, instance, **kwargs):
+    user_ids = (instance.from_user_id, instance.to_user_id)
+    transaction.on_commit(lambda: connection_graph.invalidate(*user_ids))
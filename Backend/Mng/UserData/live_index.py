@@ -0,0 +1,104 @@
+"""
+In-memory indexes over database rows, kept current in this process.
+
+LiveIndex is the lifecycle the recommendation engines (UserData/recommend.py)
+and the people-search trie (UserData/search.py) share: built on first use,
+rebuilt in a background thread once older than max_age, and updated
+incrementally in between. The load runs outside the lock, so readers and
+updates never wait for it; updates made while it runs are journaled and
+replayed onto the new state before it goes live.
+
+Subclasses implement _load() (read the current state, without touching the
+live one), _install(state) and _set(key, value), and pass every change
+through _update(key, value).
+"""
+
+import threading
+import time
+
+from django.db import connection
+
+
+class LiveIndex:
+    build_icon = "🧭"
+    thread_name = "live-index"
+
+    def __init__(self, max_age=600):
+        self.max_age = max_age
+        self._lock = threading.RLock()  # live state and journal; never held while loading
+        self._build_lock = threading.Lock()  # one load at a time
+        self._journal = None  # updates made while a build is loading
+        self._rebuilding = False  # a background rebuild has been started
+        self.built_at = None
+
+    def _load(self):
+        raise NotImplementedError
+
+    def _install(self, state):
+        raise NotImplementedError
+
+    def _set(self, key, value):
+        raise NotImplementedError
+
+    @property
+    def in_use(self):
+        """Built, or being built: changes have to be passed on."""
+        return self.built_at is not None or self._journal is not None
+
+    def build(self):
+        with self._build_lock:
+            self._build()
+
+    def _build(self):
+        start = time.perf_counter()
+        with self._lock:
+            self._journal = []
+        try:
+            state = self._load()
+        except Exception:
+            with self._lock:
+                self._journal = None
+            raise
+        with self._lock:
+            journal, self._journal = self._journal, None
+            self._install(state)
+            for key, value in journal:
+                self._set(key, value)
+            self.built_at = time.monotonic()
+        print(f"{self.build_icon} {type(self).__name__} built in {time.perf_counter() - start:.2f}s")
+
+    def ensure_built(self):
+        if self.built_at is None:
+            # Callers wait for the first build, updates keep being journaled
+            with self._build_lock:
+                if self.built_at is None:
+                    self._build()
+        elif time.monotonic() - self.built_at > self.max_age and self._claim_rebuild():
+            threading.Thread(target=self._rebuild, name=self.thread_name, daemon=True).start()
+
+    def _claim_rebuild(self):
+        """True for exactly one caller until that rebuild has finished."""
+        with self._lock:
+            if self._rebuilding:
+                return False
+            self._rebuilding = True
+            return True
+
+    def _rebuild(self):
+        try:
+            self.build()
+        except Exception as e:
+            print(f"❌ {type(self).__name__} rebuild failed: {e}")
+            with self._lock:
+                self.built_at = time.monotonic()  # retry after another max_age
+        finally:
+            with self._lock:
+                self._rebuilding = False
+            connection.close()
+
+    def _update(self, key, value):
+        with self._lock:
+            if self._journal is not None:
+                self._journal.append((key, value))
+            if self.built_at is not None:
+                self._set(key, value)
@@ -0,0 +1,31 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from UserData.bitsets import InterestBitsets
+
+
+class Command(BaseCommand):
+    help = (
+        "Build the interest bitset snapshot that workers memory-map (RECOMMEND_ENGINE=bitset). "
+        "Run it more often than RECOMMEND_INDEX_MAX_AGE, e.g. from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--path", default=None, help="default: RECOMMEND_BITSET_PATH")
+
+    def handle(self, *args, **options):
+        path = options["path"] or getattr(settings, "RECOMMEND_BITSET_PATH", "")
+        if not path:
+            raise CommandError("Set RECOMMEND_BITSET_PATH or pass --path")
+
+        start = time.perf_counter()
+        bitsets = InterestBitsets(path="")
+        bitsets.build()
+        bitsets.save_snapshot(path)
+        state = bitsets._state
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {len(state.user_ids)} users × {len(state.interest_ids)} interests "
+            f"({state.bits.nbytes / 1e6:.1f} MB) written to {path} in {time.perf_counter() - start:.1f}s"
+        ))
@@ -0,0 +1,96 @@
+# Generated by Django 5.2.6 on 2026-10-18 21:02
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Exists, F, OuterRef
+from django.db.models.functions import Greatest, Least
+
+
+def to_pairs(apps, schema_editor):
+    """Keep one row per friendship (the low -> high one when both exist)."""
+    Connection = apps.get_model('UserData', 'Connection')
+    mirrored = Connection.objects.filter(user_id=OuterRef('connected_user_id'), connected_user_id=OuterRef('user_id'))
+    Connection.objects.filter(Exists(mirrored), user_id__gt=F('connected_user_id')).delete()
+    Connection.objects.filter(user_id=F('connected_user_id')).delete()
+    Connection.objects.update(
+        user_low_id=Least('user_id', 'connected_user_id'),
+        user_high_id=Greatest('user_id', 'connected_user_id'),
+    )
+
+
+def from_pairs(apps, schema_editor):
+    Connection = apps.get_model('UserData', 'Connection')
+    Connection.objects.update(user_id=F('user_low_id'), connected_user_id=F('user_high_id'))
+    rows = Connection.objects.values_list('user_high_id', 'user_low_id', 'created_at')
+    Connection.objects.bulk_create(
+        (Connection(user_id=a, connected_user_id=b, created_at=created) for a, b, created in rows.iterator()),
+        batch_size=5000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('UserData', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='connection',
+            name='user_low',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='connections_low', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='connection',
+            name='user_high',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='connections_high', to=settings.AUTH_USER_MODEL),
+        ),
+        # Nullable first, so that the migration can be reversed
+        migrations.AlterField(
+            model_name='connection',
+            name='user',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='connections', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='connection',
+            name='connected_user',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='connected_to', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(to_pairs, from_pairs),
+        migrations.AlterUniqueTogether(
+            name='connection',
+            unique_together=set(),
+        ),
+        migrations.RemoveField(
+            model_name='connection',
+            name='user',
+        ),
+        migrations.RemoveField(
+            model_name='connection',
+            name='connected_user',
+        ),
+        migrations.AlterField(
+            model_name='connection',
+            name='user_low',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='connections_low', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='connection',
+            name='user_high',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='connections_high', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterUniqueTogether(
+            name='connection',
+            unique_together={('user_low', 'user_high')},
+        ),
+        migrations.AddIndex(
+            model_name='connection',
+            index=models.Index(fields=['user_high', 'user_low'], name='UserData_co_user_hi_5e84de_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='connection',
+            constraint=models.CheckConstraint(condition=models.Q(('user_low__lt', models.F('user_high'))), name='connection_low_lt_high'),
+        ),
+    ]
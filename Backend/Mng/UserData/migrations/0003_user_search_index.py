@@ -0,0 +1,44 @@
+from django.db import migrations
+
+# (app, model, column) searched by UserData/search.py
+SEARCH_COLUMNS = (('Users', 'Users', 'username'), ('Users', 'UserProfile', 'full_name'))
+
+
+def install(apps, schema_editor):
+    # pg_trgm indexes; the in-memory trie used elsewhere needs none
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for app, model, column in SEARCH_COLUMNS:
+        table = apps.get_model(app, model)._meta.db_table
+        schema_editor.execute(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{table.lower()}_{column}_prefix" '
+            f'ON "{table}" ((lower("{column}") COLLATE "C"))'
+        )
+        schema_editor.execute(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{table.lower()}_{column}_trgm" '
+            f'ON "{table}" USING gist (lower("{column}") gist_trgm_ops)'
+        )
+
+
+def uninstall(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for app, model, column in SEARCH_COLUMNS:
+        table = apps.get_model(app, model)._meta.db_table
+        for suffix in ('prefix', 'trgm'):
+            schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{table.lower()}_{column}_{suffix}"')
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('UserData', '0002_connection_single_row'),
+        ('Users', '0004_otp_phone_number_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
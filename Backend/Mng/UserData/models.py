@@ -2,21 +2,68 @@ from django.db import models
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin, Group, Permission
 
 from django.db import models
+from django.db.models import F, Q
 from django.utils import timezone
 from datetime import timedelta
 
 from Users.models import Users
 # Connections between users
+class ConnectionQuerySet(models.QuerySet):
+    def between(self, user1, user2):
+        low, high = Connection.pair(user1, user2)
+        return self.filter(user_low_id=low, user_high_id=high)
+
+    def involving(self, user):
+        """Connections of `user` (a Users instance or id), from either side."""
+        return self.filter(Q(user_low=user) | Q(user_high=user))
+
+    def connect(self, user1, user2):
+        """get_or_create for the pair, in either order; one query when it exists."""
+        low, high = Connection.pair(user1, user2)
+        return self.get_or_create(user_low_id=low, user_high_id=high)
+
+
 class Connection(models.Model):
-    user = models.ForeignKey(Users, on_delete=models.CASCADE, related_name="connections")
-    connected_user = models.ForeignKey(Users, on_delete=models.CASCADE, related_name="connected_to")
+    """
+    One row per friendship, like ChatThread: the smaller user id is always
+    stored as user_low. Use Connection.objects.connect/between/involving
+    rather than filtering on the columns directly.
+    """
+    user_low = models.ForeignKey(Users, on_delete=models.CASCADE, related_name="connections_low")
+    user_high = models.ForeignKey(Users, on_delete=models.CASCADE, related_name="connections_high")
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = ConnectionQuerySet.as_manager()
+
     class Meta:
-        unique_together = ("user", "connected_user")  # prevent duplicates
+        # The unique index answers "are a and b connected" in one probe and
+        # a user's connections from the low side; the reverse index covers
+        # the high side
+        unique_together = ("user_low", "user_high")
+        indexes = [models.Index(fields=["user_high", "user_low"])]
+        constraints = [
+            models.CheckConstraint(condition=Q(user_low__lt=F("user_high")), name="connection_low_lt_high"),
+        ]
+
+    @staticmethod
+    def pair(user1, user2):
+        """(low id, high id) for two users or user ids."""
+        a = getattr(user1, "pk", user1)
+        b = getattr(user2, "pk", user2)
+        return (a, b) if a < b else (b, a)
+
+    def other(self, user):
+        """The id of the user on the other side from `user`."""
+        user_id = getattr(user, "pk", user)
+        return self.user_high_id if user_id == self.user_low_id else self.user_low_id
+
+    def save(self, *args, **kwargs):
+        if self.user_low_id is not None and self.user_high_id is not None:
+            self.user_low_id, self.user_high_id = self.pair(self.user_low_id, self.user_high_id)
+        super().save(*args, **kwargs)
 
     def __str__(self):
-        return f"{self.user.username} ↔ {self.connected_user.username}"
+        return f"{self.user_low.username} ↔ {self.user_high.username}"
 
 
 # Connection requests
@@ -0,0 +1,234 @@
+"""
+Profile recommendations by shared interests. RECOMMEND_ENGINE selects the
+engine:
+
+- "index" (default): InterestIndex below
+- "bitset": UserData/bitsets.py, packed per-user bitsets scored against the
+  whole population with NumPy
+
+InterestIndex keeps an inverted index (interest id -> user ids) and each
+user's interest set in memory. Candidates for a user are the users sharing
+at least one interest, scored by IDF-weighted Jaccard:
+
+    sum(idf(shared)) / sum(idf(union)),  idf(i) = log(1 + N / df(i))
+
+so a shared rare interest counts for much more than a shared popular one.
+Posting lists are walked rarest first and candidate generation stops at
+RECOMMEND_MAX_CANDIDATES users; the remaining (popular) interests only add
+to candidates already found, which keeps a query bounded on a large base.
+
+Either engine is built on first use and kept current in this process by the
+m2m_changed/post_delete receivers below, so addInterest, removeInterest and
+addInterests are reflected immediately. Other worker processes catch up by
+rebuilding in a background thread once the index is older than
+RECOMMEND_INDEX_MAX_AGE seconds; updates made during a rebuild are replayed
+onto the new index.
+"""
+
+import heapq
+import math
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from Users.models import Interest, UserProfile
+from .live_index import LiveIndex
+
+ProfileInterest = UserProfile.interests.through
+
+
+class BaseRecommender(LiveIndex):
+    """
+    What the engines share on top of the LiveIndex lifecycle: interest
+    updates keyed by user id.
+
+    Engines implement _load(), _install(state), _set(user_id, interest_ids),
+    interests_of(user_id), users_with(interest_id) and recommend().
+    """
+
+    thread_name = "interest-index"
+
+    def set_interests(self, user_id, interest_ids):
+        self._update(user_id, frozenset(interest_ids))
+
+    def add(self, user_id, interest_ids):
+        with self._lock:
+            self.set_interests(user_id, self.interests_of(user_id) | set(interest_ids))
+
+    def remove(self, user_id, interest_ids):
+        with self._lock:
+            self.set_interests(user_id, self.interests_of(user_id) - set(interest_ids))
+
+    def remove_interest(self, interest_id):
+        """Drop an interest from everyone (the Interest was deleted or cleared)."""
+        with self._lock:
+            for user_id in self.users_with(interest_id):
+                self.remove(user_id, [interest_id])
+
+
+class InterestIndex(BaseRecommender):
+    def __init__(self, max_candidates=10000, max_age=600):
+        super().__init__(max_age)
+        self.max_candidates = max_candidates
+        self._users = {}  # interest id -> set of user ids
+        self._interests = {}  # user id -> frozenset of interest ids
+
+    def _load(self):
+        """Every profile's interests, in one query."""
+        interests = {}
+        rows = ProfileInterest.objects.values_list("userprofile__user_id", "interest_id")
+        for user_id, interest_id in rows.iterator(chunk_size=20000):
+            interests.setdefault(user_id, set()).add(interest_id)
+
+        users = {}
+        for user_id, ids in interests.items():
+            interests[user_id] = frozenset(ids)
+            for interest_id in ids:
+                users.setdefault(interest_id, set()).add(user_id)
+        return users, interests
+
+    def _install(self, state):
+        self._users, self._interests = state
+
+    def _set(self, user_id, interest_ids):
+        old = self._interests.get(user_id, frozenset())
+        new = frozenset(interest_ids)
+        for interest_id in old - new:
+            posting = self._users.get(interest_id)
+            if posting is not None:
+                posting.discard(user_id)
+                if not posting:
+                    del self._users[interest_id]
+        for interest_id in new - old:
+            self._users.setdefault(interest_id, set()).add(user_id)
+        if new:
+            self._interests[user_id] = new
+        else:
+            self._interests.pop(user_id, None)
+
+    def users_with(self, interest_id):
+        return list(self._users.get(interest_id, ()))
+
+    # -- queries -------------------------------------------------------------
+
+    def interests_of(self, user_id):
+        return self._interests.get(user_id, frozenset())
+
+    def recommend(self, user_id, k=20, exclude=()):
+        """
+        Top k [(user_id, score, shared interest ids)] for user_id, best first,
+        leaving out user_id itself and the ids in `exclude`.
+        """
+        self.ensure_built()
+        with self._lock:
+            users, interests = self._users, self._interests
+            mine = interests.get(user_id)
+            if not mine:
+                return []
+
+            total = len(interests)
+            idf = {}
+
+            def weight(interest_id):
+                if interest_id not in idf:
+                    idf[interest_id] = math.log(1 + total / max(1, len(users.get(interest_id, ()))))
+                return idf[interest_id]
+
+            skip = set(exclude)
+            skip.add(user_id)
+
+            # Shared weight per candidate, rarest interests first
+            shared = {}
+            for interest_id in sorted(mine, key=lambda i: len(users.get(i, ()))):
+                w = weight(interest_id)
+                posting = users.get(interest_id, ())
+                room = self.max_candidates - len(shared)
+                if len(posting) <= room:
+                    for candidate in posting:
+                        if candidate not in skip:
+                            shared[candidate] = shared.get(candidate, 0.0) + w
+                    continue
+                # Too popular to walk: credit the candidates already found,
+                # then top up from the start of the posting list
+                for candidate in shared:
+                    if interest_id in interests[candidate]:
+                        shared[candidate] += w
+                fresh = (c for c in posting if c not in shared and c not in skip)
+                for candidate in islice(fresh, room):
+                    shared[candidate] = w
+
+            my_weight = sum(weight(i) for i in mine)
+            scored = (
+                (overlap / (my_weight + sum(weight(i) for i in interests[candidate]) - overlap), candidate)
+                for candidate, overlap in shared.items()
+            )
+            best = heapq.nlargest(k, scored)
+            return [(candidate, score, mine & interests[candidate]) for score, candidate in best]
+
+
+RECOMMEND_ENGINES = {
+    "index": "UserData.recommend.InterestIndex",
+    "bitset": "UserData.bitsets.InterestBitsets",  # needs numpy
+}
+
+
+def _make_engine():
+    name = getattr(settings, "RECOMMEND_ENGINE", "index")
+    try:
+        engine = import_string(RECOMMEND_ENGINES[name])
+    except KeyError:
+        raise ValueError(f"Unknown RECOMMEND_ENGINE {name!r}, expected one of {sorted(RECOMMEND_ENGINES)}")
+    max_age = getattr(settings, "RECOMMEND_INDEX_MAX_AGE", 600)
+    if engine is InterestIndex:
+        return engine(max_candidates=getattr(settings, "RECOMMEND_MAX_CANDIDATES", 10000), max_age=max_age)
+    return engine(max_age=max_age)
+
+
+interest_index = _make_engine()
+
+
+@receiver(m2m_changed, sender=ProfileInterest)
+def _profile_interests_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+
+    if not reverse:
+        # profile.interests.add/remove/clear(...)
+        user_id = instance.user_id
+        if action == "post_add":
+            update = lambda: interest_index.add(user_id, pk_set)
+        elif action == "post_remove":
+            update = lambda: interest_index.remove(user_id, pk_set)
+        else:
+            update = lambda: interest_index.set_interests(user_id, ())
+    else:
+        # interest.user_profiles.add/remove/clear(...)
+        interest_id = instance.pk
+        if action == "post_clear":
+            update = lambda: interest_index.remove_interest(interest_id)
+        else:
+            user_ids = list(UserProfile.objects.filter(pk__in=pk_set).values_list("user_id", flat=True))
+            change = interest_index.add if action == "post_add" else interest_index.remove
+
+            def update():
+                for user_id in user_ids:
+                    change(user_id, [interest_id])
+
+    # Only once the change is committed; a rolled back add must not show up
+    transaction.on_commit(update)
+
+
+@receiver(post_delete, sender=UserProfile)
+def _profile_deleted(sender, instance, **kwargs):
+    user_id = instance.user_id
+    transaction.on_commit(lambda: interest_index.set_interests(user_id, ()))
+
+
+@receiver(post_delete, sender=Interest)
+def _interest_deleted(sender, instance, **kwargs):
+    interest_id = instance.pk
+    transaction.on_commit(lambda: interest_index.remove_interest(interest_id))
@@ -0,0 +1,314 @@
+"""
+People search over Users.username and UserProfile.full_name.
+
+PostgreSQL: pg_trgm. Prefix matches walk a btree on lower(column) in the
+"C" collation, in index order; typo-tolerant matches walk a GiST trigram index in
+distance order (<-> for usernames, <<-> word distance for full names), so
+every part of the query reads only the top rows it returns.
+Any other backend: NameTrie below, an in-memory trie of name tokens searched
+with a bounded edit distance.
+
+Ranked the same way on both: an exact match scores 1, a prefix match
+between 0.5 and 1 depending on how much of the name it covers, and a
+fuzzy match by its similarity (below an exact match of the same name).
+
+The PostgreSQL indexes are created by migration UserData 0003.
+"""
+
+import re
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from Users.models import UserProfile, Users
+from .live_index import LiveIndex
+
+USER_SEARCH_PAGE_SIZE = 20
+MAX_USER_SEARCH_PAGE_SIZE = 50
+MAX_USER_SEARCH_OFFSET = 500
+MAX_QUERY_LENGTH = 64
+MIN_TRIGRAM_QUERY = 3  # shorter queries have no useful trigrams: prefix only
+FUZZY_WEIGHT = 0.9
+
+_SEARCH_COLUMNS = ((Users, "id", "username"), (UserProfile, "user_id", "full_name"))
+
+
+def _tokens(text):
+    return re.findall(r"\w+", (text or "").casefold())
+
+
+def _parts(text):
+    # "jane_doe" is found by "jane_doe", "jane" and "doe"
+    return re.findall(r"[^\W_]+", (text or "").casefold())
+
+
+def _prefix_score(query_length, name_length):
+    return min(1.0, (1 + query_length / max(name_length, 1)) / 2)
+
+
+# -- PostgreSQL ---------------------------------------------------------------
+
+
+def _trigram_search(query, window):
+    """[(user_id, score)] from the four index walks, in one round trip."""
+    like = re.sub(r"([\\%_])", r"\\\1", query) + "%"
+    parts, params = [], []
+    for model, id_column, column in _SEARCH_COLUMNS:
+        table = model._meta.db_table
+        value = f'(lower("{column}") COLLATE "C")'
+        parts.append(
+            f'(SELECT "{id_column}", {value}, NULL::real FROM "{table}" '
+            f"WHERE {value} LIKE %s ORDER BY {value} LIMIT %s)"
+        )
+        params += [like, window]
+    if len(query) >= MIN_TRIGRAM_QUERY:
+        users, profiles = Users._meta.db_table, UserProfile._meta.db_table
+        parts.append(
+            f'(SELECT "id", lower("username"), similarity(lower("username"), %s) FROM "{users}" '
+            f'WHERE lower("username") %% %s ORDER BY lower("username") <-> %s LIMIT %s)'
+        )
+        parts.append(
+            f'(SELECT "user_id", lower("full_name"), word_similarity(%s, lower("full_name")) FROM "{profiles}" '
+            f'WHERE %s <%% lower("full_name") ORDER BY %s <<-> lower("full_name") LIMIT %s)'
+        )
+        params += [query, query, query, window] * 2
+
+    scores = {}
+    with connection.cursor() as cursor:
+        cursor.execute(" UNION ALL ".join(parts), params)
+        for user_id, name, similarity in cursor.fetchall():
+            if similarity is None:
+                score = _prefix_score(len(query), len(name))
+            else:
+                score = FUZZY_WEIGHT * similarity
+            scores[user_id] = max(score, scores.get(user_id, 0.0))
+    return list(scores.items())
+
+
+# -- In-memory fallback ---------------------------------------------------------
+
+
+class _Node:
+    __slots__ = ("children", "ids")
+
+    def __init__(self):
+        self.children = {}
+        self.ids = None  # users with a token ending here
+
+
+class NameTrie(LiveIndex):
+    """
+    Every username and full-name word, as a trie of characters. A query term
+    matches a token it is a prefix of within max_distance edits (Levenshtein,
+    one DP row per trie node, pruned as soon as no descendant can get back
+    under the bound). Built, rebuilt and kept current in this process as a
+    LiveIndex, fed by the receivers below.
+    """
+
+    build_icon = "🔎"
+    thread_name = "name-trie"
+
+    def __init__(self, max_candidates=1000, max_age=600):
+        super().__init__(max_age)
+        self.max_candidates = max_candidates
+        self._root = _Node()
+        self._tokens = {}  # user id -> tokens
+
+    @staticmethod
+    def _load():
+        root, tokens = _Node(), {}
+        rows = Users.objects.values_list("id", "username", "profile__full_name")
+        for user_id, username, full_name in rows.iterator(chunk_size=20000):
+            tokens[user_id] = NameTrie.tokens_for(username, full_name)
+            for token in tokens[user_id]:
+                NameTrie._insert(root, token, user_id)
+        return root, tokens
+
+    def _install(self, state):
+        self._root, self._tokens = state
+
+    # -- updates ---------------------------------------------------------------
+
+    @staticmethod
+    def tokens_for(username, full_name):
+        return frozenset(_tokens(username)) | frozenset(_parts(username)) | frozenset(_tokens(full_name))
+
+    @staticmethod
+    def _insert(root, token, user_id):
+        node = root
+        for char in token:
+            child = node.children.get(char)
+            if child is None:
+                child = node.children[char] = _Node()
+            node = child
+        if node.ids is None:
+            node.ids = set()
+        node.ids.add(user_id)
+
+    def _remove(self, token, user_id):
+        node = self._root
+        for char in token:
+            node = node.children.get(char)
+            if node is None:
+                return
+        if node.ids:
+            node.ids.discard(user_id)
+
+    def _set(self, user_id, tokens):
+        old = self._tokens.get(user_id, frozenset())
+        for token in old - tokens:
+            self._remove(token, user_id)
+        for token in tokens - old:
+            self._insert(self._root, token, user_id)
+        if tokens:
+            self._tokens[user_id] = tokens
+        else:
+            self._tokens.pop(user_id, None)
+
+    def set_names(self, user_id, username, full_name):
+        self.set_tokens(user_id, self.tokens_for(username, full_name))
+
+    def set_tokens(self, user_id, tokens):
+        self._update(user_id, tokens)
+
+    # -- queries ---------------------------------------------------------------
+
+    @staticmethod
+    def max_distance(term):
+        return 0 if len(term) < 3 else 1 if len(term) < 6 else 2
+
+    @staticmethod
+    def _found(found, ids, score):
+        for user_id in ids:
+            if score > found.get(user_id, 0.0):
+                found[user_id] = score
+
+    def _collect(self, node, depth, term, weight, found):
+        """
+        Ids of the tokens under node, shortest first, until max_candidates.
+        The ones ending at node itself always count.
+        """
+        level = [node]
+        while level:
+            following = []
+            for node in level:
+                if node.ids:
+                    self._found(found, node.ids, weight * _prefix_score(len(term), depth))
+                following.extend(node.children.values())
+            if len(found) >= self.max_candidates:
+                return
+            level = following
+            depth += 1
+
+    def _visit(self, node, depth, row, term, limit, found):
+        distance = row[-1]
+        weight = 1 - distance / (len(term) + 1)
+        if distance <= limit and min(row) >= distance:
+            # No token below gets closer: they all match at this distance
+            self._collect(node, depth, term, weight, found)
+            return
+        if distance <= limit and node.ids:
+            self._found(found, node.ids, weight * _prefix_score(len(term), depth))
+        for char, child in node.children.items():
+            if len(found) >= self.max_candidates:
+                return
+            next_row = [row[0] + 1]
+            for j in range(1, len(row)):
+                next_row.append(min(
+                    next_row[j - 1] + 1,
+                    row[j] + 1,
+                    row[j - 1] + (term[j - 1] != char),
+                ))
+            if min(next_row) <= limit:
+                self._visit(child, depth + 1, next_row, term, limit, found)
+
+    def match(self, term):
+        """
+        {user_id: score} for one query term. Exact and prefix matches are
+        gathered first, then one more edit at a time while there is room,
+        so the candidate cap never crowds out a closer match.
+        """
+        found = {}
+        for limit in range(self.max_distance(term) + 1):
+            self._visit(self._root, 0, list(range(len(term) + 1)), term, limit, found)
+            if len(found) >= self.max_candidates:
+                break
+        return found
+
+    def search(self, query, window):
+        """[(user_id, score)] matching every term of query, best first, at most window."""
+        self.ensure_built()
+        terms = _tokens(query)
+        if not terms:
+            return []
+        with self._lock:
+            matches = sorted((self.match(term) for term in terms), key=len)
+        # Intersect from the most selective term
+        scores = matches[0]
+        for other in matches[1:]:
+            scores = {user_id: score + other[user_id] for user_id, score in scores.items() if user_id in other}
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:window]
+        return [(user_id, score / len(terms)) for user_id, score in ranked]
+
+
+name_trie = NameTrie(
+    max_candidates=getattr(settings, "USER_SEARCH_MAX_CANDIDATES", 1000),
+    max_age=getattr(settings, "USER_SEARCH_INDEX_MAX_AGE", 600),
+)
+
+
+def search_users(query, exclude_id=None, limit=None, offset=0):
+    """
+    Ranked [(user_id, score)] page for query and whether there are more.
+    Results end at MAX_USER_SEARCH_OFFSET: past it the page is empty, and
+    the page reaching it has has_more=False.
+    """
+    limit = min(limit or USER_SEARCH_PAGE_SIZE, MAX_USER_SEARCH_PAGE_SIZE)
+    offset = max(offset, 0)
+    if offset > MAX_USER_SEARCH_OFFSET:
+        return [], False
+    query = " ".join(_tokens(query))[:MAX_QUERY_LENGTH]
+    if not query:
+        return [], False
+    window = offset + limit + 2  # one more to tell has_more, one for the caller
+
+    if connection.vendor == "postgresql":
+        rows = sorted(_trigram_search(query, window), key=lambda item: (-item[1], item[0]))
+    else:
+        rows = name_trie.search(query, window)
+
+    rows = [(user_id, round(score, 4)) for user_id, score in rows if user_id != exclude_id]
+    has_more = len(rows) > offset + limit and offset + limit <= MAX_USER_SEARCH_OFFSET
+    return rows[offset:offset + limit], has_more
+
+
+@receiver(post_save, sender=Users)
+def _user_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and "username" not in update_fields:
+        return  # e.g. last_login
+    user_id = instance.pk
+
+    def update():
+        row = Users.objects.filter(pk=user_id).values_list("username", "profile__full_name").first()
+        if row is not None:
+            name_trie.set_names(user_id, *row)
+
+    if name_trie.in_use:
+        transaction.on_commit(update)
+
+
+@receiver(post_save, sender=UserProfile)
+def _profile_saved(sender, instance, **kwargs):
+    if name_trie.in_use:
+        user_id, full_name = instance.user_id, instance.full_name
+        transaction.on_commit(lambda: name_trie.set_names(
+            user_id, Users.objects.filter(pk=user_id).values_list("username", flat=True).first(), full_name,
+        ))
+
+
+@receiver(post_delete, sender=Users)
+def _user_deleted(sender, instance, **kwargs):
+    user_id = instance.pk
+    transaction.on_commit(lambda: name_trie.set_tokens(user_id, frozenset()))
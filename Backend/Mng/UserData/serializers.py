@@ -18,8 +18,9 @@ class SimpleUserSerializer(serializers.ModelSerializer):
 
 # Serializer for Connection model
 class ConnectionSerializer(serializers.ModelSerializer):
-    user = SimpleUserSerializer(read_only=True)
-    connected_user = SimpleUserSerializer(read_only=True)
+    # Stored as one (low, high) row; exposed under the old field names
+    user = SimpleUserSerializer(source="user_low", read_only=True)
+    connected_user = SimpleUserSerializer(source="user_high", read_only=True)
 
     class Meta:
         model = Connection
@@ -0,0 +1,143 @@
+"""
+"People you may know": friends of friends ranked by mutual connections.
+
+A user's suggestions are computed from the connection graph cache
+(UserData/graph.py): the adjacency of up to FOF_MAX_NEIGHBORS of their
+connections, the ones with the fewest connections of their own, is fetched
+in one batch and every 2-hop user is counted once per mutual connection. Only the top FOF_MAX_SUGGESTIONS are kept, in the
+cache, so each user's entry has a fixed size.
+
+Hubs are bounded too: a connection with more than FOF_HUB_DEGREE
+connections of their own is not expanded (knowing the same very popular
+user says little, and walking their list is what makes the naive self-join
+slow). Degrees are looked up (and cached) first, so a hub's list is never
+fetched. Mutual counts therefore only count non-hub mutuals.
+
+When a friendship is added or removed the entries of its two users are
+dropped (their neighbourhoods changed) and, unless the other side is a hub,
+every cached entry of their connections is adjusted in place, so the new
+2-hop pair shows up without recomputing anyone. In-place updates of a full
+entry can miss a candidate that was cut off earlier; entries are recomputed
+after FOF_TTL seconds regardless.
+
+All of this needs the cache to be shared by the worker processes. When it is
+process-local and not declared shared (Mng/cache.py), the in-place updates
+could only reach this process's entries: each entry is then keyed by a
+fingerprint of the user's current connections, read from the database, and
+kept for at most FOF_LOCAL_TTL seconds, which bounds how long a 2-hop change
+goes unseen.
+"""
+
+import hashlib
+import heapq
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from Mng.cache import shared_cache
+from .graph import connection_graph
+from .models import Connection
+
+
+class FriendSuggestions:
+    def __init__(self, graph, alias=None):
+        self.graph = graph
+        alias = alias or getattr(settings, "CONNECTION_GRAPH_CACHE_ALIAS", "default")
+        self.cache = shared_cache(alias)
+        self.ttl = getattr(settings, "FOF_TTL", 86400)
+        self.local = self.cache is None
+        if self.local:
+            self.cache = caches[alias]
+            self.ttl = min(self.ttl, getattr(settings, "FOF_LOCAL_TTL", 60))
+        self.max_suggestions = getattr(settings, "FOF_MAX_SUGGESTIONS", 100)
+        self.max_neighbors = getattr(settings, "FOF_MAX_NEIGHBORS", 500)
+        self.hub_degree = getattr(settings, "FOF_HUB_DEGREE", 1000)
+
+    def _key(self, user_id, neighbors=None):
+        if not self.local:
+            return f"fof:{user_id}"
+        fingerprint = hashlib.blake2b(",".join(map(str, sorted(neighbors))).encode(), digest_size=8).hexdigest()
+        return f"fof:{user_id}:{fingerprint}"
+
+    def compute(self, user_id, neighbors=None):
+        """[(candidate id, mutual count)], best first, at most max_suggestions."""
+        if neighbors is None:
+            neighbors = self.graph.connections(user_id)
+        degrees = self.graph.degrees(neighbors)
+        expand = heapq.nsmallest(
+            self.max_neighbors,
+            (friend for friend in neighbors if degrees[friend] <= self.hub_degree),
+            key=lambda friend: (degrees[friend], friend),
+        )
+        counts = Counter()
+        for friends_of_friend in self.graph.connections_many(expand).values():
+            counts.update(friends_of_friend)
+        counts.pop(user_id, None)
+        for friend in neighbors:
+            counts.pop(friend, None)
+        return heapq.nlargest(self.max_suggestions, counts.items(), key=lambda item: (item[1], -item[0]))
+
+    def get(self, user_id):
+        neighbors = self.graph.connections(user_id) if self.local else None
+        key = self._key(user_id, neighbors)
+        entry = self.cache.get(key)
+        if entry is None:
+            entry = self.compute(user_id, neighbors)
+            self.cache.set(key, entry, timeout=self.ttl)
+        return entry
+
+    def suggest(self, user_id, k=20):
+        """Top k [(user_id, mutual count)], leaving out connected and pending users."""
+        linked = self.graph.linked(user_id)
+        return [(candidate, mutual) for candidate, mutual in self.get(user_id) if candidate not in linked][:k]
+
+    def connection_changed(self, a, b, delta):
+        """a and b became connected (delta=1) or stopped being connected (delta=-1)."""
+        if self.local:
+            return  # entries are keyed by the users' connections and expire soon
+        self.cache.delete_many([self._key(a), self._key(b)])
+        for middle, other in ((a, b), (b, a)):
+            friends = self.graph.connections(middle) - {other}
+            if len(friends) + 1 > self.hub_degree:
+                continue  # hubs are never expanded, so they add no mutual counts
+            keys = {self._key(friend): friend for friend in friends}
+            updated = {}
+            for key, entry in self.cache.get_many(keys.keys()).items():
+                updated[key] = self._adjust(entry, other, delta)
+            if updated:
+                self.cache.set_many(updated, timeout=self.ttl)
+
+    def _adjust(self, entry, candidate, delta):
+        counts = dict(entry)
+        count = counts.get(candidate, 0) + delta
+        if count <= 0:
+            counts.pop(candidate, None)
+        elif candidate in counts or len(counts) < self.max_suggestions:
+            counts[candidate] = count
+        else:
+            # Full: only replaces the weakest entry if it now beats it
+            weakest = min(counts, key=lambda c: (counts[c], -c))
+            if count > counts[weakest]:
+                del counts[weakest]
+                counts[candidate] = count
+        return sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+
+
+friend_suggestions = FriendSuggestions(connection_graph)
+
+
+@receiver(post_save, sender=Connection)
+def _connection_saved(sender, instance, created, **kwargs):
+    if created:
+        a, b = instance.user_low_id, instance.user_high_id
+        transaction.on_commit(lambda: friend_suggestions.connection_changed(a, b, 1))
+
+
+@receiver(post_delete, sender=Connection)
+def _connection_deleted(sender, instance, **kwargs):
+    a, b = instance.user_low_id, instance.user_high_id
+    transaction.on_commit(lambda: friend_suggestions.connection_changed(a, b, -1))
@@ -1,3 +1,349 @@
-from django.test import TestCase
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import date
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from Chat.models import ChatThread
+from Users.models import Interest, UserProfile, Users
+from .bitsets import SNAPSHOT_FILE, InterestBitsets
+from .graph import ConnectionGraph
+from .models import Connection, ConnectionRequest
+from .recommend import InterestIndex
+from .search import NameTrie, search_users
+from .suggest import FriendSuggestions, friend_suggestions
+
+
+def make_user(n, username=None):
+    return Users.objects.create_user(phone_number=f"+1000000{n:04d}", username=username or f"user{n}", password="pw")
+
+
+def make_profile(user, interests=()):
+    profile = UserProfile.objects.create(user=user, full_name=user.username, gender="other", birthdate=date(2000, 1, 1))
+    profile.interests.add(*interests)
+    return profile
+
+
+def token_for(user):
+    return str(RefreshToken.for_user(user).access_token)
+
+
+class GetProfilesTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.me = make_user(0)
+        self.others = [make_user(n) for n in range(1, 6)]
+        with self.captureOnCommitCallbacks(execute=True):
+            Connection.objects.connect(self.me, self.others[0])
+        ChatThread.objects.create(user_low=self.me, user_high=self.others[1])
+        self.client = APIClient()
+
+    def post(self, **body):
+        return self.client.post("/getProfiles", {"access_token": token_for(self.me), **body}, format="json")
+
+    def test_without_paging_params_returns_plain_list(self):
+        response = self.post()
+        self.assertEqual(response.status_code, 200)
+        self.assertIsInstance(response.data, list)
+        self.assertEqual([u["id"] for u in response.data], [u.id for u in self.others])
+        by_id = {u["id"]: u for u in response.data}
+        self.assertEqual(by_id[self.others[0].id]["connection_status"], "connected")
+        self.assertEqual(by_id[self.others[1].id]["thread_id"], ChatThread.objects.get().id)
+        self.assertIsNone(by_id[self.others[2].id]["thread_id"])
+
+    def test_plain_list_is_capped(self):
+        with mock.patch("UserData.views.MAX_PROFILE_PAGE_SIZE", 3), mock.patch("UserData.utils.MAX_PROFILE_PAGE_SIZE", 3):
+            response = self.post()
+        self.assertEqual([u["id"] for u in response.data], [u.id for u in self.others[:3]])
+
+    def test_pages_follow_after_id(self):
+        seen, after_id = [], None
+        while True:
+            response = self.post(limit=2, after_id=after_id)
+            seen += [u["id"] for u in response.data["results"]]
+            after_id = response.data["after_id"]
+            if not response.data["has_more"]:
+                break
+        self.assertEqual(seen, [u.id for u in self.others])
+
+
+class InterestIndexTests(TestCase):
+    def setUp(self):
+        self.common, self.rare, self.other = (Interest.objects.create(name=n) for n in ("music", "falconry", "chess"))
+        self.users = [make_user(n) for n in range(4)]
+        make_profile(self.users[0], [self.common, self.rare])
+        make_profile(self.users[1], [self.common])
+        make_profile(self.users[2], [self.common, self.rare])
+        make_profile(self.users[3], [self.other])
+        self.index = InterestIndex(max_age=600)
+
+    def test_rare_shared_interest_ranks_first(self):
+        matches = self.index.recommend(self.users[0].id)
+        self.assertEqual([m[0] for m in matches], [self.users[2].id, self.users[1].id])
+        self.assertEqual(matches[0][2], {self.common.id, self.rare.id})
+        self.assertEqual(self.index.recommend(self.users[0].id, exclude=[self.users[2].id])[0][0], self.users[1].id)
+
+    def test_updates_during_load_are_not_blocked_and_are_replayed(self):
+        load = self.index._load
+        finished = []
+
+        def load_with_concurrent_update():
+            state = load()
+            # Another thread updating while the load runs must not wait for it
+            writer = threading.Thread(target=lambda: finished.append(self.index.set_interests(self.users[3].id, [self.rare.id])))
+            writer.start()
+            writer.join(2)
+            return state
+
+        with mock.patch.object(self.index, "_load", side_effect=load_with_concurrent_update):
+            self.index.ensure_built()
+        self.assertEqual(finished, [None])
+        self.assertEqual(self.index.interests_of(self.users[3].id), {self.rare.id})
+
+    def test_stale_index_starts_one_rebuild(self):
+        self.index.ensure_built()
+        self.index.built_at = time.monotonic() - 601
+        started = []
+        with mock.patch("UserData.live_index.threading.Thread") as thread:
+            thread.return_value.start.side_effect = lambda: started.append(1)
+            for _ in range(3):
+                self.index.ensure_built()
+        self.assertEqual(started, [1])
+        self.assertIsNone(self.index._journal)
+
+
+class ConnectionGraphTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.a, self.b, self.c = (make_user(n) for n in range(3))
+
+    def check_statuses(self, graph):
+        self.assertEqual(graph.status(self.a.id, self.b.id), "none")
+        with self.captureOnCommitCallbacks(execute=True):
+            Connection.objects.connect(self.b, self.a)
+            ConnectionRequest.objects.create(from_user=self.a, to_user=self.c)
+        self.assertTrue(graph.are_connected(self.a.id, self.b.id))
+        self.assertEqual(graph.statuses(self.a.id, [self.b.id, self.c.id]), {self.b.id: "connected", self.c.id: "pending"})
+        self.assertEqual(graph.status(self.c.id, self.a.id), "incoming")
+        self.assertEqual(graph.linked(self.a.id), {self.b.id, self.c.id})
+
+    def test_cached_entries_follow_writes(self):
+        graph = ConnectionGraph()
+        self.assertIsNotNone(graph.cache)
+        self.check_statuses(graph)
+
+    @override_settings(SHARED_CACHE_ALIASES=[])
+    def test_undeclared_process_local_cache_reads_database(self):
+        graph = ConnectionGraph()
+        self.assertIsNone(graph.cache)
+        self.check_statuses(graph)
+        # A write this process never heard about is still seen
+        Connection.objects.between(self.a, self.b).delete()
+        self.assertFalse(graph.are_connected(self.a.id, self.b.id))
+        self.assertEqual(graph.connections(self.a.id), set())
+
+
+class FriendSuggestionsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.u = [make_user(n) for n in range(6)]
+        with self.captureOnCommitCallbacks(execute=True):
+            for a, b in ((0, 1), (0, 2), (1, 3), (2, 3), (2, 4)):
+                Connection.objects.connect(self.u[a], self.u[b])
+
+    def ids(self, pairs):
+        """[(candidate, mutual)] with candidates as indexes into self.u."""
+        index = {user.id: n for n, user in enumerate(self.u)}
+        return [(index[user_id], mutual) for user_id, mutual in pairs]
+
+    def test_ranked_by_mutual_connections(self):
+        self.assertEqual(self.ids(friend_suggestions.suggest(self.u[0].id)), [(3, 2), (4, 1)])
+
+    def test_new_connection_adjusts_cached_entries(self):
+        friend_suggestions.get(self.u[0].id)
+        with self.captureOnCommitCallbacks(execute=True):
+            Connection.objects.connect(self.u[1], self.u[4])
+        with mock.patch.object(friend_suggestions, "compute") as compute:
+            self.assertEqual(self.ids(friend_suggestions.get(self.u[0].id)), [(3, 2), (4, 2)])
+        compute.assert_not_called()
+
+    def test_pending_requests_are_left_out(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            ConnectionRequest.objects.create(from_user=self.u[0], to_user=self.u[3])
+        self.assertEqual(self.ids(friend_suggestions.suggest(self.u[0].id)), [(4, 1)])
+
+    def test_hubs_are_not_fetched_and_quiet_connections_go_first(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Connection.objects.connect(self.u[1], self.u[4])
+            Connection.objects.connect(self.u[1], self.u[5])
+        # u1 now has 4 connections, u2 has 3
+        graph = ConnectionGraph()
+        for overrides in ({"FOF_HUB_DEGREE": 3}, {"FOF_MAX_NEIGHBORS": 1}):
+            with override_settings(**overrides):
+                suggestions = FriendSuggestions(graph)
+            with mock.patch.object(graph, "connections_many", wraps=graph.connections_many) as fetch:
+                self.assertEqual(self.ids(suggestions.compute(self.u[0].id)), [(3, 1), (4, 1)])
+            fetch.assert_called_once_with([self.u[2].id])
+
+    @override_settings(SHARED_CACHE_ALIASES=[], FOF_LOCAL_TTL=5)
+    def test_process_local_cache_keys_entries_by_connections(self):
+        suggestions = FriendSuggestions(ConnectionGraph())
+        self.assertTrue(suggestions.local)
+        self.assertEqual(suggestions.ttl, 5)
+        self.assertEqual(self.ids(suggestions.get(self.u[0].id)), [(3, 2), (4, 1)])
+        # Another process connects 0 and 3; nothing here is invalidated
+        Connection.objects.bulk_create([Connection(user_low=self.u[0], user_high=self.u[3])])
+        self.assertEqual(self.ids(suggestions.get(self.u[0].id)), [(4, 1)])
+
+
+class NameTrieTests(TestCase):
+    def setUp(self):
+        self.trie = NameTrie()
+        patcher = mock.patch("UserData.search.name_trie", self.trie)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.jane = make_profile(make_user(1, "jane_doe")).user
+        self.john = make_profile(make_user(2, "johnny")).user
+        UserProfile.objects.filter(user=self.john).update(full_name="John Smith")
+
+    def ids(self, query, window=10):
+        return [user_id for user_id, _ in self.trie.search(query, window)]
+
+    def test_exact_prefix_and_typo(self):
+        self.assertEqual(self.ids("jane_doe"), [self.jane.id])
+        self.assertEqual(self.ids("doe"), [self.jane.id])
+        self.assertEqual(self.ids("smi"), [self.john.id])
+        self.assertEqual(self.ids("smiht"), [self.john.id])
+        self.assertEqual(self.ids("jo"), [self.john.id])
+
+    def test_every_term_must_match(self):
+        self.assertEqual(self.ids("john smith"), [self.john.id])
+        self.assertEqual(self.ids("john doe"), [])
+
+    def test_exact_match_ranks_above_prefix(self):
+        jan = make_profile(make_user(3, "jan")).user
+        self.assertEqual(self.ids("jan")[:2], [jan.id, self.jane.id])
+
+    def test_renames_are_picked_up(self):
+        self.trie.ensure_built()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.jane.username = "mary"
+            self.jane.save()
+        self.assertEqual(self.ids("mary"), [self.jane.id])
+        self.assertEqual(self.ids("doe"), [])
+
+
+class SearchUsersPagingTests(TestCase):
+    def setUp(self):
+        self.trie = NameTrie()
+        patcher = mock.patch("UserData.search.name_trie", self.trie)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.users = [make_user(n, f"alex{n}") for n in range(12)]
+
+    def test_following_has_more_ends(self):
+        seen, offset = [], 0
+        with mock.patch("UserData.search.MAX_USER_SEARCH_OFFSET", 5):
+            for _ in range(20):
+                rows, has_more = search_users("alex", limit=2, offset=offset)
+                seen += rows
+                if not has_more:
+                    break
+                offset += 2
+            else:
+                self.fail("has_more never became False")
+            self.assertEqual(search_users("alex", limit=2, offset=6), ([], False))
+        self.assertEqual(len(seen), 6)
+        self.assertEqual(len({user_id for user_id, _ in seen}), 6)
+
+
+class ConnectionStorageTests(TestCase):
+    def setUp(self):
+        self.a, self.b, self.c = (make_user(n) for n in range(3))
+
+    def test_one_row_whatever_the_order(self):
+        connection, created = Connection.objects.connect(self.b, self.a)
+        self.assertTrue(created)
+        self.assertEqual((connection.user_low_id, connection.user_high_id), (self.a.id, self.b.id))
+        again, created = Connection.objects.connect(self.a.id, self.b.id)
+        self.assertFalse(created)
+        self.assertEqual(again.pk, connection.pk)
+        self.assertEqual(Connection.objects.count(), 1)
+
+    def test_between_and_involving_from_either_side(self):
+        Connection.objects.connect(self.a, self.b)
+        Connection.objects.connect(self.c, self.b)
+        self.assertTrue(Connection.objects.between(self.b, self.a).exists())
+        self.assertFalse(Connection.objects.between(self.a, self.c).exists())
+        self.assertEqual(
+            {c.other(self.b) for c in Connection.objects.involving(self.b)}, {self.a.id, self.c.id}
+        )
+
+    def test_save_normalizes_and_rejects_self_connections(self):
+        connection = Connection.objects.create(user_low=self.c, user_high=self.a)
+        self.assertEqual((connection.user_low_id, connection.user_high_id), (self.a.id, self.c.id))
+        with transaction.atomic(), self.assertRaises(IntegrityError):
+            Connection.objects.create(user_low=self.a, user_high=self.a)
+
+
+class InterestBitsetsTests(TestCase):
+    def setUp(self):
+        rng = random.Random(7)
+        self.interests = Interest.objects.bulk_create([Interest(name=f"interest {i}") for i in range(70)])
+        self.users = [make_user(n) for n in range(12)]
+        self.chosen = {}
+        for user in self.users:
+            picked = rng.sample(self.interests, rng.randint(0, 8))
+            make_profile(user, picked)
+            self.chosen[user.id] = {i.id for i in picked}
+        self.bitsets = InterestBitsets(path="")
+
+    def jaccard(self, a, b):
+        mine, theirs = self.chosen[a], self.chosen[b]
+        return len(mine & theirs) / len(mine | theirs) if mine | theirs else 0.0
+
+    def test_recommend_matches_set_jaccard(self):
+        for user in self.users:
+            expected = sorted(
+                ((self.jaccard(user.id, other.id), other.id) for other in self.users if other != user),
+                reverse=True,
+            )
+            expected = [(other_id, score) for score, other_id in expected if score > 0]
+            got = self.bitsets.recommend(user.id, k=len(self.users))
+            self.assertEqual(sorted(other_id for other_id, _, _ in got), sorted(other_id for other_id, _ in expected))
+            for other_id, score, shared in got:
+                self.assertAlmostEqual(score, self.jaccard(user.id, other_id), places=5)
+                self.assertEqual(shared, self.chosen[user.id] & self.chosen[other_id])
+            scores = [score for _, score, _ in got]
+            self.assertEqual(scores, sorted(scores, reverse=True))
+
+    def test_exclude_and_updates(self):
+        me, other = self.users[0].id, self.users[1].id
+        self.bitsets.ensure_built()
+        new = Interest.objects.create(name="interest 70")  # a 71st column, past the first two words
+        self.bitsets.set_interests(me, {new.id})
+        self.bitsets.set_interests(other, {new.id, self.interests[0].id})
+        self.assertEqual(self.bitsets.interests_of(other), {new.id, self.interests[0].id})
+        self.assertEqual(self.bitsets.users_with(new.id), sorted([me, other]))
+        self.assertEqual(self.bitsets.recommend(me), [(other, 0.5, frozenset({new.id}))])
+        self.assertEqual(self.bitsets.recommend(me, exclude=[other]), [])
+
+    def test_snapshot_round_trip(self):
+        self.bitsets.ensure_built()
+        path = tempfile.mkdtemp()
+        self.bitsets.save_snapshot(path)
+        self.bitsets.save_snapshot(path)  # replaces the file, leaves nothing else behind
+        self.assertEqual(os.listdir(path), [SNAPSHOT_FILE])
+        loaded = InterestBitsets(path=path)
+        with self.assertNumQueries(0):
+            loaded.ensure_built()
+        for user in self.users:
+            self.assertEqual(loaded.interests_of(user.id), self.chosen[user.id])
@@ -0,0 +1,46 @@
+from django.db.models import Q
+
+from Chat.models import ChatThread
+from Chat.utils import _positive_int
+from .graph import connection_graph
+
+PROFILE_PAGE_SIZE = 20
+MAX_PROFILE_PAGE_SIZE = 100
+
+
+def page_profiles(queryset, after_id=None, limit=None):
+    """
+    Keyset page over a Users queryset in id order: users with id > after_id.
+    Only limit + 1 rows are fetched, so every page costs the same however
+    deep the client has scrolled. Returns (rows, has_more).
+    """
+    limit = min(_positive_int(limit) or PROFILE_PAGE_SIZE, MAX_PROFILE_PAGE_SIZE)
+    after_id = _positive_int(after_id)
+    if after_id is not None:
+        queryset = queryset.filter(id__gt=after_id)
+    rows = list(queryset.order_by("id")[:limit + 1])
+    return rows[:limit], len(rows) > limit
+
+
+def get_thread_ids(user, other_ids):
+    """{other_id: thread_id} for the users in other_ids that have a thread with `user`. One query."""
+    other_ids = set(other_ids)
+    if not other_ids:
+        return {}
+    rows = ChatThread.objects.filter(
+        Q(user_low=user, user_high__in=other_ids) | Q(user_high=user, user_low__in=other_ids)
+    ).values_list("id", "user_low_id", "user_high_id")
+    return {(high if low == user.id else low): thread_id for thread_id, low, high in rows}
+
+
+def get_connection_statuses(user, other_ids):
+    """
+    {other_id: "connected" | "pending" | "incoming" | "none"} as seen by
+    `user`, from the connection graph cache (UserData/graph.py).
+    """
+    return connection_graph.statuses(user.id, other_ids)
+
+
+def get_linked_user_ids(user):
+    """Ids of users connected to `user` or with a pending request either way."""
+    return connection_graph.linked(user.id)
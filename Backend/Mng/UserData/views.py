@@ -9,21 +9,23 @@ from .models import *
 from Users.serializers import *
 import jwt
 import datetime
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from Users.auth import get_user_from_token
+from Chat.utils import _positive_int
+from Users.utils import get_user_cards
+from .graph import connection_graph
+from .recommend import interest_index
+from .search import search_users
+from .suggest import friend_suggestions
+from .utils import (
+    MAX_PROFILE_PAGE_SIZE, PROFILE_PAGE_SIZE,
+    get_connection_statuses, get_linked_user_ids, get_thread_ids, page_profiles,
+)
 from .driveUpload import upload_to_drive
 import io
 from googleapiclient.http import MediaIoBaseUpload
 from .serializers import * 
 from .models import *
 
-def get_user_from_token(token):
-    
-    print("11111111111")
-    jwt_auth = JWTAuthentication()
-    validated_token = jwt_auth.get_validated_token(token)  # Validate and decode
-    user = jwt_auth.get_user(validated_token)  # Get user instance
-    return user
-
 
 @api_view(['POST'])
 def profilePhoto(request):
@@ -209,16 +211,146 @@ def removeInterest(request):
 
 @api_view(["POST"])
 def getProfiles(request):
+    """
+    Other users for discovery, in id order.
+
+    Body: access_token, and optionally after_id (the previous page's
+    after_id) and limit. With either, the response is one page:
+    {count, has_more, after_id, results}. Without them it is a plain list,
+    as before pagination, of the first MAX_PROFILE_PAGE_SIZE users: clients
+    that need more must page.
+    """
+    access_token = request.data.get("access_token")
+    user = get_user_from_token(access_token)
+    if not user:
+        return Response({"error": "Invalid token"}, status=status.HTTP_401_UNAUTHORIZED)
+
+    queryset = Users.objects.exclude(id=user.id).only("id", "username", "email")
+    paginated = "after_id" in request.data or "limit" in request.data
+    if paginated:
+        users, has_more = page_profiles(
+            queryset,
+            after_id=request.data.get("after_id"),
+            limit=request.data.get("limit"),
+        )
+    else:
+        users, _ = page_profiles(queryset, limit=MAX_PROFILE_PAGE_SIZE)
+
+    # Thread ids and connection statuses for all listed users at once
+    user_ids = [u.id for u in users]
+    context = {
+        "current_user": user,
+        "thread_ids": get_thread_ids(user, user_ids),
+        "connection_statuses": get_connection_statuses(user, user_ids),
+    }
+    results = UserListSerializer(users, many=True, context=context).data
+    if not paginated:
+        return Response(results, status=status.HTTP_200_OK)
+    return Response({
+        "count": len(users),
+        "has_more": has_more,
+        "after_id": user_ids[-1] if user_ids else None,
+        "results": results,
+    }, status=status.HTTP_200_OK)
+
+
+@api_view(["POST"])
+def recommendProfiles(request):
+    """
+    Users ranked by shared interests (see UserData/recommend.py), leaving
+    out the caller's connections and pending requests.
+
+    Body: access_token, limit (default 20, max 100)
+    """
     access_token = request.data.get("access_token")
     user = get_user_from_token(access_token)
     if not user:
         return Response({"error": "Invalid token"}, status=status.HTTP_401_UNAUTHORIZED)
 
-    users = Users.objects.exclude(id=user.id)
-    result = [UserListSerializer(u, context={"current_user": user}).data for u in users]
-    return Response(result, status=status.HTTP_200_OK)
+    limit = min(_positive_int(request.data.get("limit")) or PROFILE_PAGE_SIZE, MAX_PROFILE_PAGE_SIZE)
+    matches = interest_index.recommend(user.id, k=limit, exclude=get_linked_user_ids(user))
+
+    cards = get_user_cards(user_id for user_id, _, _ in matches)
+    names = dict(Interest.objects.filter(
+        id__in={i for _, _, shared in matches for i in shared}
+    ).values_list("id", "name"))
+
+    results = []
+    for user_id, score, shared in matches:
+        if user_id not in cards:
+            continue
+        results.append({
+            **cards[user_id],
+            "score": round(score, 4),
+            "shared_interests": sorted(names[i] for i in shared if i in names),
+        })
+    return Response({"count": len(results), "results": results}, status=status.HTTP_200_OK)
+
+
+@api_view(["POST"])
+def suggestProfiles(request):
+    """
+    People you may know: friends of the caller's connections, ranked by
+    mutual connections (see UserData/suggest.py).
+
+    Body: access_token, limit (default 20, max 100)
+    """
+    access_token = request.data.get("access_token")
+    user = get_user_from_token(access_token)
+    if not user:
+        return Response({"error": "Invalid token"}, status=status.HTTP_401_UNAUTHORIZED)
+
+    limit = min(_positive_int(request.data.get("limit")) or PROFILE_PAGE_SIZE, MAX_PROFILE_PAGE_SIZE)
+    suggestions = friend_suggestions.suggest(user.id, k=limit)
+    cards = get_user_cards(user_id for user_id, _ in suggestions)
+
+    results = [
+        {**cards[user_id], "mutual_connections": mutual}
+        for user_id, mutual in suggestions
+        if user_id in cards
+    ]
+    return Response({"count": len(results), "results": results}, status=status.HTTP_200_OK)
     
 
+@api_view(["POST"])
+def searchProfiles(request):
+    """
+    People search by username and full name, typo tolerant and ranked
+    (see UserData/search.py).
+
+    Body: access_token, q, limit (default 20, max 50), offset (at most 500;
+    further pages are empty)
+    """
+    access_token = request.data.get("access_token")
+    user = get_user_from_token(access_token)
+    if not user:
+        return Response({"error": "Invalid token"}, status=status.HTTP_401_UNAUTHORIZED)
+
+    query = (request.data.get("q") or "").strip()
+    if not query:
+        return Response({"error": "Search text required"}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        limit = int(request.data.get("limit") or 0)
+        offset = int(request.data.get("offset") or 0)
+    except (TypeError, ValueError):
+        return Response({"error": "limit and offset must be integers"}, status=status.HTTP_400_BAD_REQUEST)
+
+    matches, has_more = search_users(query, exclude_id=user.id, limit=limit, offset=offset)
+    cards = get_user_cards(user_id for user_id, _ in matches)
+    statuses = get_connection_statuses(user, [user_id for user_id, _ in matches])
+
+    results = [
+        {**cards[user_id], "score": score, "connection_status": statuses[user_id]}
+        for user_id, score in matches
+        if user_id in cards
+    ]
+    return Response({
+        "query": query,
+        "has_more": has_more,
+        "results": results,
+    }, status=status.HTTP_200_OK)
+
 @api_view(["POST"])
 def connect(request):
     access_token = request.data.get("access_token")
@@ -245,19 +377,19 @@ def connect(request):
         return Response({"error": "You cannot connect with yourself"}, status=status.HTTP_400_BAD_REQUEST)
 
     # ✅ Check if connection already exists
-    if Connection.objects.filter(user=user, connected_user=target_user).exists() or \
-       Connection.objects.filter(user=target_user, connected_user=user).exists():
+    if connection_graph.are_connected(user.id, target_user.id):
         return Response({"message": "Already connected"}, status=status.HTTP_200_OK)
 
     # ✅ Check if target already sent a request → Accept it
-    existing_request = ConnectionRequest.objects.filter(from_user=target_user, to_user=user, status="pending").first()
+    existing_request = None
+    if target_user.id in connection_graph.received(user.id):
+        existing_request = ConnectionRequest.objects.filter(from_user=target_user, to_user=user, status="pending").first()
     if existing_request:
         existing_request.status = "accepted"
         existing_request.save()
 
         # Create mutual connection
-        Connection.objects.get_or_create(user=user, connected_user=target_user)
-        Connection.objects.get_or_create(user=target_user, connected_user=user)
+        Connection.objects.connect(user, target_user)
 
         return Response({"message": "Connection accepted"}, status=status.HTTP_200_OK)
 
@@ -309,8 +441,7 @@ def accept(request):
     conn_request.save()
 
     # ✅ create mutual connection
-    Connection.objects.get_or_create(user=user, connected_user=from_user)
-    Connection.objects.get_or_create(user=from_user, connected_user=user)
+    Connection.objects.connect(user, from_user)
 
     from Chat.utils import get_or_create_thread
     get_or_create_thread(conn_request.from_user, conn_request.to_user)
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'Users'
+
+    def ready(self):
+        # Connects the signals that drop cached tokens of edited users and
+        # reload the interest names
+        from . import auth, interests  # noqa: F401
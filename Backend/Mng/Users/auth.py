@@ -0,0 +1,145 @@
+"""
+Access token -> user resolution shared by every app.
+
+simplejwt's JWTAuthentication checks the signature and SELECTs the user on
+every call. Here recently seen tokens are kept in a bounded LRU for
+AUTH_TOKEN_CACHE_TTL seconds (never past the token's own exp), so a client
+repeating its token costs a dict lookup: no decode, no signature check, no
+query.
+
+The raw token string is the cache key, so a hit needs no decoding; entries
+are also indexed by user id. Saving or deleting a Users row (deactivation,
+edits, password changes) drops every cached token of that user in this
+process. QuerySet.update() sends no signals: call token_users.invalidate_user()
+after bulk updates. Other worker processes catch up within the TTL.
+
+On a hit the user is rebuilt from USER_FIELDS as a Users instance with the
+other fields deferred (reading e.g. user.password loads it from the DB).
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from .models import Users
+
+# Kept per cached token; the password hash is deliberately not among them
+USER_FIELDS = (
+    "id", "phone_number", "username", "email",
+    "is_active", "is_staff", "is_superuser", "created_at", "last_login",
+)
+# Model.from_db() takes values in concrete field order
+_LOADED_FIELDS = [f.attname for f in Users._meta.concrete_fields if f.attname in USER_FIELDS]
+
+
+class TokenUserCache:
+    """Thread-safe LRU of raw token -> (validated token, user fields) with a TTL."""
+
+    def __init__(self, maxsize=10000, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # raw token -> (expires_at, user_id, validated_token, values)
+        self._by_user = {}  # user id -> set of raw tokens
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, raw_token):
+        """(user, validated_token) for a cached token, else None."""
+        with self._lock:
+            entry = self._entries.get(raw_token)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, user_id, validated_token, values = entry
+            if expires_at <= time.time():
+                self._remove(raw_token)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(raw_token)
+            self.hits += 1
+
+        user = Users.from_db(DEFAULT_DB_ALIAS, _LOADED_FIELDS, [values[f] for f in _LOADED_FIELDS])
+        return user, validated_token
+
+    def put(self, raw_token, validated_token, user):
+        expires_at = min(time.time() + self.ttl, validated_token.get("exp", float("inf")))
+        values = {f: getattr(user, f) for f in USER_FIELDS}
+        with self._lock:
+            if raw_token in self._entries:
+                self._remove(raw_token)
+            self._entries[raw_token] = (expires_at, user.id, validated_token, values)
+            self._by_user.setdefault(user.id, set()).add(raw_token)
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            for raw_token in self._by_user.pop(user_id, ()):
+                self._entries.pop(raw_token, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+
+    def _remove(self, raw_token):
+        _, user_id, _, _ = self._entries.pop(raw_token)
+        tokens = self._by_user.get(user_id)
+        if tokens is not None:
+            tokens.discard(raw_token)
+            if not tokens:
+                del self._by_user[user_id]
+
+
+token_users = TokenUserCache(
+    maxsize=getattr(settings, "AUTH_TOKEN_CACHE_SIZE", 10000),
+    ttl=getattr(settings, "AUTH_TOKEN_CACHE_TTL", 60),
+)
+_jwt_auth = JWTAuthentication()
+
+
+def authenticate_token(raw_token):
+    """
+    (user, validated_token) for an access token. Raises simplejwt's
+    InvalidToken / AuthenticationFailed like JWTAuthentication does.
+    """
+    if isinstance(raw_token, bytes):
+        raw_token = raw_token.decode()
+    cached = token_users.get(raw_token)
+    if cached is not None:
+        return cached
+
+    validated_token = _jwt_auth.get_validated_token(raw_token)
+    user = _jwt_auth.get_user(validated_token)
+    token_users.put(raw_token, validated_token, user)
+    return user, validated_token
+
+
+def get_user_from_token(token):
+    return authenticate_token(token)[0]
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """DRF authentication class: JWTAuthentication backed by token_users."""
+
+    def authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        return authenticate_token(raw_token)
+
+
+@receiver(post_save, sender=Users)
+@receiver(post_delete, sender=Users)
+def _invalidate_cached_tokens(sender, instance, **kwargs):
+    token_users.invalidate_user(instance.pk)
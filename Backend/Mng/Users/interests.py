@@ -0,0 +1,126 @@
+"""
+Interest names in memory, for autocomplete and duplicate checks.
+
+The whole Interest table is held as one array of normalized names
+(casefolded, whitespace collapsed) kept sorted, next to the (id, name) of
+each. A prefix is then a contiguous run found by binary search, so
+complete() costs O(log n + k) and lookup(), the case-insensitive duplicate
+check, O(log n).
+
+Any Interest write (post_save/post_delete below, or invalidate() after
+bulk_create) bumps a version token in INTEREST_NAMES_CACHE_ALIAS; every
+process compares its copy's version with it on use and reloads (one query)
+when it changed. When that cache is process-local and not declared shared
+(Mng/cache.py) the version is read from the database instead: the
+highest id and the row count, one aggregate query, which changes with every
+insert and delete. That query runs at most once per
+INTEREST_NAMES_VERSION_TTL seconds, so other processes' writes show up that
+much later; this process's own writes reset it. Renames are not seen that
+way; interests are not renamed by the app.
+"""
+
+import threading
+import time
+import uuid
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from Mng.cache import shared_cache
+from .models import Interest
+
+AUTOCOMPLETE_LIMIT = 10
+MAX_AUTOCOMPLETE_LIMIT = 50
+
+VERSION_KEY = "interests:version"
+
+
+def normalize(name):
+    return " ".join((name or "").casefold().split())
+
+
+class InterestNames:
+    def __init__(self, alias=None):
+        self.cache = shared_cache(alias or getattr(settings, "INTEREST_NAMES_CACHE_ALIAS", "default"))
+        self._lock = threading.Lock()
+        self._state = None  # (version, sorted keys, [(id, name)] in key order)
+        self.version_ttl = getattr(settings, "INTEREST_NAMES_VERSION_TTL", 2)
+        self._checked = None  # (database version, time.monotonic() it was read)
+
+    def _version(self):
+        if self.cache is None:
+            checked = self._checked
+            if checked is not None and time.monotonic() - checked[1] < self.version_ttl:
+                return checked[0]
+            stats = Interest.objects.aggregate(last=Max("id"), count=Count("id"))
+            version = (stats["last"], stats["count"])
+            self._checked = (version, time.monotonic())
+            return version
+        version = self.cache.get(VERSION_KEY)
+        if version is None:
+            self.cache.add(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+            version = self.cache.get(VERSION_KEY)
+        return version
+
+    def _current(self):
+        version = self._version()
+        state = self._state
+        if state is None or state[0] != version:
+            with self._lock:
+                state = self._state
+                if state is None or state[0] != version:
+                    state = self._state = (version, *self._load())
+        return state
+
+    @staticmethod
+    def _load():
+        rows = sorted(
+            (normalize(name), interest_id, name)
+            for interest_id, name in Interest.objects.values_list("id", "name").iterator(chunk_size=20000)
+        )
+        return [key for key, _, _ in rows], [(interest_id, name) for _, interest_id, name in rows]
+
+    def invalidate(self):
+        if self.cache is None:
+            with self._lock:
+                self._state = None  # versions from the database can miss renames
+                self._checked = None
+            return
+        self.cache.set(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+
+    def all(self):
+        """[(id, name)] of every interest, alphabetically."""
+        return list(self._current()[2])
+
+    def lookup(self, name):
+        """(id, name) of the interest with this name ignoring case, or None."""
+        _, keys, entries = self._current()
+        key = normalize(name)
+        i = bisect_left(keys, key)
+        if i < len(keys) and keys[i] == key:
+            return entries[i]
+        return None
+
+    def complete(self, prefix, k=AUTOCOMPLETE_LIMIT):
+        """Up to k [(id, name)] whose name starts with prefix, alphabetically."""
+        _, keys, entries = self._current()
+        prefix = normalize(prefix)
+        results = []
+        i = bisect_left(keys, prefix)
+        while i < len(keys) and len(results) < k and keys[i].startswith(prefix):
+            results.append(entries[i])
+            i += 1
+        return results
+
+
+interest_names = InterestNames()
+
+
+@receiver(post_save, sender=Interest)
+@receiver(post_delete, sender=Interest)
+def _interest_changed(sender, **kwargs):
+    transaction.on_commit(interest_names.invalidate)
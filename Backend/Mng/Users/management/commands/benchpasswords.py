@@ -0,0 +1,46 @@
+import asyncio
+import os
+import time
+
+from django.contrib.auth.hashers import get_hasher, make_password
+from django.core.management.base import BaseCommand
+
+from Users.passwords import averify_password, hash_pool, verify_password
+
+
+async def _verify_concurrently(password, encoded, logins):
+    # The same awaited call loginByMobile makes, one per concurrent login
+    await asyncio.gather(*(averify_password(password, encoded) for _ in range(logins)))
+
+
+class Command(BaseCommand):
+    help = "Measure password-check throughput (logins/s) inline and awaited through the password hash pool, as loginByMobile does"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--logins", type=int, default=200)
+
+    def handle(self, *args, **options):
+        logins = options["logins"]
+        password = "bench-password"
+        encoded = make_password(password)
+        workers = hash_pool()._max_workers
+
+        start = time.perf_counter()
+        for _ in range(logins):
+            verify_password(password, encoded)
+        inline = time.perf_counter() - start
+
+        start = time.perf_counter()
+        asyncio.run(_verify_concurrently(password, encoded, logins))
+        pooled = time.perf_counter() - start
+
+        hasher = get_hasher()
+        self.stdout.write(
+            f"{logins} logins, {hasher.algorithm} with {getattr(hasher, 'iterations', '?')} iterations, "
+            f"{os.cpu_count()} CPUs, {workers} pool threads"
+        )
+        self.stdout.write(f"inline (1 thread)  {logins / inline:8.1f} logins/s  {inline / logins * 1000:7.1f} ms each")
+        self.stdout.write(
+            f"awaited ({workers} threads)  {logins / pooled:8.1f} logins/s  "
+            f"{logins / pooled / min(workers, os.cpu_count() or 1):8.1f} logins/s per core"
+        )
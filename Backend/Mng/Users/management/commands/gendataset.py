@@ -0,0 +1,519 @@
+import io
+import random
+import time
+from array import array
+from datetime import date, datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, models, transaction
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Substr
+from django.utils import timezone
+
+from Chat.models import PREVIEW_LENGTH, ChatThread, Message
+from groups.models import Group, GroupMember, GroupMessage
+from UserData.models import Connection, ConnectionRequest
+from Users.interests import interest_names
+from Users.models import Interest, ProfilePhoto, UserProfile, Users
+
+# Generated users are recognised by their phone numbers (13 characters,
+# never a real number) and generated groups by their name
+PHONE_PREFIX = "+00"
+NAME_PREFIX = "gen_"
+
+FIRST_NAMES = [
+    "Aarav", "Aditi", "Alex", "Amara", "Ananya", "Arjun", "Chen", "Diego", "Elena", "Fatima",
+    "Hana", "Ibrahim", "Isha", "Jonas", "Kabir", "Kavya", "Leila", "Lucas", "Maya", "Mei",
+    "Mohammed", "Nadia", "Noah", "Omar", "Priya", "Rahul", "Riya", "Rohan", "Sara", "Sofia",
+    "Tara", "Vikram", "Yara", "Zoe",
+]
+LAST_NAMES = [
+    "Ahmed", "Bose", "Costa", "Das", "Fischer", "Garcia", "Gupta", "Iyer", "Khan", "Kim",
+    "Kumar", "Li", "Martin", "Mehta", "Nair", "Novak", "Patel", "Reddy", "Rossi", "Sato",
+    "Shah", "Silva", "Singh", "Smith", "Tanaka", "Verma", "Wang", "Yilmaz",
+]
+JOB_TITLES = [
+    "", "Software Engineer", "Designer", "Product Manager", "Teacher", "Doctor", "Nurse",
+    "Data Analyst", "Architect", "Photographer", "Writer", "Student", "Consultant", "Chef",
+]
+COMPANIES = ["", "Acme", "Globex", "Initech", "Umbrella", "Stark Industries", "Wayne Enterprises", "Hooli"]
+EDUCATION = ["", "High School", "Bachelor's", "Master's", "PhD"]
+GENDERS = ["male", "female", "other"]
+
+BASE_INTERESTS = [
+    "Football", "Cricket", "Basketball", "Tennis", "Running", "Cycling", "Swimming", "Yoga",
+    "Hiking", "Camping", "Climbing", "Travel", "Photography", "Painting", "Drawing", "Music",
+    "Guitar", "Piano", "Singing", "Dancing", "Movies", "Theatre", "Reading", "Writing",
+    "Poetry", "Cooking", "Baking", "Coffee", "Tea", "Wine", "Gardening", "Pets", "Dogs",
+    "Cats", "Fashion", "Design", "Tech", "Programming", "Gaming", "Board Games", "Chess",
+    "Anime", "Science", "Astronomy", "History", "Politics", "Startups", "Investing",
+    "Fitness", "Meditation", "Volunteering", "Languages", "Podcasts", "Cars", "Motorcycles",
+]
+INTEREST_MODIFIERS = ["Indie", "Vintage", "Urban", "Competitive", "Amateur", "Outdoor", "Digital", "Classic"]
+
+WORDS = (
+    "hey hi hello sure thanks okay yes no maybe later tomorrow tonight today weekend coffee lunch "
+    "dinner movie game match trip plan call meet see you soon great cool nice sounds good what "
+    "about the new place near office home park when where how are doing fine busy free let me "
+    "know send photo link cant wait lol haha"
+).split()
+
+
+def _interest_names(count):
+    names = list(BASE_INTERESTS)
+    names += [f"{modifier} {base}" for modifier in INTEREST_MODIFIERS for base in BASE_INTERESTS]
+    return names[:count]
+
+
+def _copy_value(value):
+    if value is None:
+        return "\\N"
+    if value is True:
+        return "t"
+    if value is False:
+        return "f"
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, str):
+        return value.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+    return str(value)
+
+
+class _Inserter:
+    """
+    Streams rows (tuples in `fields` order) into a model's table in batches.
+
+    PostgreSQL gets COPY FROM STDIN (psycopg 3 or psycopg2). Other backends
+    get multi-row executemany INSERTs. Both write the values as given, so
+    auto_now_add timestamps keep their generated values, which bulk_create
+    would overwrite.
+    """
+
+    def __init__(self, model, fields, batch_size):
+        self.model = model
+        self.fields = [model._meta.get_field(name) for name in fields]
+        self.batch_size = batch_size
+        self.rows = 0
+
+    def insert(self, rows):
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                self._write(batch)
+                batch = []
+        if batch:
+            self._write(batch)
+
+    def _adapters(self):
+        # Only dates need converting for the DB-API driver; fields are looked
+        # up once per batch instead of calling get_db_prep_save per value
+        ops = connection.ops
+        return [
+            ops.adapt_datetimefield_value if isinstance(field, models.DateTimeField)
+            else ops.adapt_datefield_value if isinstance(field, models.DateField)
+            else None
+            for field in self.fields
+        ]
+
+    def _write(self, batch):
+        quote = connection.ops.quote_name
+        table = quote(self.model._meta.db_table)
+        columns = ", ".join(quote(field.column) for field in self.fields)
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                text = "".join("\t".join([_copy_value(v) for v in row]) + "\n" for row in batch)
+                sql = f"COPY {table} ({columns}) FROM STDIN"
+                raw = cursor.cursor
+                if hasattr(raw, "copy"):  # psycopg 3
+                    with raw.copy(sql) as copy:
+                        copy.write(text)
+                else:  # psycopg2
+                    raw.copy_expert(sql, io.StringIO(text))
+            else:
+                placeholders = ", ".join(["%s"] * len(self.fields))
+                adapt = self._adapters()
+                params = [[a(value) if a else value for a, value in zip(adapt, row)] for row in batch]
+                cursor.executemany(f"INSERT INTO {table} ({columns}) VALUES ({placeholders})", params)
+        self.rows += len(batch)
+
+
+def _ids(queryset, *fields):
+    """Columns of `queryset` in id order as compact arrays (one per field)."""
+    columns = [array("q") for _ in fields]
+    for row in queryset.order_by("id").values_list(*fields).iterator(chunk_size=20000):
+        for column, value in zip(columns, row):
+            column.append(value)
+    return columns
+
+
+def _generated_groups():
+    return Group.objects.filter(name__startswith=NAME_PREFIX, created_by__phone_number__startswith=PHONE_PREFIX)
+
+
+def _split(total, weights):
+    """Split `total` into integer parts proportional to `weights`."""
+    scale = total / (sum(weights) or 1)
+    counts = [int(w * scale) for w in weights]
+    for i in range(total - sum(counts)):
+        counts[i % len(counts)] += 1
+    return counts
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a reproducible synthetic dataset (users, profiles, photos, interests, connections, "
+        "connection requests, chats, groups and messages) for load and query testing. Same --seed and sizes give the same data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--interests", type=int, default=150, help="size of the interest vocabulary")
+        parser.add_argument("--interests-per-user", type=int, default=5)
+        parser.add_argument("--photos-per-user", type=int, default=3, help="average number of profile photos")
+        parser.add_argument("--connections-per-user", type=int, default=10, help="average number of connections")
+        parser.add_argument(
+            "--requests-per-user", type=float, default=2.0,
+            help="average open (pending or rejected) requests sent, besides the accepted one behind each connection",
+        )
+        parser.add_argument("--chat-ratio", type=float, default=0.3, help="fraction of connections with a chat thread")
+        parser.add_argument("--messages", type=int, default=10000, help="total one-to-one messages")
+        parser.add_argument("--groups", type=int, default=None, help="default: one per 50 users")
+        parser.add_argument("--group-size", type=int, default=25)
+        parser.add_argument("--group-messages", type=int, default=None, help="default: a tenth of --messages")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--batch-size", type=int, default=10000)
+        parser.add_argument("--clear", action="store_true", help="delete previously generated data first")
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+        self.now = timezone.now()
+        self._rows = 0
+        n = options["users"]
+        if n < 2:
+            raise CommandError("--users must be at least 2")
+
+        if options["clear"]:
+            self._stage("clear", self._clear)
+        if Users.objects.filter(phone_number__startswith=PHONE_PREFIX).exists():
+            raise CommandError("Generated data already exists, run again with --clear")
+
+        groups = options["groups"] if options["groups"] is not None else max(1, n // 50)
+        group_messages = options["group_messages"]
+        if group_messages is None:
+            group_messages = options["messages"] // 10
+
+        total = time.perf_counter()
+        interest_ids = self._stage("interests", self._interests, options["interests"])
+        user_ids = self._stage("users", self._users, n)
+        self._stage("profiles", self._profiles, user_ids, interest_ids, options["interests_per_user"])
+        self._stage("photos", self._photos, user_ids, options["photos_per_user"])
+        pairs = self._stage("connections", self._connections, user_ids, options["connections_per_user"])
+        self._stage("requests", self._requests, user_ids, pairs, options["requests_per_user"])
+        self._stage("threads", self._threads, user_ids, pairs, options["chat_ratio"])
+        self._stage("messages", self._messages, options["messages"])
+        self._stage("groups", self._groups, user_ids, interest_ids, groups, options["group_size"])
+        self._stage("group messages", self._group_messages, group_messages)
+        self.stdout.write(self.style.SUCCESS(f"✅ dataset ready in {time.perf_counter() - total:.1f}s"))
+
+    def _stage(self, name, func, *args):
+        start = time.perf_counter()
+        with transaction.atomic():
+            result = func(*args)
+        rows = self._rows
+        elapsed = time.perf_counter() - start
+        self.stdout.write(f"{name:<16}{rows:>12,} rows {elapsed:8.1f}s {rows / max(elapsed, 1e-9):12,.0f} rows/s")
+        self._rows = 0
+        return result
+
+    def _insert(self, model, fields, rows):
+        inserter = _Inserter(model, fields, self.batch_size)
+        inserter.insert(rows)
+        self._rows += inserter.rows
+
+    def _past(self, days):
+        return self.now - timedelta(seconds=self.rng.uniform(0, days * 86400))
+
+    # -- stages -----------------------------------------------------------
+
+    def _clear(self):
+        # Raw deletes for the bulky tables (the ORM would load every row to
+        # cascade), then the ORM for whatever else points at the users.
+        # Foreign keys are deferred until commit, so the order is free.
+        users = Users.objects.filter(phone_number__startswith=PHONE_PREFIX)
+        groups = _generated_groups()
+        threads = ChatThread.objects.filter(user_low__in=users)
+        profiles = UserProfile.objects.filter(user__in=users)
+        for queryset in (
+            GroupMessage.objects.filter(group__in=groups),
+            GroupMember.objects.filter(group__in=groups),
+            Group.interests.through.objects.filter(group__in=groups),
+            groups,
+            Message.objects.filter(thread__in=threads),
+            threads,
+            Connection.objects.filter(user_low__in=users),
+            Connection.objects.filter(user_high__in=users),
+            ConnectionRequest.objects.filter(from_user__in=users),
+            ConnectionRequest.objects.filter(to_user__in=users),
+            ProfilePhoto.objects.filter(user__in=users),
+            UserProfile.interests.through.objects.filter(userprofile__in=profiles),
+            profiles,
+        ):
+            self._rows += queryset._raw_delete(queryset.db)
+        deleted, _ = users.delete()
+        self._rows += deleted
+
+    def _interests(self, count):
+        names = _interest_names(count)
+        Interest.objects.bulk_create([Interest(name=name) for name in names], ignore_conflicts=True)
+        interest_names.invalidate()
+        self._rows = len(names)
+        (interest_ids,) = _ids(Interest.objects.filter(name__in=names), "id")
+        return list(interest_ids)
+
+    def _users(self, n):
+        rng = self.rng
+
+        def rows():
+            for i in range(n):
+                created = self._past(730)
+                yield (
+                    f"{PHONE_PREFIX}{i:010d}", f"{NAME_PREFIX}{i}", f"{NAME_PREFIX}{i}@example.com",
+                    "!", True, False, False, created, created + timedelta(days=rng.uniform(0, 30)),
+                )
+
+        self._insert(
+            Users,
+            ["phone_number", "username", "email", "password", "is_active", "is_staff", "is_superuser",
+             "created_at", "last_login"],
+            rows(),
+        )
+        # Inserted in one session, so id order is generation order: user_ids[i] is user i
+        (user_ids,) = _ids(Users.objects.filter(phone_number__startswith=PHONE_PREFIX), "id")
+        return user_ids
+
+    def _profiles(self, user_ids, interest_ids, per_user):
+        rng = self.rng
+        # Popular interests are much more common than the long tail (Zipf-like)
+        weights = [1 / (rank + 1) for rank in range(len(interest_ids))]
+
+        def rows():
+            for user_id in user_ids:
+                premium = rng.random() < 0.05
+                yield (
+                    user_id, f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}", rng.choice(GENDERS),
+                    date(1970, 1, 1) + timedelta(days=rng.randrange(365 * 18, 365 * 38)),
+                    "", rng.choice(JOB_TITLES), rng.choice(COMPANIES), rng.choice(EDUCATION),
+                    premium, self._past(365) if premium else None,
+                )
+
+        self._insert(
+            UserProfile,
+            ["user", "full_name", "gender", "birthdate", "bio", "job_title", "company", "education",
+             "is_premium", "premium_since"],
+            rows(),
+        )
+        (profile_ids,) = _ids(UserProfile.objects.filter(user__phone_number__startswith=PHONE_PREFIX), "id")
+
+        def links():
+            for profile_id in profile_ids:
+                count = min(len(interest_ids), max(0, int(rng.gauss(per_user, per_user / 3))))
+                chosen = set(rng.choices(interest_ids, weights=weights, k=count))
+                for interest_id in chosen:
+                    yield profile_id, interest_id
+
+        if interest_ids:
+            self._insert(UserProfile.interests.through, ["userprofile", "interest"], links())
+
+    def _photos(self, user_ids, per_user):
+        rng = self.rng
+
+        def rows():
+            for i, user_id in enumerate(user_ids):
+                for position in range(rng.randint(0, 2 * per_user)):
+                    yield (
+                        user_id, f"https://example.com/photos/{NAME_PREFIX}{i}/{position}.jpg", position,
+                        self._past(365), rng.random() < 0.1,
+                    )
+
+        self._insert(ProfilePhoto, ["user", "url", "position", "uploaded_at", "is_private"], rows())
+
+    def _connections(self, user_ids, per_user):
+        """
+        Each user i links to i + offset (mod n) for per_user / 2 distinct
+        offsets in 1..(n - 1) // 2, so every undirected pair comes up once
+        without keeping a set of all pairs. Half the offsets are small, which
+        gives the graph local clusters (shared friends) instead of a purely
+        random one. Stored as one (low, high) row per pair, like accept does.
+        """
+        rng = self.rng
+        n = len(user_ids)
+        max_offset = (n - 1) // 2
+        k = min(per_user // 2, max_offset)
+        pairs = array("q")
+
+        def rows():
+            for i in range(n):
+                offsets = set()
+                while len(offsets) < k:
+                    if rng.random() < 0.5:
+                        offsets.add(rng.randint(1, min(max_offset, 50)))
+                    else:
+                        offsets.add(rng.randint(1, max_offset))
+                a = user_ids[i]
+                for offset in offsets:
+                    b = user_ids[(i + offset) % n]
+                    pairs.append(a)
+                    pairs.append(b)
+                    yield min(a, b), max(a, b), self._past(365)
+
+        self._insert(Connection, ["user_low", "user_high", "created_at"], rows())
+        return pairs
+
+    def _requests(self, user_ids, pairs, per_user):
+        """
+        An accepted request behind every connection (accept keeps the row),
+        sent by either side, plus open requests between users who aren't
+        connected: mostly pending, some rejected. The open ones use the
+        connections' offset scheme with offsets user i didn't connect on,
+        so each pair comes up once and never collides with a connection.
+        """
+        rng = self.rng
+        n = len(user_ids)
+        max_offset = (n - 1) // 2
+        # _connections gives every user the same number of links, in user order
+        k = len(pairs) // 2 // n
+
+        def rows():
+            for j in range(0, len(pairs), 2):
+                a, b = pairs[j], pairs[j + 1]
+                if rng.random() < 0.5:
+                    a, b = b, a
+                created = self._past(365)
+                yield a, b, "accepted", created, min(created + timedelta(days=rng.uniform(0, 7)), self.now)
+            for i in range(n):
+                linked = set(pairs[2 * k * i + 1:2 * k * (i + 1):2])
+                count = min(int(per_user) + (rng.random() < per_user % 1), max_offset - k)
+                targets = set()
+                while len(targets) < count:
+                    b = user_ids[(i + rng.randint(1, max_offset)) % n]
+                    if b not in linked:
+                        targets.add(b)
+                for b in targets:
+                    a = user_ids[i]
+                    if rng.random() < 0.5:
+                        a, b = b, a
+                    created = self._past(90)
+                    if rng.random() < 0.2:
+                        yield a, b, "rejected", created, min(created + timedelta(days=rng.uniform(0, 7)), self.now)
+                    else:
+                        yield a, b, "pending", created, created
+
+        self._insert(ConnectionRequest, ["from_user", "to_user", "status", "created_at", "updated_at"], rows())
+
+    def _threads(self, user_ids, pairs, ratio):
+        rng = self.rng
+
+        def rows():
+            for j in range(0, len(pairs), 2):
+                if rng.random() < ratio:
+                    a, b = pairs[j], pairs[j + 1]
+                    yield min(a, b), max(a, b), self._past(365), ""
+
+        self._insert(ChatThread, ["user_low", "user_high", "created_at", "last_message_preview"], rows())
+
+    def _spread(self, total, owner_count):
+        """Messages per thread/group: heavy-tailed, a few very busy conversations."""
+        if not owner_count:
+            return []
+        return _split(total, [self.rng.paretovariate(1.2) for _ in range(owner_count)])
+
+    def _timeline(self, count):
+        """`count` increasing timestamps from some point in the last year up to now."""
+        start = self._past(365)
+        step = (self.now - start) / (count + 1)
+        return [start + step * (k + 1) for k in range(count)]
+
+    def _text(self):
+        return " ".join(self.rng.choices(WORDS, k=self.rng.randint(2, 12)))
+
+    def _messages(self, total):
+        rng = self.rng
+        thread_ids, lows, highs = _ids(
+            ChatThread.objects.filter(user_low__phone_number__startswith=PHONE_PREFIX),
+            "id", "user_low_id", "user_high_id",
+        )
+        if not thread_ids:
+            return
+        texts = [self._text() for _ in range(5000)]
+
+        def rows():
+            # One thread at a time, so ids and created_at increase together
+            for thread_id, low, high, count in zip(thread_ids, lows, highs, self._spread(total, len(thread_ids))):
+                for created in self._timeline(count):
+                    yield thread_id, low if rng.random() < 0.5 else high, rng.choice(texts), created
+
+        self._insert(Message, ["thread", "sender", "text", "created_at"], rows())
+
+        # Backfill the denormalized last message (normally kept by Message.save)
+        newest = Message.objects.filter(thread=OuterRef("pk")).order_by("-id")
+        ChatThread.objects.filter(user_low__phone_number__startswith=PHONE_PREFIX).update(
+            last_message=Subquery(newest.values("id")[:1]),
+            last_message_at=Subquery(newest.values("created_at")[:1]),
+            last_message_preview=Coalesce(
+                Subquery(newest.annotate(preview=Substr("text", 1, PREVIEW_LENGTH)).values("preview")[:1]),
+                Value(""),
+            ),
+        )
+
+    def _groups(self, user_ids, interest_ids, count, size):
+        rng = self.rng
+        n = len(user_ids)
+        size = min(size, n)
+        members = [rng.sample(range(n), size) for _ in range(count)]
+
+        self._insert(
+            Group,
+            ["name", "description", "created_by", "created_at", "updated_at", "is_active"],
+            (
+                (f"{NAME_PREFIX}group_{g}", "", user_ids[members[g][0]], created, created, True)
+                for g, created in ((g, self._past(365)) for g in range(count))
+            ),
+        )
+        (group_ids,) = _ids(_generated_groups(), "id")
+
+        def member_rows():
+            for group_id, indexes in zip(group_ids, members):
+                for position, i in enumerate(indexes):
+                    yield group_id, user_ids[i], "admin" if position == 0 else "member", self._past(365)
+
+        self._insert(GroupMember, ["group", "user", "role", "joined_at"], member_rows())
+        if interest_ids:
+            self._insert(
+                Group.interests.through,
+                ["group", "interest"],
+                (
+                    (group_id, interest_id)
+                    for group_id in group_ids
+                    for interest_id in set(rng.choices(interest_ids, k=rng.randint(1, 3)))
+                ),
+            )
+
+    def _group_messages(self, total):
+        rng = self.rng
+        (group_ids,) = _ids(_generated_groups(), "id")
+        if not group_ids:
+            return
+        member_ids = {}
+        for group_id, user_id in GroupMember.objects.filter(group__in=_generated_groups()).values_list("group", "user"):
+            member_ids.setdefault(group_id, []).append(user_id)
+        texts = [self._text() for _ in range(5000)]
+
+        def rows():
+            for group_id, count in zip(group_ids, self._spread(total, len(group_ids))):
+                senders = member_ids[group_id]
+                for created in self._timeline(count):
+                    yield group_id, rng.choice(senders), rng.choice(texts), created
+
+        self._insert(GroupMessage, ["group", "sender", "text", "created_at"], rows())
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from Users.otp import DatabaseOTPStore
+
+
+class Command(BaseCommand):
+    help = "Delete expired OTP rows (only needed with OTP_STORE=database); run it from cron"
+
+    def handle(self, *args, **options):
+        deleted = DatabaseOTPStore().sweep()
+        self.stdout.write(f"Deleted {deleted} expired OTPs")
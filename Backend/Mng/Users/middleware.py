@@ -0,0 +1,50 @@
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.contrib.auth.models import AnonymousUser
+
+from .auth import get_user_from_token
+from .utils import get_user_card
+
+
+@database_sync_to_async
+def _authenticate(token):
+    """(user, display card), or (AnonymousUser, None) for a missing/invalid token."""
+    if not token:
+        return AnonymousUser(), None
+    try:
+        user = get_user_from_token(token)
+    except Exception as e:
+        print(f"❌ WebSocket token rejected: {e}")
+        return AnonymousUser(), None
+    return user, get_user_card(user)
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    """
+    Authenticates a WebSocket once per connection from ?token=<access token>
+    (or an "Authorization: Bearer <token>" header for native clients).
+
+    Sets scope["user"] (AnonymousUser when the token is missing or invalid)
+    and scope["user_card"], the user's display card as built by
+    Users.utils.get_user_card, so consumers can broadcast without looking up
+    the sender.
+    """
+
+    async def __call__(self, scope, receive, send):
+        scope = dict(scope)
+        scope["user"], scope["user_card"] = await _authenticate(self._get_token(scope))
+        return await self.inner(scope, receive, send)
+
+    @staticmethod
+    def _get_token(scope):
+        query = parse_qs(scope.get("query_string", b"").decode())
+        if query.get("token"):
+            return query["token"][0]
+        for name, value in scope.get("headers", ()):
+            if name == b"authorization":
+                parts = value.decode().split()
+                if len(parts) == 2 and parts[0] == "Bearer":
+                    return parts[1]
+        return None
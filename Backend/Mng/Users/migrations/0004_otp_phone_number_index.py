@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Users', '0003_interest_remove_userprofile_interests_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='otp',
+            name='phone_number',
+            field=models.CharField(db_index=True, max_length=15),
+        ),
+    ]
@@ -6,7 +6,7 @@ from django.utils import timezone
 from datetime import timedelta
 
 class OTP(models.Model):
-    phone_number = models.CharField(max_length=15)
+    phone_number = models.CharField(max_length=15, db_index=True)
     otp = models.CharField(max_length=6)
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -15,14 +15,18 @@ class OTP(models.Model):
 
 # Custom user manager
 class UserManager(BaseUserManager):
-    def create_user(self, phone_number, username, email=None, password=None):
+    def create_user(self, phone_number, username, email=None, password=None, encoded_password=None):
+        """encoded_password: a hash from make_password(), stored instead of hashing password"""
         if not phone_number:
             raise ValueError("Users must have a phone number")
         if not username:
             raise ValueError("Users must have a username")
 
         user = self.model(phone_number=phone_number, username=username, email=email)
-        user.set_password(password)
+        if encoded_password is not None:
+            user.password = encoded_password
+        else:
+            user.set_password(password)
         user.save(using=self._db)
         return user
 
@@ -0,0 +1,166 @@
+"""
+Short-lived OTP storage for signup, selected with OTP_STORE:
+
+- "database" (default): the Users.OTP table, one conditional statement per
+  operation. Expired rows are removed by `manage.py sweepotps`.
+- "cache": Django's cache framework (OTP_CACHE_ALIAS). Expiry is native, so
+  nothing accumulates. Use a shared cache (Redis/Memcached) when running
+  several worker processes.
+- "memory": a dict in this process; single-process development only.
+
+Signup moves a phone number's entry from the code to VERIFIED (verifyOTP)
+and then consumes VERIFIED (createUser). Every step is a compare-and-consume
+so a code can't be used twice, even by concurrent requests.
+"""
+
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OTP
+
+# Stored in place of the code once it has been verified (codes are 6 digits)
+VERIFIED = "ok"
+
+
+class BaseOTPStore:
+    def __init__(self, ttl=None):
+        self.ttl = ttl or getattr(settings, "OTP_TTL", 300)
+
+    def put(self, phone, value):
+        """Store value for phone for ttl seconds, replacing any previous one."""
+        raise NotImplementedError
+
+    def get(self, phone):
+        """Current unexpired value, or None."""
+        raise NotImplementedError
+
+    def consume(self, phone, expected):
+        """Delete the entry if it holds `expected`. True for exactly one caller."""
+        raise NotImplementedError
+
+    def replace(self, phone, expected, value):
+        """Swap `expected` for `value` (with a fresh ttl). False if it didn't match."""
+        if not self.consume(phone, expected):
+            return False
+        self.put(phone, value)
+        return True
+
+
+class DatabaseOTPStore(BaseOTPStore):
+    def _fresh(self):
+        return OTP.objects.filter(created_at__gt=timezone.now() - timedelta(seconds=self.ttl))
+
+    def put(self, phone, value):
+        with transaction.atomic():
+            OTP.objects.filter(phone_number=phone).delete()
+            OTP.objects.create(phone_number=phone, otp=value)
+
+    def get(self, phone):
+        return self._fresh().filter(phone_number=phone).values_list("otp", flat=True).first()
+
+    def consume(self, phone, expected):
+        deleted, _ = self._fresh().filter(phone_number=phone, otp=expected).delete()
+        return deleted > 0
+
+    def replace(self, phone, expected, value):
+        # A single conditional UPDATE, no delete + insert
+        return self._fresh().filter(phone_number=phone, otp=expected).update(
+            otp=value, created_at=timezone.now()
+        ) > 0
+
+    def sweep(self):
+        """Delete expired rows. Returns how many were removed."""
+        cutoff = timezone.now() - timedelta(seconds=self.ttl)
+        deleted, _ = OTP.objects.filter(created_at__lte=cutoff).delete()
+        return deleted
+
+
+class CacheOTPStore(BaseOTPStore):
+    """
+    Each value lives under its own key, otp:<phone>:<value>, next to a pointer
+    otp:<phone> naming the current one. consume() is then a single delete()
+    of the value's key, which the cache reports for exactly one caller; there
+    is no read that a concurrent put() could slip in behind.
+    """
+
+    def __init__(self, ttl=None, alias=None):
+        super().__init__(ttl)
+        self.cache = caches[alias or getattr(settings, "OTP_CACHE_ALIAS", "default")]
+
+    def _key(self, phone, value=None):
+        return f"otp:{phone}" if value is None else f"otp:{phone}:{value}"
+
+    def put(self, phone, value):
+        previous = self.cache.get(self._key(phone))
+        self.cache.set_many({self._key(phone): value, self._key(phone, value): 1}, timeout=self.ttl)
+        if previous is not None and previous != value:
+            self.cache.delete(self._key(phone, previous))
+
+    def get(self, phone):
+        value = self.cache.get(self._key(phone))
+        if value is None or not self.cache.has_key(self._key(phone, value)):
+            return None
+        return value
+
+    def consume(self, phone, expected):
+        return bool(self.cache.delete(self._key(phone, expected)))
+
+
+class MemoryOTPStore(BaseOTPStore):
+    def __init__(self, ttl=None):
+        super().__init__(ttl)
+        self._entries = {}  # phone -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def put(self, phone, value):
+        now = time.monotonic()
+        with self._lock:
+            self._entries[phone] = (now + self.ttl, value)
+            if len(self._entries) > 1000:
+                self._entries = {p: e for p, e in self._entries.items() if e[0] > now}
+
+    def get(self, phone):
+        entry = self._entries.get(phone)
+        if entry is None or entry[0] <= time.monotonic():
+            return None
+        return entry[1]
+
+    def consume(self, phone, expected):
+        with self._lock:
+            entry = self._entries.get(phone)
+            if entry is None or entry[0] <= time.monotonic() or entry[1] != expected:
+                return False
+            del self._entries[phone]
+            return True
+
+    def replace(self, phone, expected, value):
+        with self._lock:
+            entry = self._entries.get(phone)
+            if entry is None or entry[0] <= time.monotonic() or entry[1] != expected:
+                return False
+            self._entries[phone] = (time.monotonic() + self.ttl, value)
+            return True
+
+
+OTP_STORES = {
+    "database": DatabaseOTPStore,
+    "cache": CacheOTPStore,
+    "memory": MemoryOTPStore,
+}
+
+
+def _make_store():
+    name = getattr(settings, "OTP_STORE", "database")
+    try:
+        return OTP_STORES[name]()
+    except KeyError:
+        raise ValueError(f"Unknown OTP_STORE {name!r}, expected one of {sorted(OTP_STORES)}")
+
+
+otp_store = _make_store()
@@ -0,0 +1,49 @@
+"""
+Password hashing off the request worker.
+
+PBKDF2 runs for tens of milliseconds per call and hashlib releases the GIL
+while it does, so a thread pool gives real parallelism. All hashing goes
+through one bounded pool (PASSWORD_HASH_WORKERS threads, default one per
+CPU): a login burst queues for the pool instead of oversubscribing the CPU.
+The signup and login views are async and await amake_password /
+averify_password, so a worker isn't held while a hash runs.
+
+Only hashing runs in the pool; callers do the DB work themselves, so pool
+threads never open database connections.
+"""
+
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+
+_pool = None
+
+
+def hash_pool():
+    global _pool
+    if _pool is None:
+        workers = getattr(settings, "PASSWORD_HASH_WORKERS", None) or os.cpu_count() or 1
+        _pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+    return _pool
+
+
+def verify_password(password, encoded):
+    """
+    (is_correct, new_encoded). new_encoded is set when the password is right
+    but was stored with an outdated hasher or iteration count, so the caller
+    can save the upgraded hash (rehash-on-login).
+    """
+    rehashed = []
+    is_correct = check_password(password, encoded, setter=lambda raw: rehashed.append(make_password(raw)))
+    return is_correct, (rehashed[0] if rehashed else None)
+
+
+async def averify_password(password, encoded):
+    return await asyncio.get_running_loop().run_in_executor(hash_pool(), verify_password, password, encoded)
+
+
+async def amake_password(password):
+    return await asyncio.get_running_loop().run_in_executor(hash_pool(), make_password, password)
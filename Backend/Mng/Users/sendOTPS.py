@@ -3,11 +3,7 @@ import random
 import sib_api_v3_sdk
 from sib_api_v3_sdk.rest import ApiException
 from django.conf import settings
-import requests
-from twilio.rest import Client
-import http.client
 import json
-from decouple import config
 
 
 # def send_email(subject, email,message):
@@ -45,14 +41,8 @@ from decouple import config
 
 
 def sendSMS(phone, message):
+    """Send right away through the configured transport (reused client).
+    Views should use Users.sms.sms_queue.enqueue instead."""
+    from .sms import sms_queue
 
-    account_sid = config("ACCOUNT_SID")
-    auth_token = config("AUTH_TOKEN")
-    client = Client(account_sid ,auth_token)
-    
-    Message = client.messages.create(
-        body = message ,
-        from_ = '+1 641 435 6293',
-        to = phone
-    )
-    print(Message.body)
\ No newline at end of file
+    sms_queue.transport.send(phone, message)
\ No newline at end of file
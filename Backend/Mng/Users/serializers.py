@@ -34,6 +34,7 @@ class UserSerializer(serializers.ModelSerializer):
 
 from rest_framework import serializers
 from .models import Interest
+from .interests import interest_names
 
 class AddInterestSerializer(serializers.ModelSerializer):
     class Meta:
@@ -45,6 +46,7 @@ class AddInterestSerializer(serializers.ModelSerializer):
         if isinstance(validated_data['name'], list):
             interests = [Interest(name=name) for name in validated_data['name']]
             Interest.objects.bulk_create(interests)
+            interest_names.invalidate()  # bulk_create sends no post_save
             return interests
         else:
             return super().create(validated_data)
@@ -104,10 +106,16 @@ class UserListSerializer(serializers.ModelSerializer):
         model = Users
         fields = ["id", "username", "email", "thread_id", "connection_status"]
 
+    # Views serializing many users pass "thread_ids" / "connection_statuses"
+    # in the context (UserData.utils.get_thread_ids / get_connection_statuses)
+    # so the page is resolved in a few batch queries instead of per user.
+
     def get_thread_id(self, obj):
         current_user = self.context.get("current_user")
         if not current_user:
             return None
+        if "thread_ids" in self.context:
+            return self.context["thread_ids"].get(obj.id)
 
         from Chat.models import ChatThread
         low, high = (current_user, obj) if current_user.id < obj.id else (obj, current_user)
@@ -118,16 +126,11 @@ class UserListSerializer(serializers.ModelSerializer):
         current_user = self.context.get("current_user")
         if not current_user:
             return "none"
+        if "connection_statuses" in self.context:
+            return self.context["connection_statuses"].get(obj.id, "none")
 
-
-        if Connection.objects.filter(user=current_user, connected_user=obj).exists():
-            return "connected"
-        elif ConnectionRequest.objects.filter(from_user=current_user, to_user=obj, status="pending").exists():
-            return "pending"
-        elif ConnectionRequest.objects.filter(from_user=obj, to_user=current_user, status="pending").exists():
-            return "incoming"
-        else:
-            return "none"
+        from UserData.graph import connection_graph
+        return connection_graph.status(current_user.id, obj.id)
 
 
 class SimpleUserSerializer(serializers.ModelSerializer):
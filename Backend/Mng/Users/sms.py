@@ -0,0 +1,157 @@
+"""
+Background SMS dispatch.
+
+Views call sms_queue.enqueue(phone, text) and return immediately; a small
+pool of worker threads (SMS_CONCURRENCY) hands messages to the transport
+and retries transient failures with exponential backoff (SMS_MAX_ATTEMPTS,
+SMS_RETRY_BACKOFF seconds, doubled per attempt).
+
+SMS_TRANSPORT selects the provider:
+- "fake" (default): nothing leaves the process; messages are printed and
+  kept in FakeSMSTransport.sent
+- "twilio": one twilio Client (and its HTTP session) for the process,
+  credentials from ACCOUNT_SID / AUTH_TOKEN
+
+The queue lives in memory: messages still queued when the process exits
+are lost, which is acceptable for OTPs (the user asks for a new one).
+"""
+
+import queue
+import random
+import threading
+import time
+
+from decouple import config
+from django.conf import settings
+
+
+class FakeSMSTransport:
+    """Records messages instead of sending them. `fail` makes the next n sends raise."""
+
+    def __init__(self, latency=0.0, fail=0):
+        self.latency = latency
+        self.fail = fail
+        self.sent = []
+
+    def send(self, phone, text):
+        if self.latency:
+            time.sleep(self.latency)
+        if self.fail > 0:
+            self.fail -= 1
+            raise ConnectionError("fake SMS transport failure")
+        self.sent.append((phone, text))
+        print(f"📱 SMS to {phone}: {text}")
+
+    def is_retryable(self, exc):
+        return True
+
+
+class TwilioSMSTransport:
+    def __init__(self, from_number=None):
+        self.from_number = from_number or getattr(settings, "SMS_FROM_NUMBER", "+1 641 435 6293")
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        # Built once; twilio keeps its HTTP session (and connection pool) on it
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    from twilio.rest import Client
+
+                    self._client = Client(config("ACCOUNT_SID"), config("AUTH_TOKEN"))
+        return self._client
+
+    def send(self, phone, text):
+        message = self.client.messages.create(body=text, from_=self.from_number, to=phone)
+        print(message.body)
+
+    def is_retryable(self, exc):
+        from twilio.base.exceptions import TwilioRestException
+
+        if isinstance(exc, TwilioRestException):
+            # Rate limits and provider errors are worth another try, bad numbers are not
+            return exc.status == 429 or exc.status >= 500
+        return isinstance(exc, (ConnectionError, TimeoutError, OSError))
+
+
+SMS_TRANSPORTS = {
+    "fake": FakeSMSTransport,
+    "twilio": TwilioSMSTransport,
+}
+
+
+class SMSDispatcher:
+    def __init__(self, transport, concurrency=4, max_attempts=4, backoff=0.5, maxsize=1000):
+        self.transport = transport
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.sent = 0
+        self.failed = 0
+        self._workers = []
+        self._lock = threading.Lock()
+
+    def enqueue(self, phone, text):
+        """Queue an SMS without waiting for the provider. False if the queue is full."""
+        self._start()
+        try:
+            self.queue.put_nowait((phone, text))
+        except queue.Full:
+            print(f"❌ SMS queue full, dropping message to {phone}")
+            return False
+        return True
+
+    def _start(self):
+        if len(self._workers) >= self.concurrency:
+            return
+        with self._lock:
+            while len(self._workers) < self.concurrency:
+                worker = threading.Thread(target=self._work, name="sms-dispatch", daemon=True)
+                worker.start()
+                self._workers.append(worker)
+
+    def _work(self):
+        while True:
+            phone, text = self.queue.get()
+            try:
+                self._deliver(phone, text)
+            finally:
+                self.queue.task_done()
+
+    def _deliver(self, phone, text):
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                self.transport.send(phone, text)
+                self.sent += 1
+                return
+            except Exception as e:
+                if attempt == self.max_attempts or not self.transport.is_retryable(e):
+                    print(f"❌ SMS to {phone} failed after {attempt} attempt(s): {e}")
+                    self.failed += 1
+                    return
+                delay = self.backoff * 2 ** (attempt - 1)
+                time.sleep(delay + random.uniform(0, delay / 2))
+
+    def join(self):
+        """Block until everything queued so far has been handled (tests, shutdown)."""
+        self.queue.join()
+
+
+def _make_dispatcher():
+    name = getattr(settings, "SMS_TRANSPORT", "fake")
+    try:
+        transport = SMS_TRANSPORTS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown SMS_TRANSPORT {name!r}, expected one of {sorted(SMS_TRANSPORTS)}")
+    return SMSDispatcher(
+        transport,
+        concurrency=getattr(settings, "SMS_CONCURRENCY", 4),
+        max_attempts=getattr(settings, "SMS_MAX_ATTEMPTS", 4),
+        backoff=getattr(settings, "SMS_RETRY_BACKOFF", 0.5),
+    )
+
+
+sms_queue = _make_dispatcher()
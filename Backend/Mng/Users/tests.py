@@ -1,3 +1,259 @@
-from django.test import TestCase
+import time
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, check_password
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .auth import TokenUserCache, authenticate_token, token_users
+from .interests import InterestNames
+from .models import Interest, Users
+from .otp import VERIFIED, CacheOTPStore, DatabaseOTPStore, MemoryOTPStore, otp_store
+from .sms import FakeSMSTransport, SMSDispatcher
+
+PHONE = "+10000000001"
+
+
+class OTPStoreContract:
+    """Behaviour every OTP_STORE must share; mixed into one TestCase per store."""
+
+    def make_store(self):
+        raise NotImplementedError
+
+    def setUp(self):
+        cache.clear()
+        self.store = self.make_store()
+
+    def test_get_returns_latest_value(self):
+        self.assertIsNone(self.store.get(PHONE))
+        self.store.put(PHONE, "111111")
+        self.store.put(PHONE, "222222")
+        self.assertEqual(self.store.get(PHONE), "222222")
+
+    def test_consume_succeeds_once(self):
+        self.store.put(PHONE, "111111")
+        self.assertFalse(self.store.consume(PHONE, "999999"))
+        self.assertTrue(self.store.consume(PHONE, "111111"))
+        self.assertFalse(self.store.consume(PHONE, "111111"))
+        self.assertIsNone(self.store.get(PHONE))
+
+    def test_replaced_code_can_not_be_consumed(self):
+        self.store.put(PHONE, "111111")
+        self.store.put(PHONE, "222222")
+        self.assertFalse(self.store.consume(PHONE, "111111"))
+        self.assertTrue(self.store.consume(PHONE, "222222"))
+
+    def test_replace_moves_code_to_verified(self):
+        self.store.put(PHONE, "111111")
+        self.assertFalse(self.store.replace(PHONE, "999999", VERIFIED))
+        self.assertTrue(self.store.replace(PHONE, "111111", VERIFIED))
+        self.assertEqual(self.store.get(PHONE), VERIFIED)
+        self.assertFalse(self.store.consume(PHONE, "111111"))
+        self.assertTrue(self.store.consume(PHONE, VERIFIED))
+
+
+class DatabaseOTPStoreTests(OTPStoreContract, TestCase):
+    def make_store(self):
+        return DatabaseOTPStore()
+
+    def test_sweep_removes_expired_rows(self):
+        self.store.put(PHONE, "111111")
+        self.assertEqual(DatabaseOTPStore(ttl=-1).sweep(), 1)
+        self.assertIsNone(self.store.get(PHONE))
+
+
+class CacheOTPStoreTests(OTPStoreContract, TestCase):
+    def make_store(self):
+        return CacheOTPStore(alias="default")
+
+    def test_consume_does_not_take_a_code_put_concurrently(self):
+        # A new code sent right after consume()'s first cache call must survive
+        self.store.put(PHONE, "111111")
+        shared = self.store.cache
+        resend = CacheOTPStore(alias="default")
+        calls = []
+
+        class Interleaved:
+            def __getattr__(self, name):
+                def call(*args, **kwargs):
+                    result = getattr(shared, name)(*args, **kwargs)
+                    calls.append(name)
+                    if len(calls) == 1:
+                        resend.put(PHONE, "222222")
+                    return result
+                return call
+
+        with mock.patch.object(self.store, "cache", Interleaved()):
+            self.store.consume(PHONE, "111111")
+        self.assertEqual(self.store.get(PHONE), "222222")
+        self.assertTrue(self.store.consume(PHONE, "222222"))
+
+
+class MemoryOTPStoreTests(OTPStoreContract, TestCase):
+    def make_store(self):
+        return MemoryOTPStore()
+
+    def test_expired_entry_is_gone(self):
+        store = MemoryOTPStore(ttl=-1)
+        store.put(PHONE, "111111")
+        self.assertIsNone(store.get(PHONE))
+        self.assertFalse(store.consume(PHONE, "111111"))
+
+
+class SMSDispatcherTests(SimpleTestCase):
+    def test_retries_transient_failures(self):
+        transport = FakeSMSTransport(fail=2)
+        dispatcher = SMSDispatcher(transport, concurrency=1, backoff=0.001)
+        self.assertTrue(dispatcher.enqueue(PHONE, "hi"))
+        dispatcher.join()
+        self.assertEqual(transport.sent, [(PHONE, "hi")])
+        self.assertEqual((dispatcher.sent, dispatcher.failed), (1, 0))
+
+    def test_gives_up_after_max_attempts(self):
+        transport = FakeSMSTransport(fail=10)
+        dispatcher = SMSDispatcher(transport, concurrency=1, max_attempts=3, backoff=0.001)
+        dispatcher.enqueue(PHONE, "hi")
+        dispatcher.join()
+        self.assertEqual(transport.sent, [])
+        self.assertEqual((dispatcher.sent, dispatcher.failed), (0, 1))
+
+    def test_full_queue_refuses(self):
+        dispatcher = SMSDispatcher(FakeSMSTransport(), concurrency=0, maxsize=1)
+        self.assertTrue(dispatcher.enqueue(PHONE, "one"))
+        self.assertFalse(dispatcher.enqueue(PHONE, "two"))
+
+
+class GenerateOTPTests(TestCase):
+    def test_otp_is_stored_and_sent_through_the_queue(self):
+        transport = FakeSMSTransport()
+        dispatcher = SMSDispatcher(transport, concurrency=1)
+        with mock.patch("Users.views.sms_queue", dispatcher):
+            response = APIClient().post("/generateOTP", {"phone_number": "10000000001"}, format="json")
+            dispatcher.join()
+        self.assertEqual(response.status_code, 200)
+        code = otp_store.get("10000000001")
+        self.assertEqual(transport.sent, [("+10000000001", f"Your OTP is {code}")])
+
+
+class SignupLoginTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_create_user_after_verified_otp(self):
+        otp_store.put("10000000002", VERIFIED)
+        response = self.client.post("/createUser", {
+            "phone_number": "10000000002", "username": "newbie", "password": "s3cret",
+            "name": "New Bie", "gender": "other", "birthdate": "2000-01-01",
+        }, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertIn("access", response.json()["tokens"])
+        user = Users.objects.get(username="newbie")
+        self.assertTrue(user.check_password("s3cret"))
+        self.assertEqual(user.profile.full_name, "New Bie")
+
+    def test_create_user_without_otp(self):
+        response = self.client.post("/createUser", {
+            "phone_number": "10000000002", "username": "newbie", "password": "s3cret",
+        }, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Users.objects.filter(username="newbie").exists())
+
+    def test_login_upgrades_outdated_hash(self):
+        user = Users.objects.create_user(
+            phone_number="10000000003", username="old",
+            encoded_password=PBKDF2PasswordHasher().encode("pw", "saltsalt", iterations=1000),
+        )
+        response = self.client.post("/loginByMobile", {"phone_number": "10000000003", "password": "nope"}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.post("/loginByMobile", {"phone_number": "10000000003", "password": "pw"}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["username"], "old")
+        user.refresh_from_db()
+        self.assertNotIn("$1000$", user.password)
+        self.assertTrue(check_password("pw", user.password))
+
+
+class InterestNamesTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        Interest.objects.bulk_create([Interest(name=n) for n in ("Hiking", "hip hop", "History", "Tech")])
+
+    def names(self, pairs):
+        return [name for _, name in pairs]
+
+    def test_lookup_and_complete_ignore_case_and_spacing(self):
+        names = InterestNames()
+        self.assertEqual(names.lookup("  HIP   hop ")[1], "hip hop")
+        self.assertIsNone(names.lookup("hip"))
+        self.assertEqual(self.names(names.complete("hi")), ["Hiking", "hip hop", "History"])
+        self.assertEqual(self.names(names.complete("hi", k=1)), ["Hiking"])
+
+    def test_writes_bump_the_version(self):
+        names = InterestNames()
+        names.all()
+        with self.captureOnCommitCallbacks(execute=True):
+            Interest.objects.create(name="Hip replacement")
+            Interest.objects.filter(name="Tech").delete()
+        self.assertEqual(self.names(names.complete("hip")), ["hip hop", "Hip replacement"])
+        self.assertIsNone(names.lookup("tech"))
+
+    @override_settings(SHARED_CACHE_ALIASES=[], INTEREST_NAMES_VERSION_TTL=60)
+    def test_process_local_cache_reads_version_from_database(self):
+        names = InterestNames()
+        self.assertIsNone(names.cache)
+        self.assertEqual(len(names.all()), 4)
+        with self.assertNumQueries(0):
+            names.complete("hi")
+            names.lookup("tech")
+        # Written by another process: no invalidation reaches this one, the
+        # next version check after the interval sees it
+        Interest.objects.bulk_create([Interest(name="Hip replacement")])
+        self.assertEqual(self.names(names.complete("hip")), ["hip hop"])
+        names._checked = (names._checked[0], time.monotonic() - 61)
+        self.assertEqual(self.names(names.complete("hip")), ["hip hop", "Hip replacement"])
+        # This process's own writes are seen at once
+        with mock.patch("Users.interests.interest_names", names), self.captureOnCommitCallbacks(execute=True):
+            Interest.objects.filter(name="Tech").delete()
+        self.assertIsNone(names.lookup("tech"))
+
+
+class TokenUserCacheTests(TestCase):
+    def setUp(self):
+        token_users.clear()
+        self.user = Users.objects.create_user(phone_number="+10000000004", username="tok", password="pw")
+        self.token = str(AccessToken.for_user(self.user))
+
+    def test_repeated_token_costs_no_query(self):
+        first, _ = authenticate_token(self.token)
+        with self.assertNumQueries(0):
+            user, validated = authenticate_token(self.token)
+        self.assertEqual((user.id, user.username, user.is_active), (first.id, "tok", True))
+        self.assertEqual(validated["user_id"], str(self.user.id))
+
+    def test_saving_the_user_drops_its_tokens(self):
+        authenticate_token(self.token)
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            authenticate_token(self.token)
+
+    def test_invalid_token_is_rejected(self):
+        with self.assertRaises(InvalidToken):
+            authenticate_token(self.token[:-2] + "xx")
+
+    def test_lru_and_ttl(self):
+        tokens = TokenUserCache(maxsize=2, ttl=60)
+        raw = [str(AccessToken.for_user(self.user)) + str(n) for n in range(3)]
+        for token in raw:
+            tokens.put(token, {"exp": float("inf")}, self.user)
+        self.assertIsNone(tokens.get(raw[0]))
+        self.assertIsNotNone(tokens.get(raw[1]))
+
+        expired = TokenUserCache(ttl=60)
+        expired.put(raw[0], {"exp": 0}, self.user)  # the token's own exp wins over the ttl
+        self.assertIsNone(expired.get(raw[0]))
@@ -0,0 +1,49 @@
+from .models import Users, ProfilePhoto
+
+
+def get_public_photos(user_ids):
+    """
+    First public photo url per user, in one query
+    (same order as ProfilePhoto.Meta.ordering). Users without one are omitted.
+    """
+    photos = {}
+    rows = (
+        ProfilePhoto.objects.filter(user_id__in=list(user_ids), is_private=False)
+        .order_by("user_id", "position", "id")
+        .values_list("user_id", "url")
+    )
+    for user_id, url in rows:
+        photos.setdefault(user_id, url)
+    return photos
+
+
+def get_user_cards(user_ids):
+    """
+    Resolve display cards for a batch of users in two queries:
+    one for username + profile full_name, one for public photos.
+
+    Returns {user_id: {"id", "username", "full_name", "photo"}}.
+    """
+    user_ids = set(user_ids)
+    if not user_ids:
+        return {}
+
+    cards = {}
+    rows = Users.objects.filter(id__in=user_ids).values_list("id", "username", "profile__full_name")
+    for user_id, username, full_name in rows:
+        cards[user_id] = {
+            "id": user_id,
+            "username": username,
+            "full_name": full_name or "",
+            "photo": None,
+        }
+
+    for user_id, url in get_public_photos(cards.keys()).items():
+        cards[user_id]["photo"] = url
+
+    return cards
+
+
+def get_user_card(user):
+    """Display card for a single user (see get_user_cards)."""
+    return get_user_cards([user.id])[user.id]
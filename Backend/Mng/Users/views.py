@@ -8,22 +8,23 @@ from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from django.http import JsonResponse
+from asgiref.sync import sync_to_async
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
+from rest_framework.request import Request
+from django.db import transaction
 from .models import *
 from .serializers import *
-from .sendOTPS import sendSMS
+from .sms import sms_queue
 import jwt
 import datetime
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from .auth import get_user_from_token
+from .otp import VERIFIED, otp_store
+from .passwords import amake_password, averify_password
 from rest_framework_simplejwt.tokens import RefreshToken
 
-def get_user_from_token(token):
-    
-    print("11111111111")
-    jwt_auth = JWTAuthentication()
-    validated_token = jwt_auth.get_validated_token(token)  # Validate and decode
-    user = jwt_auth.get_user(validated_token)  # Get user instance
-    return user
-
 # JWT token generator
 def get_tokens_for_user(user):
       # Set desired lifetimes
@@ -53,11 +54,11 @@ def generateOTP(request):
 
     otp = random.randint(100000, 999999)
     print(otp)
-    # Save OTP in DB (delete old if exists)
-    OTP.objects.filter(phone_number=phone).delete()
-    OTP.objects.create(phone_number=phone, otp=str(otp))
+    # Replaces any earlier OTP for this number (see Users/otp.py)
+    otp_store.put(phone, str(otp))
 
-    # sendSMS("+" + str(phone), f'Your OTP is {otp}')
+    # Sent by a background worker, the response doesn't wait for the provider
+    sms_queue.enqueue("+" + str(phone), f'Your OTP is {otp}')
     return Response({"status": "success", "otp": 123456}, status=status.HTTP_200_OK)
 
 
@@ -67,52 +68,27 @@ def verifyOTP(request):
     phone = request.data.get('phone_number')
     otp = request.data.get('otp')
 
-    try:
-        otp_entry = OTP.objects.get(phone_number=phone)
-    except OTP.DoesNotExist:
-        return Response({"status": "failed", "message": "OTP not found"}, status=status.HTTP_404_NOT_FOUND)
-
-    # Check expiry (5 minutes)
-    if timezone.now() > otp_entry.created_at + timedelta(minutes=5):
-        otp_entry.delete()
-        return Response({"status": "failed", "message": "OTP expired"}, status=status.HTTP_400_BAD_REQUEST)
-
-    if otp_entry.otp == str(otp):
+    # The code is used up here; createUser then consumes the verification
+    if otp_store.replace(phone, str(otp), VERIFIED):
         return Response({"status": "success", "message": "OTP verified"}, status=status.HTTP_200_OK)
-    else:
-        return Response({"status": "failed", "message": "Invalid OTP"}, status=status.HTTP_400_BAD_REQUEST)
 
+    if otp_store.get(phone) is None:
+        return Response({"status": "failed", "message": "OTP not found or expired"}, status=status.HTTP_404_NOT_FOUND)
+    return Response({"status": "failed", "message": "Invalid OTP"}, status=status.HTTP_400_BAD_REQUEST)
 
-@api_view(['POST'])
-def createUser(request):
-    """Step 3: Create user + profile after OTP verification"""
-    phone = request.data.get('phone_number')
-    username = request.data.get('username')   # ✅ required by Users model
-    password = request.data.get('password')
-    # username = request.data.get('username')
-    # Profile fields
-    full_name = request.data.get('name')
-    gender = request.data.get('gender')
-    birthdate = request.data.get('birthdate')  # Expecting "YYYY-MM-DD"
 
-    # if Users.objects.filter(phone_number=phone).exists():
-    #     return Response({"status": "failed", "message": "User already exists"}, status=status.HTTP_400_BAD_REQUEST)
+def _request_data(request):
+    """request.data as DRF parses it (JSON, form or multipart), for the async views below."""
+    return Request(request, parsers=[JSONParser(), FormParser(), MultiPartParser()]).data
 
-    if Users.objects.filter(username = username).exists():
-        return Response({"status": "failed", "message": "Username already exists"}, status=status.HTTP_400_BAD_REQUEST)
 
-    # Check OTP
-    try:
-        otp_entry = OTP.objects.get(phone_number=phone)
-    except OTP.DoesNotExist:
-        return Response({"status": "failed", "message": "OTP not verified"}, status=status.HTTP_400_BAD_REQUEST)
-
-    try :
+def _create_user(phone, username, encoded_password, full_name, gender, birthdate):
+    with transaction.atomic():
         # ✅ Create user
         user = Users.objects.create_user(
             phone_number=phone,
-            password=password,
             username = username,
+            encoded_password=encoded_password,
         )
 
         # ✅ Create profile
@@ -122,19 +98,53 @@ def createUser(request):
             gender=gender,
             birthdate=birthdate
         )
+    return user
+
+
+# Async so the worker isn't held while PBKDF2 runs in the password pool
+# (see Users/passwords.py); DRF's api_view can't wrap an async view.
+@csrf_exempt
+@require_POST
+async def createUser(request):
+    """Step 3: Create user + profile after OTP verification"""
+    try:
+        data = _request_data(request)
+    except ParseError as e:
+        return JsonResponse({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    phone = data.get('phone_number')
+    username = data.get('username')   # ✅ required by Users model
+    password = data.get('password')
+    # username = data.get('username')
+    # Profile fields
+    full_name = data.get('name')
+    gender = data.get('gender')
+    birthdate = data.get('birthdate')  # Expecting "YYYY-MM-DD"
+
+    # if Users.objects.filter(phone_number=phone).exists():
+    #     return Response({"status": "failed", "message": "User already exists"}, status=status.HTTP_400_BAD_REQUEST)
+
+    if await Users.objects.filter(username = username).aexists():
+        return JsonResponse({"status": "failed", "message": "Username already exists"}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Check OTP (before hashing, so unverified requests cost no CPU)
+    if not await sync_to_async(otp_store.consume)(phone, VERIFIED):
+        return JsonResponse({"status": "failed", "message": "OTP not verified"}, status=status.HTTP_400_BAD_REQUEST)
+
+    try :
+        encoded_password = await amake_password(password)
+        user = await sync_to_async(_create_user)(phone, username, encoded_password, full_name, gender, birthdate)
 
     except Exception as e:
         print(e)
-        return Response({"status": "failed", "message": "error"}, status=status.HTTP_400_BAD_REQUEST)
+        # Let the client retry without a new OTP
+        await sync_to_async(otp_store.put)(phone, VERIFIED)
+        return JsonResponse({"status": "failed", "message": "error"}, status=status.HTTP_400_BAD_REQUEST)
 
 
-    # Delete OTP entry
-    otp_entry.delete()
-
     # Generate JWT tokens
     tokens = get_tokens_for_user(user)
     print(tokens)
-    return Response({
+    return JsonResponse({
         "status": "success",
         "message": "User created successfully",
         "tokens": tokens
@@ -225,27 +235,38 @@ def login(request):
     except :
         return Response({"error": "Invalid or expired access token"}, status=status.HTTP_401_UNAUTHORIZED)
 
-@api_view(['POST'])
-def loginByMobile(request):
+@csrf_exempt
+@require_POST
+async def loginByMobile(request):
     """Step 4: Login with phone + password"""
-    phone = request.data.get('phone_number')
-    password = request.data.get('password')
+    try:
+        data = _request_data(request)
+    except ParseError as e:
+        return JsonResponse({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    phone = data.get('phone_number')
+    password = data.get('password')
 
     try:
-        user = Users.objects.get(phone_number=phone)
+        user = await Users.objects.aget(phone_number=phone)
     except Users.DoesNotExist:
-        return Response({"status": "failed", "message": "User not found"}, status=status.HTTP_404_NOT_FOUND)
-
-    if check_password(password, user.password):
-        tokens = get_tokens_for_user(user)
-        return Response({
-            "status": "success",
-            "message": "Login successful",
-            "tokens": tokens,
-            "username" : user.username
-        }, status=status.HTTP_200_OK)
-    else:
-        return Response({"status": "failed", "message": "Invalid password"}, status=status.HTTP_400_BAD_REQUEST)
+        return JsonResponse({"status": "failed", "message": "User not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    is_correct, upgraded_password = await averify_password(password, user.password)
+    if not is_correct:
+        return JsonResponse({"status": "failed", "message": "Invalid password"}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Stored with an older hasher/iteration count: keep the new hash
+    if upgraded_password:
+        user.password = upgraded_password
+        await user.asave(update_fields=["password"])
+
+    tokens = get_tokens_for_user(user)
+    return JsonResponse({
+        "status": "success",
+        "message": "Login successful",
+        "tokens": tokens,
+        "username" : user.username
+    }, status=status.HTTP_200_OK)
 
 
 @api_view(['POST'])
@@ -1,23 +1,74 @@
 # groups/consumers.py - Final Fixed Version
 
 import json
+import logging
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
 from channels.db import database_sync_to_async
+from django.utils import timezone
 
-from Users.models import Users
+from Users.utils import get_user_cards
+from Chat.utils import messages_since
+from Chat.send_queue import BoundedSendMixin
+from Chat.write_behind import WriteBehindMixin, WriteBehindQueue, write_behind_enabled
 from .models import Group, GroupMember, GroupMessage
-from rest_framework_simplejwt.authentication import JWTAuthentication
 
+logger = logging.getLogger(__name__)
 
-class GroupChatConsumer(AsyncJsonWebsocketConsumer):
+# Shared by every GroupChatConsumer in this process (only used with CHAT_WRITE_BEHIND)
+group_message_queue = WriteBehindQueue(GroupMessage)
+
+
+def group_message_event(message, sender_card):
+    """Channel layer event broadcast to group_chat_<group_id> for a new message."""
+    return {
+        "type": "group_chat_message",
+        "id": message.id,
+        "group_id": message.group_id,
+        "text": message.text,
+        "created_at": message.created_at.isoformat(),
+        "sender": sender_card,
+    }
+
+
+def new_write_behind_group_message(message_id, group_id, sender_id, text):
+    """Unsaved GroupMessage for group_message_queue (see Chat/write_behind.py)."""
+    return GroupMessage(
+        id=message_id,
+        group_id=group_id,
+        sender_id=sender_id,
+        text=text,
+        created_at=timezone.now(),
+    )
+
+
+def create_group_message(group_id, sender_id, text, sender_card):
+    """Store a group message and return its broadcast fields (membership is already checked)."""
+    try:
+        message = GroupMessage.objects.create(group_id=group_id, sender_id=sender_id, text=text)
+
+        event = group_message_event(message, sender_card)
+        del event["type"]
+        return event
+    except Exception as e:
+        print(f"❌ Error creating group message: {e}")
+        raise
+
+
+class GroupChatConsumer(BoundedSendMixin, WriteBehindMixin, AsyncJsonWebsocketConsumer):
     async def connect(self):
         print("\n" + "="*50)
         print("🚀 NEW GROUP WEBSOCKET CONNECTION ATTEMPT")
         print("="*50)
         
-        # Extract token quickly
-        token = self.scope["query_string"].decode()
-        token = dict(q.split("=") for q in token.split("&") if "=" in q).get("token")
+        query = self.scope["query_string"].decode()
+        params = dict(q.split("=") for q in query.split("&") if "=" in q)
+
+        # Authenticated once by JWTAuthMiddleware (Users/middleware.py)
+        self.user = self.scope["user"]
+        self.sender_card = self.scope["user_card"]
+        if not self.user.is_authenticated:
+            await self.close(code=4001)
+            return
 
         # Get group ID early
         try:
@@ -26,14 +77,11 @@ class GroupChatConsumer(AsyncJsonWebsocketConsumer):
             await self.close(code=4002)
             return
 
-        # Authenticate user and validate group/membership in one go
-        auth_result = await self._authenticate_and_validate(token, self.group_id)
-        
-        if not auth_result:
+        # Validate group and membership in one query
+        self.group = await self._get_group(self.group_id)
+        if not self.group:
             await self.close(code=4001)
             return
-            
-        self.user, self.group = auth_result
 
         # Join room and accept connection
         self.room_group_name = f"group_chat_{self.group.id}"
@@ -43,6 +91,10 @@ class GroupChatConsumer(AsyncJsonWebsocketConsumer):
         print(f"✅ User {self.user.id} connected to group {self.group_id}")
         print("="*50 + "\n")
 
+        # Reconnect: replay what the client missed before any live message
+        if "since" in params:
+            await self._resume(params["since"])
+
     async def disconnect(self, close_code):
         print(f"\n🔌 Group WebSocket DISCONNECT - Code: {close_code}")
         if hasattr(self, "room_group_name"):
@@ -62,6 +114,10 @@ class GroupChatConsumer(AsyncJsonWebsocketConsumer):
             print("❌ Empty message - ignoring")
             return
 
+        if write_behind_enabled():
+            await self._send_write_behind(text)
+            return
+
         print(f"💬 Creating group message: '{text}'")
         msg = await self._create_group_message(self.group.id, self.user.id, text)
         print(f"✅ Group message created with ID: {msg['id']}")
@@ -83,9 +139,40 @@ class GroupChatConsumer(AsyncJsonWebsocketConsumer):
         await self.channel_layer.group_send(self.room_group_name, broadcast_data)
         print("✅ Group message broadcasted!")
 
+    async def _send_write_behind(self, text):
+        """Broadcast now, persist in the next batch, ack the sender once stored."""
+        message = new_write_behind_group_message(
+            await group_message_queue.reserve_id(), self.group.id, self.user.id, text
+        )
+        await self.write_behind(
+            group_message_queue, message, self.room_group_name,
+            group_message_event(message, self.sender_card),
+        )
+
+    async def _resume(self, since):
+        """
+        Send every message after `since` (capped, see Chat.utils.messages_since),
+        then {"type": "resume", ...}. With has_more the client fetches the rest
+        from GET /groups/<id>/messages/?after_id=<after_id>.
+        """
+        messages, has_more = await self._get_messages_since(since)
+        # Live events queued while we joined the room may repeat these
+        self.replayed_ids = {msg["id"] for msg in messages}
+        for msg in messages:
+            await self.send_json(msg)
+        await self.send_json({
+            "type": "resume",
+            "count": len(messages),
+            "has_more": has_more,
+            "after_id": messages[-1]["id"] if messages else None,
+        })
+        logger.debug("Replayed %d group messages since %s (has_more=%s)", len(messages), since, has_more)
+
     async def group_chat_message(self, event):
         print(f"\n📤 SENDING GROUP MESSAGE to user {self.user.id}:")
         print(f"   Event: {event}")
+        if event["id"] in getattr(self, "replayed_ids", ()):
+            return
         
         # Send message data directly (not wrapped in payload)
         message_data = {
@@ -96,71 +183,36 @@ class GroupChatConsumer(AsyncJsonWebsocketConsumer):
             "sender": event["sender"],
         }
         
-        await self.send_json(message_data)
+        await self.queue_json(message_data)
         print("✅ Group message sent to WebSocket client!")
 
     # ---------- Database operations ----------
     @database_sync_to_async
-    def _authenticate_and_validate(self, token, group_id):
-        """Single database query to authenticate user and validate group membership"""
-        if not token:
-            return None
-        
+    def _get_group(self, group_id):
+        """The active group if the user is a member, else None"""
         try:
-            # Authenticate user
-            print("🔑 Validating token...")
-            jwt_auth = JWTAuthentication()
-            validated_token = jwt_auth.get_validated_token(token)
-            user = jwt_auth.get_user(validated_token)
-            print(f"✅ Token valid for user: {user.id}")
-            
-            # Get group and check membership in single query using select_related
-            group = Group.objects.select_related().prefetch_related('members').get(
+            group = Group.objects.get(
                 pk=group_id, 
                 is_active=True,
-                members__user=user  # This ensures user is a member
+                members__user=self.user  # This ensures user is a member
             )
-            
-            print(f"✅ Authenticated user {user.id} for group {group.name}")
-            return (user, group)
-            
-        except (Group.DoesNotExist, Exception) as e:
-            print(f"❌ Authentication/validation failed: {e}")
+            print(f"✅ Authenticated user {self.user.id} for group {group.name}")
+            return group
+        except Group.DoesNotExist as e:
+            print(f"❌ Group validation failed: {e}")
             return None
 
+    @database_sync_to_async
+    def _get_messages_since(self, since):
+        messages, has_more = messages_since(GroupMessage.objects.filter(group=self.group), since)
+        sender_cards = get_user_cards(msg.sender_id for msg in messages)
+        rows = []
+        for msg in messages:
+            event = group_message_event(msg, sender_cards[msg.sender_id])
+            del event["type"]
+            rows.append(event)
+        return rows, has_more
+
     @database_sync_to_async
     def _create_group_message(self, group_id, sender_id, text):
-        try:
-            # Use get_or_create or direct creation with minimal queries
-            group = Group.objects.get(pk=group_id)
-            sender = Users.objects.select_related('profile').prefetch_related('photos').get(pk=sender_id)
-            
-            # Create message
-            message = GroupMessage.objects.create(group=group, sender=sender, text=text)
-            
-            # Get sender details efficiently
-            photo = None
-            if hasattr(sender, "photos") and sender.photos.exists():
-                first_photo = sender.photos.filter(is_private=False).first()
-                if first_photo:
-                    photo = first_photo.url
-
-            full_name = ""
-            if hasattr(sender, "profile") and sender.profile:
-                full_name = sender.profile.full_name
-
-            return {
-                "id": message.id,
-                "group_id": group.id,
-                "text": message.text,
-                "created_at": message.created_at.isoformat(),
-                "sender": {
-                    "id": sender.id,
-                    "username": sender.username,
-                    "full_name": full_name,
-                    "photo": photo,
-                },
-            }
-        except Exception as e:
-            print(f"❌ Error creating group message: {e}")
-            raise
\ No newline at end of file
+        return create_group_message(group_id, sender_id, text, self.sender_card)
@@ -0,0 +1,53 @@
+from django.db import migrations
+
+
+def install(apps, schema_editor):
+    table = apps.get_model('groups', 'GroupMessage')._meta.db_table
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{table.lower()}_text_search" '
+            f'ON "{table}" USING gin (to_tsvector(\'simple\', "text"))'
+        )
+    elif vendor == 'sqlite':
+        # External-content FTS5 table, kept in sync by triggers
+        fts = f'{table.lower()}_fts'
+        for sql in (
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(text, content='{table}', content_rowid='id')",
+            f'CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON "{table}" BEGIN '
+            f"INSERT INTO {fts}(rowid, text) VALUES (new.id, new.text); END",
+            f'CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON "{table}" BEGIN '
+            f"INSERT INTO {fts}({fts}, rowid, text) VALUES ('delete', old.id, old.text); END",
+            f'CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF text ON "{table}" BEGIN '
+            f"INSERT INTO {fts}({fts}, rowid, text) VALUES ('delete', old.id, old.text); "
+            f"INSERT INTO {fts}(rowid, text) VALUES (new.id, new.text); END",
+            f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+        ):
+            schema_editor.execute(sql)
+
+
+def uninstall(apps, schema_editor):
+    table = apps.get_model('groups', 'GroupMessage')._meta.db_table
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{table.lower()}_text_search"')
+    elif vendor == 'sqlite':
+        fts = f'{table.lower()}_fts'
+        for suffix in ('ai', 'ad', 'au'):
+            schema_editor.execute(f'DROP TRIGGER IF EXISTS {fts}_{suffix}')
+        schema_editor.execute(f'DROP TABLE IF EXISTS {fts}')
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('groups', '0001_initial'),
+        # Same index scheme as Chat's messages; searched together by Chat/search.py
+        ('Chat', '0005_message_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
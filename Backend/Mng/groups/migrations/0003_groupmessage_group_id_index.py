@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:29
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('groups', '0002_groupmessage_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='groupmessage',
+            index=models.Index(fields=['group', 'id'], name='groups_grou_group_i_66714b_idx'),
+        ),
+    ]
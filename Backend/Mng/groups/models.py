@@ -57,6 +57,7 @@ class GroupMessage(models.Model):
         ordering = ['created_at']
         indexes = [
             models.Index(fields=['group', '-created_at']),
+            models.Index(fields=['group', 'id']),  # keyset pagination / resume
             models.Index(fields=['created_at']),
         ]
     
@@ -3,28 +3,24 @@
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
+from django.db import IntegrityError
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from Users.auth import get_user_from_token
 
 from .models import Group, GroupMember, GroupMessage, GroupJoinRequest
+from .consumers import group_message_event
 from Users.models import Interest  # Import Interest from Users app
+from Users.interests import AUTOCOMPLETE_LIMIT, MAX_AUTOCOMPLETE_LIMIT, interest_names
 from .serializers import (
     GroupSerializer, CreateGroupSerializer, GroupListSerializer,
     GroupMemberSerializer, GroupMessageSerializer, GroupJoinRequestSerializer
 )
 from Users.serializers import InterestSerializer  # Import from Users serializers
-
-
-def get_user_from_token(token):
-    print("🔑 Validating token...")
-    jwt_auth = JWTAuthentication()
-    validated_token = jwt_auth.get_validated_token(token)
-    user = jwt_auth.get_user(validated_token)
-    print(f"✅ Token valid for user: {user.id} ({user.phone_number})")
-    return user
+from Users.utils import get_user_card, get_user_cards
+from Chat.utils import _positive_int, page_messages
 
 
 @api_view(['POST'])
@@ -184,7 +180,11 @@ def leave_group(request, group_id):
 
 @api_view(['GET'])
 def get_group_messages(request, group_id):
-    """Get messages for a specific group"""
+    """
+    Get one page of messages for a specific group.
+
+    Query params: before_id, after_id, limit (see Chat.utils.page_messages)
+    """
     access_token = request.GET.get("access_token") or request.data.get("access_token")
     if not access_token:
         return Response({"error": "Access token required"}, status=status.HTTP_400_BAD_REQUEST)
@@ -204,40 +204,33 @@ def get_group_messages(request, group_id):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        messages = GroupMessage.objects.filter(group=group).select_related(
-            'sender', 'sender__profile'
-        ).order_by('created_at')
+        # One keyset page (before_id / after_id / limit, same as chat threads)
+        messages, has_more = page_messages(
+            GroupMessage.objects.filter(group=group),
+            before_id=request.GET.get("before_id"),
+            after_id=request.GET.get("after_id"),
+            limit=request.GET.get("limit"),
+        )
+        
+        # Resolve sender cards for all messages at once
+        sender_cards = get_user_cards(msg.sender_id for msg in messages)
         
         message_data = []
         for msg in messages:
-            # Get sender photo
-            photo = None
-            if hasattr(msg.sender, 'photos') and msg.sender.photos.exists():
-                first_photo = msg.sender.photos.filter(is_private=False).first()
-                if first_photo:
-                    photo = first_photo.url
-            
-            # Get full name
-            full_name = ""
-            if hasattr(msg.sender, 'profile') and msg.sender.profile:
-                full_name = msg.sender.profile.full_name
-            
             message_data.append({
                 "id": msg.id,
                 "text": msg.text,
                 "created_at": msg.created_at.isoformat(),
-                "sender": {
-                    "id": msg.sender.id,
-                    "username": msg.sender.username,
-                    "full_name": full_name,
-                    "photo": photo,
-                }
+                "sender": sender_cards[msg.sender_id],
             })
         
         return Response({
             "group_id": group_id,
             "group_name": group.name,
             "message_count": len(message_data),
+            "has_more": has_more,
+            "before_id": message_data[0]["id"] if message_data else None,
+            "after_id": message_data[-1]["id"] if message_data else None,
             "results": message_data
         })
         
@@ -279,36 +272,11 @@ def send_group_message(request, group_id):
             text=message_text
         )
         
-        # Get sender details for broadcast
-        photo = None
-        if hasattr(user, 'photos') and user.photos.exists():
-            first_photo = user.photos.filter(is_private=False).first()
-            if first_photo:
-                photo = first_photo.url
-        
-        full_name = ""
-        if hasattr(user, 'profile') and user.profile:
-            full_name = user.profile.full_name
-        
-        # Broadcast to WebSocket group
+        # Broadcast to WebSocket group (same event the consumers send)
         channel_layer = get_channel_layer()
         async_to_sync(channel_layer.group_send)(
             f"group_chat_{group_id}",
-            {
-                "type": "group_chat_message",
-                "payload": {
-                    "id": message.id,
-                    "group_id": group.id,
-                    "text": message.text,
-                    "created_at": message.created_at.isoformat(),
-                    "sender": {
-                        "id": user.id,
-                        "username": user.username,
-                        "full_name": full_name,
-                        "photo": photo,
-                    },
-                },
-            },
+            group_message_event(message, get_user_card(user)),
         )
         
         return Response(
@@ -358,9 +326,24 @@ def get_group_members(request, group_id):
 @api_view(['GET'])
 def get_interests(request):
     """Get all available interests"""
-    interests = Interest.objects.all().order_by('name')
-    serializer = InterestSerializer(interests, many=True)
-    return Response({'results': serializer.data}, status=status.HTTP_200_OK)
+    results = [{'id': interest_id, 'name': name} for interest_id, name in interest_names.all()]
+    return Response({'results': results}, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+def autocomplete_interests(request):
+    """
+    Interests whose name starts with q (ignoring case), alphabetically,
+    from the in-memory index (see Users/interests.py).
+
+    Query params:
+      q     - prefix typed so far
+      limit - matches to return (default 10, capped at 50)
+    """
+    limit = min(_positive_int(request.GET.get('limit')) or AUTOCOMPLETE_LIMIT, MAX_AUTOCOMPLETE_LIMIT)
+    matches = interest_names.complete(request.GET.get('q', ''), k=limit)
+    results = [{'id': interest_id, 'name': name} for interest_id, name in matches]
+    return Response({'results': results}, status=status.HTTP_200_OK)
 
 
 @api_view(['POST'])
@@ -379,10 +362,14 @@ def create_interest(request):
     if not name:
         return Response({"error": "Interest name is required"}, status=status.HTTP_400_BAD_REQUEST)
     
-    # Check if interest already exists
-    if Interest.objects.filter(name__iexact=name).exists():
+    # Check if interest already exists (any case)
+    if interest_names.lookup(name) is not None:
         return Response({"error": "Interest already exists"}, status=status.HTTP_400_BAD_REQUEST)
     
-    interest = Interest.objects.create(name=name)
+    try:
+        interest = Interest.objects.create(name=name)
+    except IntegrityError:
+        # Created by another request since the index was loaded
+        return Response({"error": "Interest already exists"}, status=status.HTTP_400_BAD_REQUEST)
     serializer = InterestSerializer(interest)
     return Response(serializer.data, status=status.HTTP_201_CREATED)
\ No newline at end of file